@@ -1,32 +1,32 @@
 import os
 import sys
-import glob
+import json
 import time
-import re
 import shutil
+import hashlib
 import markdown
 import threading
+import queue
 import tempfile
 import datetime
 import subprocess
 from pathlib import Path
+from types import SimpleNamespace
+from functools import lru_cache, partial
+from dataclasses import dataclass
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
-import openai
 import streamlit as st
 from dotenv import load_dotenv
 
 import utils
 from utils import (
     transcribe_audio_whisper, audio_info,
-    format_text, split_markdown_text, process_documents, 
+    split_markdown_text, process_documents, 
     num_tokens_from_string, split_text, process_text_chunks,
     save_text_to_docx, markdown_to_docx
 )
-from youtube_service import YouTubeDownloader
-from gdrive_service import GoogleDriveDownloader
-from instagram_service import InstagramDownloader
-from yandex_disk_service import YandexDiskDownloader
-from vk_video_service import VKVideoDownloader
 import platform
 
 # Конфигурация страницы Streamlit (должна быть первой командой Streamlit)
@@ -73,37 +73,48 @@ def clean_temp_files(directory, days_old=7):
     if not os.path.exists(directory):
         return 0, 0
     
-    now = datetime.datetime.now()
-    cutoff_date = now - datetime.timedelta(days=days_old)
+    cutoff_ts = (datetime.datetime.now() - datetime.timedelta(days=days_old)).timestamp()
     count = 0
     total_size = 0
     
-    for file_path in glob.glob(f"{directory}/**/*", recursive=True):
-        if os.path.isfile(file_path):
-            file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-            if file_mtime < cutoff_date:
-                try:
-                    file_size = os.path.getsize(file_path)
-                    os.remove(file_path)
-                    count += 1
-                    total_size += file_size
-                except Exception as e:
-                    st.error(f"Ошибка при удалении файла {file_path}: {str(e)}")
-    
-    # Удаляем пустые папки
-    for root, dirs, files in os.walk(directory, topdown=False):
-        for dir_name in dirs:
-            dir_path = os.path.join(root, dir_name)
-            if not os.listdir(dir_path):  # Проверяем, пуста ли директория
-                try:
-                    os.rmdir(dir_path)
-                except Exception as e:
-                    st.error(f"Ошибка при удалении пустой директории {dir_path}: {str(e)}")
+    # Обходим дерево через os.scandir: тип, размер и время изменения берем из DirEntry,
+    # не вызывая повторный stat для каждого файла
+    stack = [directory]
+    subdirs = []  # Поддиректории в порядке обхода (для удаления пустых папок)
+    while stack:
+        current_dir = stack.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        try:
+                            st_info = entry.stat(follow_symlinks=False)
+                            if st_info.st_mtime < cutoff_ts:
+                                os.remove(entry.path)
+                                count += 1
+                                total_size += st_info.st_size
+                        except Exception as e:
+                            st.error(f"Ошибка при удалении файла {entry.path}: {str(e)}")
+        except OSError as e:
+            st.error(f"Ошибка при чтении директории {current_dir}: {str(e)}")
+    
+    # Удаляем пустые папки, начиная с самых глубоких
+    for dir_path in reversed(subdirs):
+        try:
+            with os.scandir(dir_path) as it:
+                is_empty = next(it, None) is None
+            if is_empty:
+                os.rmdir(dir_path)
+        except Exception as e:
+            st.error(f"Ошибка при удалении пустой директории {dir_path}: {str(e)}")
     
     return count, total_size
 
 # Функция для периодической очистки временных файлов
-def scheduled_cleanup(temp_dirs, interval_hours=12, days_old=7):
+def scheduled_cleanup(temp_dirs, interval_hours=12, days_old=7, wakeup_event=None):
     """
     Запускает периодическую очистку временных файлов в фоновом режиме.
     
@@ -111,10 +122,14 @@ def scheduled_cleanup(temp_dirs, interval_hours=12, days_old=7):
         temp_dirs (list): Список директорий для очистки
         interval_hours (int): Интервал между очистками в часах
         days_old (int): Удалять файлы старше указанного количества дней
+        wakeup_event (threading.Event): Событие, установка которого запускает очистку досрочно
     """
+    if wakeup_event is None:
+        wakeup_event = threading.Event()
     while True:
-        # Спим указанное количество часов
-        time.sleep(interval_hours * 3600)
+        # Ждем указанное количество часов или досрочного сигнала на очистку
+        if wakeup_event.wait(interval_hours * 3600):
+            wakeup_event.clear()
         
         # Для каждой директории в списке
         for directory in temp_dirs:
@@ -135,85 +150,390 @@ TEMP_FILES_DIR = os.path.join(BASE_DIR, "temp_files")  # Для временны
 AUDIO_FILES_DIR = os.path.join(BASE_DIR, "audio_files")  # Для аудио файлов
 MARKDOWN_DIR = os.path.join(BASE_DIR, "markdown")  # Для хранения markdown файлов
 
-# Создаем все необходимые директории
-for dir_path in [TRANSCRIPTIONS_DIR, TEMP_FILES_DIR, AUDIO_FILES_DIR, MARKDOWN_DIR]:
-    os.makedirs(dir_path, exist_ok=True)
-
-# Определяем путь к ffmpeg и добавляем его в переменные окружения
-current_dir = os.path.dirname(os.path.abspath(__file__))
-if platform.system() == "Windows":
-    ffmpeg_bin = os.path.join(current_dir, "ffmpeg.exe")
-    ffprobe_bin = os.path.join(current_dir, "ffprobe.exe")
-    os.environ["FFMPEG_BINARY"] = ffmpeg_bin
-    os.environ["FFPROBE_BINARY"] = ffprobe_bin
-    # Добавление текущей директории с DLL файлами в PATH
-    os.environ["PATH"] = current_dir + os.pathsep + os.environ.get("PATH", "")
-else:
-    # Для Linux и macOS предполагается, что ffmpeg установлен системно
-    ffmpeg_bin = "ffmpeg"
-    ffprobe_bin = "ffprobe"
-
-# Проверяем наличие ffmpeg
-try:
-    subprocess.run([ffmpeg_bin, "-version"], capture_output=True, text=True, check=True)
-    st.sidebar.success("FFmpeg найден и готов к использованию")
-except Exception as e:
-    st.sidebar.error(f"Ошибка при проверке FFmpeg: {str(e)}")
+TRANSCRIPTION_CACHE_DIR = os.path.join(TEMP_FILES_DIR, "cache")  # Кэш результатов транскрибации
 
-# Запускаем автоматическую очистку временных файлов при запуске
-clean_temp_files(TEMP_FILES_DIR, days_old=7)
+# Подготовка окружения: каталоги, пути к ffmpeg и проверка его наличия.
+# Streamlit выполняет модуль заново при каждом взаимодействии, поэтому результат кэшируется
+# и подготовка выполняется один раз на процесс
+@st.cache_resource
+def setup_environment():
+    """
+    Создает рабочие каталоги, прописывает пути к ffmpeg и проверяет его запуск.
+    
+    Returns:
+        Кортеж (ffmpeg найден, сообщение об ошибке или None, путь к ffmpeg)
+    """
+    # Создаем все необходимые директории
+    for dir_path in [TRANSCRIPTIONS_DIR, TEMP_FILES_DIR, AUDIO_FILES_DIR, MARKDOWN_DIR]:
+        os.makedirs(dir_path, exist_ok=True)
+    
+    # Определяем путь к ffmpeg и добавляем его в переменные окружения
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    if platform.system() == "Windows":
+        ffmpeg_bin = os.path.join(current_dir, "ffmpeg.exe")
+        ffprobe_bin = os.path.join(current_dir, "ffprobe.exe")
+        os.environ["FFMPEG_BINARY"] = ffmpeg_bin
+        os.environ["FFPROBE_BINARY"] = ffprobe_bin
+        # Добавление текущей директории с DLL файлами в PATH
+        os.environ["PATH"] = current_dir + os.pathsep + os.environ.get("PATH", "")
+    else:
+        # Для Linux и macOS предполагается, что ffmpeg установлен системно
+        ffmpeg_bin = "ffmpeg"
+    
+    # Проверяем наличие ffmpeg
+    try:
+        subprocess.run([ffmpeg_bin, "-version"], capture_output=True, text=True, check=True)
+        return True, None, ffmpeg_bin
+    except Exception as e:
+        return False, str(e), ffmpeg_bin
 
-# Запускаем периодическую очистку временных файлов в фоновом режиме
-cleanup_thread = threading.Thread(target=scheduled_cleanup, args=([TEMP_FILES_DIR], 12, 7), daemon=True)
-cleanup_thread.start()
+ffmpeg_ok, ffmpeg_error, ffmpeg_bin = setup_environment()
+if ffmpeg_ok:
+    st.sidebar.success("FFmpeg найден и готов к использованию")
+else:
+    st.sidebar.error(f"Ошибка при проверке FFmpeg: {ffmpeg_error}")
 
-# Вспомогательная функция для получения более строгих языковых инструкций
-def get_language_instruction(target_language):
+# Запуск очистки временных файлов. Кэшируется, чтобы повторные запуски скрипта Streamlit
+# не порождали новый фоновый поток при каждом взаимодействии с интерфейсом
+@st.cache_resource
+def start_cleanup_thread():
     """
-    Возвращает строгие языковые инструкции для указанного языка
+    Очищает временные файлы при запуске и запускает периодическую очистку в фоновом потоке.
+    
+    Returns:
+        threading.Event: Событие для досрочного запуска фоновой очистки
     """
-    if target_language.lower() == "казахский":
-        return """БАРЛЫҚ МӘТІНДІ ТЕК ҚАЗАҚ ТІЛІНДЕ ЖАЗУ КЕРЕК. 
+    # Запускаем автоматическую очистку временных файлов при запуске
+    clean_temp_files(TEMP_FILES_DIR, days_old=7)
+    
+    # Запускаем периодическую очистку временных файлов в фоновом режиме
+    wakeup_event = threading.Event()
+    cleanup_thread = threading.Thread(
+        target=scheduled_cleanup, args=([TEMP_FILES_DIR], 12, 7, wakeup_event), daemon=True
+    )
+    cleanup_thread.start()
+    return wakeup_event
+
+cleanup_wakeup = start_cleanup_thread()
+
+# Языковые инструкции для промптов. Строки заданы один раз при импорте, поэтому
+# промпты с ними остаются побайтно одинаковыми между вызовами
+_LANG_INSTRUCTIONS = {
+    "казахский": """БАРЛЫҚ МӘТІНДІ ТЕК ҚАЗАҚ ТІЛІНДЕ ЖАЗУ КЕРЕК. 
         Басқа тілдерді қолданбаңыз. 
         Тақырыптар, мәтін мазмұны, бөлімдер - бәрі қазақ тілінде болуы керек. 
-        Орыс немесе ағылшын сөздерін араластырмаңыз."""
-    elif target_language.lower() == "английский":
-        return """ALL TEXT MUST BE WRITTEN ONLY IN ENGLISH.
+        Орыс немесе ағылшын сөздерін араластырмаңыз.""",
+    "английский": """ALL TEXT MUST BE WRITTEN ONLY IN ENGLISH.
         Do not use other languages.
         Headings, content, sections - everything should be in English.
-        Do not mix in Russian or Kazakh words."""
-    else:  # русский по умолчанию
-        return """ВЕСЬ ТЕКСТ ДОЛЖЕН БЫТЬ НАПИСАН ТОЛЬКО НА РУССКОМ ЯЗЫКЕ.
+        Do not mix in Russian or Kazakh words.""",
+    "русский": """ВЕСЬ ТЕКСТ ДОЛЖЕН БЫТЬ НАПИСАН ТОЛЬКО НА РУССКОМ ЯЗЫКЕ.
         Не используйте другие языки.
         Заголовки, содержание, разделы - всё должно быть на русском языке.
-        Не смешивайте с казахскими или английскими словами."""
+        Не смешивайте с казахскими или английскими словами.""",
+}
 
-# Функция для создания конспекта из текста транскрибации с уникальными именами файлов
-def create_handbook(text, save_path, original_filename, target_language="русский"):
-    st.write("### Создаем конспект из транскрибации...")
+# Вспомогательная функция для получения более строгих языковых инструкций
+def get_language_instruction(target_language):
+    """
+    Возвращает строгие языковые инструкции для указанного языка
+    """
+    return _LANG_INSTRUCTIONS.get(target_language.lower(), _LANG_INSTRUCTIONS["русский"])
+
+# Вычисление хэша содержимого файла для ключа кэша транскрибации
+def file_content_hash(file_path, chunk_size=1024 * 1024):
+    """
+    Вычисляет хэш содержимого файла, читая его блоками по chunk_size байт.
+    """
+    file_hash = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+# Поиск результата транскрибации в дисковом кэше
+def _transcription_cache_lookup(cache_key):
+    """
+    Возвращает кортеж (транскрипция, язык оригинала) из кэша или None, если записи нет.
+    """
+    cache_path = os.path.join(TRANSCRIPTION_CACHE_DIR, f"{cache_key}.json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        return cached["transcription"], cached.get("original_language")
+    except (OSError, ValueError, KeyError):
+        return None
+
+# Сохранение результата транскрибации в дисковый кэш
+def _transcription_cache_store(cache_key, transcription, original_language):
+    """
+    Атомарно сохраняет результат транскрибации в кэш (запись во временный файл + os.replace).
+    """
+    os.makedirs(TRANSCRIPTION_CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(TRANSCRIPTION_CACHE_DIR, f"{cache_key}.json")
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"transcription": transcription, "original_language": original_language},
+            f,
+            ensure_ascii=False
+        )
+    os.replace(tmp_path, cache_path)
+
+# Папки результатов, уже созданные в текущем запуске скрипта
+_created_dirs = set()
+
+# Создание папки результатов с запоминанием уже созданных
+def _ensure_dir(parent, name):
+    """
+    Возвращает путь к папке name внутри parent, создавая ее только при первом обращении.
+    """
+    path = os.path.join(parent, name)
+    if path not in _created_dirs:
+        os.makedirs(path, exist_ok=True)
+        _created_dirs.add(path)
+    return path
+
+# Пути к файлам результатов обработки одного файла
+def output_paths(file_dir, file_name, target_language):
+    """
+    Формирует пути к файлам оригинала и перевода в папке результатов.
     
-    # Получаем базовое имя файла без префикса, если он есть
-    if original_filename.startswith("Conspect_"):
-        original_filename = original_filename[len("Conspect_"):]
+    Args:
+        file_dir: Папка результатов для файла
+        file_name: Название файла без расширения
+        target_language: Целевой язык перевода
+        
+    Returns:
+        SimpleNamespace с полями orig_txt, orig_docx, trans_txt, trans_docx
+    """
+    original_base = os.path.join(file_dir, f"Original_{file_name}")
+    trans_base = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}")
+    return SimpleNamespace(
+        orig_txt=f"{original_base}.txt",
+        orig_docx=f"{original_base}.docx",
+        trans_txt=f"{trans_base}.txt",
+        trans_docx=f"{trans_base}.docx",
+    )
+
+# Общий пул потоков для фоновой записи файлов. Кэшируется, чтобы повторные запуски
+# скрипта Streamlit не создавали новые потоки
+@st.cache_resource
+def background_pool():
+    return ThreadPoolExecutor(max_workers=4)
+
+# Загрузчики создаются один раз и переиспользуются между перезапусками скрипта Streamlit.
+# Модуль загрузчика импортируется только при первом обращении к источнику
+@st.cache_resource
+def _youtube_downloader():
+    from youtube_service import YouTubeDownloader
+    return YouTubeDownloader(output_dir=AUDIO_FILES_DIR)
+
+@st.cache_resource
+def _vk_downloader():
+    from vk_video_service import VKVideoDownloader
+    return VKVideoDownloader(output_dir=AUDIO_FILES_DIR)
+
+@st.cache_resource
+def _instagram_downloader():
+    from instagram_service import InstagramDownloader
+    return InstagramDownloader(output_dir=AUDIO_FILES_DIR)
+
+@st.cache_resource
+def _yandex_disk_downloader():
+    from yandex_disk_service import YandexDiskDownloader
+    return YandexDiskDownloader(output_dir=AUDIO_FILES_DIR)
+
+@st.cache_resource
+def _gdrive_downloader():
+    from gdrive_service import GoogleDriveDownloader
+    return GoogleDriveDownloader(output_dir=AUDIO_FILES_DIR)
+
+# Удаление исходного аудио после транскрибации
+def discard_source_audio(file_path, keep=False):
+    """
+    Удаляет исходный аудио файл, если его не требуется сохранять.
     
-    # Определяем пути к файлам
-    md_text_path = os.path.join(TEMP_FILES_DIR, f"{original_filename}_processed_md_text.txt")
-    handbook_path = os.path.join(TEMP_FILES_DIR, f"{original_filename}_summary_draft.txt")
+    Args:
+        file_path: Путь к файлу
+        keep: Оставить файл на диске
+    """
+    if keep or not file_path:
+        return
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Не удалось удалить файл {file_path}: {str(e)}")
+
+# Знаки конца предложения: по последнему из них фрагмент делится при переносе хвоста
+SENTENCE_END_MARKS = ".!?…"
+
+# Разбивка текста на абзацы без прерывания транскрибации (без вызовов Streamlit)
+def _format_paragraphs_safe(text):
+    """
+    Разбивает текст на абзацы через utils.format_transcription_paragraphs.
+    Ошибка запроса к модели не прерывает транскрибацию: возвращается исходный текст.
+    """
+    try:
+        return utils.format_transcription_paragraphs(text)
+    except Exception as e:
+        print(f"Не удалось разбить текст на абзацы: {str(e)}")
+        return text
+
+# Транскрибация с использованием кэша результатов (без вызовов Streamlit)
+def _transcribe_cached(audio_path, file_name, cache_key=None, on_progress=None):
+    """
+    Транскрибирует аудио и форматирует текст по абзацам, переиспользуя ранее полученный результат.
+    Не обращается к интерфейсу Streamlit, поэтому может выполняться в фоновом потоке.
     
-    # Пути к конечным файлам конспекта в папке экспорта
-    handbook_export_txt_path = os.path.join(save_path, f"Summary_{original_filename}.txt")
-    handbook_export_docx_path = os.path.join(save_path, f"Summary_{original_filename}.docx")
+    Args:
+        audio_path: Путь к аудио файлу
+        file_name: Название файла для сохранения рабочих результатов
+        cache_key: Ключ кэша (например, ID видео); если не указан, используется хэш содержимого файла
+        on_progress: Функция, которая получает уже отформатированную часть текста по мере распознавания
+        
+    Returns:
+        Кортеж (отформатированная транскрипция, язык оригинала, результат взят из кэша)
+    """
+    if cache_key is None:
+        cache_key = file_content_hash(audio_path)
+    
+    cached = _transcription_cache_lookup(cache_key)
+    if cached is not None:
+        return cached[0], cached[1], True
+    
+    # Форматируем абзацы по каждому фрагменту сразу после его распознавания:
+    # оформление идет параллельно с распознаванием следующих фрагментов.
+    # Границы фрагментов приходятся на середину предложения, поэтому последний
+    # абзац (или незаконченное предложение) фрагмента переносится в начало следующего
+    paragraphs = []
+    carry = [""]
+    def format_segment(segment_text):
+        text = f"{carry[0]} {segment_text}".strip()
+        formatted = _format_paragraphs_safe(text)
+        head, sep, tail = formatted.rpartition("\n\n")
+        if not sep:
+            # Один абзац: дальше переносим только незаконченное предложение;
+            # текст без знаков конца предложения выводим целиком, чтобы хвост не рос
+            cut = max(formatted.rfind(mark) for mark in SENTENCE_END_MARKS) + 1
+            if cut:
+                head, tail = formatted[:cut], formatted[cut:]
+            else:
+                head, tail = formatted, ""
+        if head.strip():
+            paragraphs.append(head.strip())
+        carry[0] = tail.strip()
+        if on_progress is not None:
+            on_progress("\n\n".join(paragraphs + [carry[0]]))
+    
+    _, original_language, complete = transcribe_audio_whisper(
+        audio_path=audio_path,
+        file_title=file_name,
+        save_folder_path=TEMP_FILES_DIR,  # Сохраняем рабочий файл во временную директорию
+        segment_callback=format_segment
+    )
+    # Хвост последнего фрагмента оформляем отдельно
+    if carry[0]:
+        paragraphs.append(_format_paragraphs_safe(carry[0]))
+    transcription = "\n\n".join(paragraphs)
+    
+    # Оборванный или пустой результат в кэш не попадает: следующий запуск распознает файл заново
+    if complete and transcription.strip():
+        try:
+            _transcription_cache_store(cache_key, transcription, original_language)
+        except OSError as e:
+            print(f"Не удалось сохранить транскрибацию в кэш: {str(e)}")
+    else:
+        print(f"Транскрибация {file_name} неполная, в кэш не сохраняется")
+    
+    return transcription, original_language, False
 
-    # Определяем размер текста в токенах
-    tokens = num_tokens_from_string(text)
-    st.write(f"Количество токенов в тексте: {tokens}")
+# Транскрибация с использованием кэша результатов
+def transcribe_with_cache(audio_path, file_name, cache_key=None):
+    """
+    Транскрибирует аудио с использованием кэша и сообщает, если результат взят из кэша.
+    
+    Returns:
+        Кортеж (отформатированная транскрипция, язык оригинала)
+    """
+    transcription, original_language, from_cache = _transcribe_cached(audio_path, file_name, cache_key)
+    if from_cache:
+        st.info("Транскрибация найдена в кэше, повторное распознавание не требуется")
+    return transcription, original_language
+
+# Фоновая транскрибация для конвейерной обработки нескольких файлов
+def _transcribe_timed(audio_path, file_name, cache_key=None, on_progress=None):
+    """
+    Выполняет транскрибацию с кэшем и замеряет ее длительность.
+    
+    Returns:
+        Кортеж (транскрипция, язык оригинала, результат взят из кэша, длительность в секундах)
+    """
+    start_time = time.time()
+    transcription, original_language, from_cache = _transcribe_cached(audio_path, file_name, cache_key, on_progress)
+    return transcription, original_language, from_cache, time.time() - start_time
+
+# Ожидание фоновой транскрибации с выводом уже распознанного текста
+def _wait_transcription(job, live_text, poll_interval=0.5, preview_chars=2000):
+    """
+    Дожидается результата транскрибации, показывая по мере готовности конец распознанного текста.
+    
+    Args:
+        job: Future с результатом _transcribe_timed
+        live_text: Словарь, в который фоновый поток записывает текущий текст под ключом "text"
+        
+    Returns:
+        Результат _transcribe_timed
+    """
+    placeholder = st.empty()
+    shown = None
+    try:
+        while True:
+            try:
+                return job.result(timeout=poll_interval)
+            except FuturesTimeoutError:
+                text = live_text.get("text")
+                if text and text is not shown:
+                    placeholder.text(text[-preview_chars:])
+                    shown = text
+    finally:
+        placeholder.empty()
+
+# Кэшированные обертки для подсчета токенов, разбиения текста и отрисовки markdown: при повторных запусках
+# скрипта Streamlit с той же транскрибацией результат берется из кэша
+@st.cache_data(show_spinner=False, max_entries=32)
+def _count_tokens_cached(text):
+    return num_tokens_from_string(text)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _split_text_cached(text, chunk_size, chunk_overlap):
+    return split_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _render_markdown(text):
+    return markdown.markdown(text)
+
+# Порог размера текста в токенах, до которого текст разбивается на разделы одним запросом
+HANDBOOK_SINGLE_REQUEST_TOKENS = 16000
+
+# Промпты для создания конспекта
+def _handbook_prompts(target_language):
+    """
+    Формирует промпты для разбиения текста на разделы и для конспектирования разделов.
+    Системные промпты не содержат подстановок, чтобы оставаться одинаковым (кэшируемым)
+    префиксом во всех запросах.
     
+    Returns:
+        Кортеж (system, user) для разбиения на разделы и (system, user) для конспекта
+    """
     # Получаем языковые инструкции для более строгого указания языка
     lang_instruction = get_language_instruction(target_language)
     
     # Системный промпт для разделения текста на разделы
-    system_prompt = f"""Вы гений текста, копирайтинга, писательства. Ваша задача распознать разделы в тексте
-и разбить его на эти разделы сохраняя весь текст на 100%. {lang_instruction}"""
+    system_prompt = """Вы гений текста, копирайтинга, писательства. Ваша задача распознать разделы в тексте
+и разбить его на эти разделы сохраняя весь текст на 100%."""
 
     # Пользовательский промпт для разделения текста
     user_prompt = f"""Пожалуйста, давайте подумаем шаг за шагом: Подумайте, какие разделы в тексте вы можете
@@ -221,23 +541,43 @@ def create_handbook(text, save_path, original_filename, target_language="рус
 предыдущему ответу и оформи в порядке:
 ## Название раздела, после чего весь текст, относящийся к этому разделу. {lang_instruction} Текст:"""
     
-    # В зависимости от размера текста либо обрабатываем текст целиком, либо делим на чанки
-    md_processed_text = ""
-    
-    with st.spinner("Обрабатываем текст, разбивая на разделы..."):
-        # Если текст небольшой (менее 16к токенов для безопасности), обрабатываем целиком
-        if tokens < 16000:
-            md_processed_text = utils.generate_answer(system_prompt, user_prompt, text)
-        # Иначе разбиваем на чанки и обрабатываем по частям
-        else:
-            st.write("Текст слишком большой, разбиваем на части...")
-            # Разбиваем текст на чанки
-            text_chunks = split_text(text, chunk_size=30000, chunk_overlap=1000)
-            st.write(f"Текст разбит на {len(text_chunks)} частей")
-            # Обрабатываем каждый чанк отдельно
-            md_processed_text = process_text_chunks(text_chunks, system_prompt, user_prompt)
+    # Системный промпт для формирования конспекта (без подстановок, языковые указания — в пользовательском промпте)
+    system_prompt_handbook = """Ты гений копирайтинга. Ты получаешь раздел необработанного текста по определенной теме.
+Нужно из этого текста выделить самую суть, только самое важное, сохранив все нужные подробности и детали,
+но убрав всю "воду" и слова (предложения), не несущие смысловой нагрузки."""
+
+    # Пользовательский промпт для формирования конспекта
+    user_prompt_handbook = f"""ОЧЕНЬ ВАЖНО: {lang_instruction}
+Ты ДОЛЖЕН писать ВЕСЬ текст ТОЛЬКО на {target_language} языке. НЕ ИСПОЛЬЗУЙ другие языки вообще.
+
+Из данного текста выдели только ключевую и ценную с точки зрения темы раздела информацию.
+Удали всю "воду". В итоге у тебя должен получится раздел для конспекта по указанной теме. Опирайся
+только на данный тебе текст, не придумывай ничего от себя. Ответ нужен в формате:
+## Название раздела, и далее выделенная тобой ценная информация из текста. Используй маркдаун-разметку для выделения важных моментов: 
+**жирный текст** для важных фактов, *курсив* для определений, списки для перечислений и т.д. 
+
+ОЧЕНЬ ВАЖНО: {lang_instruction}
+Ты ДОЛЖЕН писать ВЕСЬ текст ТОЛЬКО на {target_language} языке.
+НЕ ИСПОЛЬЗУЙ русский или любой другой язык, кроме {target_language}.
+
+Весь твой ответ должен быть на {target_language} языке, включая все заголовки, выделения и пояснения."""
     
+    return (system_prompt, user_prompt), (system_prompt_handbook, user_prompt_handbook)
+
+# Базовое имя файла конспекта без префикса "Conspect_"
+def _handbook_name(original_filename):
+    if original_filename.startswith("Conspect_"):
+        return original_filename[len("Conspect_"):]
+    return original_filename
+
+# Сохранение текста, разбитого на разделы, и вывод заголовков разделов
+def _save_sections_text(md_processed_text, original_filename):
+    """
+    Returns:
+        Список документов, разбитых по заголовкам разделов
+    """
     # Сохраняем промежуточный текст с разделами в txt файл в папке для временных файлов
+    md_text_path = os.path.join(TEMP_FILES_DIR, f"{original_filename}_processed_md_text.txt")
     with open(md_text_path, "w", encoding="utf-8") as f:
         f.write(md_processed_text)
     
@@ -255,45 +595,25 @@ def create_handbook(text, save_path, original_filename, target_language="рус
                 st.write(f"- {chunk.metadata['Header 2']}")
         except:
             pass
-    
-    # Системный промпт для формирования конспекта
-    system_prompt_handbook = f"""Ты гений копирайтинга. Ты получаешь раздел необработанного текста по определенной теме.
-Нужно из этого текста выделить самую суть, только самое важное, сохранив все нужные подробности и детали,
-но убрав всю "воду" и слова (предложения), не несущие смысловой нагрузки.
-ОЧЕНЬ ВАЖНО: {lang_instruction}
-Ты ДОЛЖЕН писать ВЕСЬ текст ТОЛЬКО на {target_language} языке. НЕ ИСПОЛЬЗУЙ другие языки вообще."""
-
-    # Пользовательский промпт для формирования конспекта
-    user_prompt_handbook = f"""Из данного текста выдели только ключевую и ценную с точки зрения темы раздела информацию.
-Удали всю "воду". В итоге у тебя должен получится раздел для конспекта по указанной теме. Опирайся
-только на данный тебе текст, не придумывай ничего от себя. Ответ нужен в формате:
-## Название раздела, и далее выделенная тобой ценная информация из текста. Используй маркдаун-разметку для выделения важных моментов: 
-**жирный текст** для важных фактов, *курсив* для определений, списки для перечислений и т.д. 
+    return chunks_md_splits
 
-ОЧЕНЬ ВАЖНО: {lang_instruction}
-Ты ДОЛЖЕН писать ВЕСЬ текст ТОЛЬКО на {target_language} языке.
-НЕ ИСПОЛЬЗУЙ русский или любой другой язык, кроме {target_language}.
-
-Весь твой ответ должен быть на {target_language} языке, включая все заголовки, выделения и пояснения."""
+# Сохранение готового конспекта и вывод его в интерфейсе
+def _save_handbook(handbook_md_text, save_path, original_filename):
+    # Пути к конечным файлам конспекта в папке экспорта
+    handbook_path = os.path.join(TEMP_FILES_DIR, f"{original_filename}_summary_draft.txt")
+    handbook_export_txt_path = os.path.join(save_path, f"Summary_{original_filename}.txt")
+    handbook_export_docx_path = os.path.join(save_path, f"Summary_{original_filename}.docx")
     
-    with st.spinner("Формируем конспект из разделов..."):
-        # Обработка каждого документа (раздела) для формирования конспекта
-        handbook_md_text = process_documents(
-            TEMP_FILES_DIR, 
-            chunks_md_splits, 
-            system_prompt_handbook, 
-            user_prompt_handbook, 
-            original_filename, 
-            target_language
-        )
+    # Кодируем конспект один раз: одни и те же байты пишутся и в черновик, и в экспорт
+    handbook_bytes = handbook_md_text.encode("utf-8")
     
     # Сохраняем черновик конспекта в файл для временных данных
-    with open(handbook_path, "w", encoding="utf-8") as f:
-        f.write(handbook_md_text)
+    with open(handbook_path, "wb") as f:
+        f.write(handbook_bytes)
     
     # Сохраняем конспект в указанную директорию экспорта
-    with open(handbook_export_txt_path, "w", encoding="utf-8") as f:
-        f.write(handbook_md_text)
+    with open(handbook_export_txt_path, "wb") as f:
+        f.write(handbook_bytes)
     
     # Сохраняем конспект в docx с правильным форматированием
     markdown_to_docx(handbook_md_text, handbook_export_docx_path)
@@ -302,146 +622,708 @@ def create_handbook(text, save_path, original_filename, target_language="рус
     
     # Создаем текстовую область с конспектом для просмотра и копирования
     with st.expander("Просмотр конспекта", expanded=False):
-        handbook_html = markdown.markdown(handbook_md_text)
+        handbook_html = _render_markdown(handbook_md_text)
         st.markdown(handbook_html, unsafe_allow_html=True)
         st.info("Для копирования выделите текст выше и нажмите Ctrl+C")
+
+# Функция для создания конспекта из текста транскрибации с уникальными именами файлов
+def create_handbook(text, save_path, original_filename, target_language="русский"):
+    st.write("### Создаем конспект из транскрибации...")
     
-    return handbook_md_text, md_processed_text
+    # Получаем базовое имя файла без префикса, если он есть
+    original_filename = _handbook_name(original_filename)
 
-# Функция для обработки загруженного файла
-def process_uploaded_file(file_obj, save_path, file_name, target_language, save_txt=True, save_docx=True, create_handbook_option=False):
-    # Создаем отдельную папку для файла в директории экспорта
-    file_dir = os.path.join(save_path, file_name)
-    os.makedirs(file_dir, exist_ok=True)
+    # Определяем размер текста в токенах
+    tokens = _count_tokens_cached(text)
+    st.write(f"Количество токенов в тексте: {tokens}")
     
-    # Выводим информацию о созданном каталоге для отладки
-    st.info(f"Создан каталог для результатов: {file_dir}")
+    (system_prompt, user_prompt), (system_prompt_handbook, user_prompt_handbook) = _handbook_prompts(target_language)
     
-    # Сохраняем загруженный файл во времний файл
-    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file_obj.name).suffix) as tmp_file:
-        tmp_file.write(file_obj.getbuffer())
-        temp_file_path = tmp_file.name
-
-    st.info(f"Файл временно сохранен: {temp_file_path}")
-
-    # Получаем информацию об аудио файле
-    audio = audio_info(temp_file_path)
-    st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
-    st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
-    st.write(f"Количество каналов: {audio.channels}")
-
-    # Транскрибация аудио
-    with st.spinner("Выполняем транскрибацию..."):
-        start_time = time.time()
-        transcription, original_language = transcribe_audio_whisper(
-            audio_path=temp_file_path,
-            file_title=file_name,
-            save_folder_path=TEMP_FILES_DIR  # Сохраняем рабочий файл во временную директорию
+    # Статистика токенов, в том числе взятых из кэша префикса промпта
+    usage = {}
+    
+    # В зависимости от размера текста либо обрабатываем текст целиком, либо делим на чанки
+    md_processed_text = ""
+    
+    with st.spinner("Обрабатываем текст, разбивая на разделы..."):
+        # Если текст небольшой (менее 16к токенов для безопасности), обрабатываем целиком
+        if tokens < HANDBOOK_SINGLE_REQUEST_TOKENS:
+            md_processed_text = utils.generate_answer(system_prompt, user_prompt, text, usage=usage)
+        # Иначе разбиваем на чанки и обрабатываем по частям
+        else:
+            st.write("Текст слишком большой, разбиваем на части...")
+            # Разбиваем текст на чанки
+            text_chunks = _split_text_cached(text, chunk_size=30000, chunk_overlap=1000)
+            st.write(f"Текст разбит на {len(text_chunks)} частей")
+            # Обрабатываем каждый чанк отдельно
+            md_processed_text = process_text_chunks(text_chunks, system_prompt, user_prompt, usage=usage)
+    
+    chunks_md_splits = _save_sections_text(md_processed_text, original_filename)
+    
+    with st.spinner("Формируем конспект из разделов..."):
+        progress_bar = st.progress(0.0, text="Обработано разделов: 0")
+        
+        def update_progress(done, total):
+            progress_bar.progress(done / total, text=f"Обработано разделов: {done} из {total}")
+        
+        # Обработка каждого документа (раздела) для формирования конспекта
+        handbook_md_text = process_documents(
+            TEMP_FILES_DIR, 
+            chunks_md_splits, 
+            system_prompt_handbook, 
+            user_prompt_handbook, 
+            original_filename, 
+            target_language,
+            usage=usage,
+            progress_callback=update_progress
         )
-        transcription = utils.format_transcription_paragraphs(transcription)
-        elapsed_time = time.time() - start_time
-
-    st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
+    
+    # Показываем, сколько токенов промпта было взято из кэша OpenAI
+    if usage.get("prompt_tokens"):
+        st.info(f"Токенов промпта из кэша: {usage['cached_tokens']} из {usage['prompt_tokens']}")
+    
+    _save_handbook(handbook_md_text, save_path, original_filename)
+    
+    return handbook_md_text, md_processed_text
 
-    # Сохраняем оригинал в папку файла
-    original_txt_path = os.path.join(file_dir, f"Original_{file_name}.txt")
+# Пакетное создание конспектов для нескольких файлов
+def create_handbooks_batch(items, target_language="русский"):
+    """
+    Создает конспекты для нескольких файлов двумя пакетными заданиями OpenAI Batch API:
+    первое разбивает все тексты на разделы, второе конспектирует все разделы всех файлов.
     
-    # Еще раз проверяем существование директории перед записью
-    if not os.path.exists(file_dir):
-        os.makedirs(file_dir, exist_ok=True)
-        st.info(f"Повторно создан каталог для результатов: {file_dir}")
+    Args:
+        items: Список кортежей (текст, папка для сохранения, имя файла)
+        target_language: Целевой язык конспектов
         
-    try:
-        with open(original_txt_path, "w", encoding="utf-8") as f:
-            f.write(transcription)
-        st.success(f"Оригинал TXT сохранен: {original_txt_path}")
-    except Exception as e:
-        st.error(f"Ошибка при сохранении TXT: {str(e)}")
+    Returns:
+        Список кортежей (конспект, текст с разделами) в порядке items
+    """
+    (system_prompt, user_prompt), (system_prompt_handbook, user_prompt_handbook) = _handbook_prompts(target_language)
     
-    if save_docx:
-        try:
-            original_docx_path = os.path.join(file_dir, f"Original_{file_name}.docx")
-            save_text_to_docx(transcription, original_docx_path)
-            st.success(f"Оригинал Word сохранен: {original_docx_path}")
-        except Exception as e:
-            st.error(f"Ошибка при сохранении DOCX: {str(e)}")
-
-    # Определяем, нужен ли перевод
-    # Словари для маппинга названий языков в коды и наоборот
-    lang_map = {"русский": "ru", "казахский": "kk", "английский": "en"}
-    lang_code_to_name = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
-                        "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
-                        "de": "немецкий", "it": "итальянский", "pt": "португальский"}
+    def messages(system, user, text):
+        return [{"role": "system", "content": system}, {"role": "user", "content": user + "\n" + text}]
     
-    # Получаем код оригинального языка
-    orig_lang_code = original_language.lower() if original_language else "unknown"
+    # Разбиение на разделы: большой текст делится на части, каждая часть — отдельный запрос
+    section_parts = {}
+    for index, (text, _, _) in enumerate(items):
+        if _count_tokens_cached(text) < HANDBOOK_SINGLE_REQUEST_TOKENS:
+            parts = [text]
+        else:
+            parts = _split_text_cached(text, chunk_size=30000, chunk_overlap=1000)
+        for part_index, part in enumerate(parts):
+            section_parts[(index, part_index)] = part
+    section_requests = {key: messages(system_prompt, user_prompt, part) for key, part in section_parts.items()}
+    
+    with st.spinner(f"Разбиваем тексты на разделы пакетным заданием ({len(section_requests)} запросов)..."):
+        section_answers = utils.chat_completions_batch(section_requests, batch_name="handbook_sections")
+    
+    # Запросы, не выполненные в пакете, повторяем обычным запросом
+    for key, part in section_parts.items():
+        if key not in section_answers:
+            section_answers[key] = utils.generate_answer(system_prompt, user_prompt, part)
+    
+    md_texts = []
+    for index, (text, _, _) in enumerate(items):
+        answers = [section_answers[key] for key in sorted(section_parts) if key[0] == index]
+        md_texts.append(answers[0] if len(answers) == 1 else "".join(f"{answer}\n\n" for answer in answers))
+    
+    # Конспектирование разделов всех файлов
+    enhanced_user = utils.enhance_language_prompt(user_prompt_handbook, target_language)
+    documents = []
+    for index, ((_, _, file_name), md_processed_text) in enumerate(zip(items, md_texts)):
+        st.write(f"### Конспект для файла {file_name}")
+        documents.append(_save_sections_text(md_processed_text, _handbook_name(file_name)))
+    handbook_requests = {
+        (index, doc_index): messages(system_prompt_handbook, enhanced_user, document.page_content)
+        for index, file_documents in enumerate(documents)
+        for doc_index, document in enumerate(file_documents)
+    }
+    
+    with st.spinner(f"Формируем конспекты пакетным заданием ({len(handbook_requests)} разделов)..."):
+        handbook_answers = utils.chat_completions_batch(handbook_requests, batch_name="handbooks")
+    
+    results = []
+    for index, ((_, save_path, file_name), md_processed_text) in enumerate(zip(items, md_texts)):
+        answers = []
+        for doc_index, document in enumerate(documents[index]):
+            answer = handbook_answers.get((index, doc_index))
+            if answer is None:
+                answer = utils.generate_answer(system_prompt_handbook, enhanced_user, document.page_content)
+            answers.append(answer)
+        handbook_md_text = "".join(f"{answer}\n\n" for answer in answers)
+        _save_handbook(handbook_md_text, save_path, _handbook_name(file_name))
+        results.append((handbook_md_text, md_processed_text))
+    
+    return results
+
+# Функция для атомарной записи уже закодированного текста в файл
+def _write_text_atomic(path, data_bytes):
+    """
+    Записывает байты во временный файл и затем атомарно заменяет им целевой файл,
+    чтобы при сбое не оставалось наполовину записанных результатов.
     
-    # Дополнительная проверка для корейского и других языков
-    if orig_lang_code == "unknown" or orig_lang_code not in ["ru", "kk", "en", "ko", "ja", "zh"]:
-        # Определяем язык из текста с помощью нашей улучшенной функции
-        orig_lang_code = utils.detect_language(transcription)
+    Args:
+        path: Путь к целевому файлу
+        data_bytes: Содержимое файла (текст, уже закодированный в UTF-8)
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data_bytes)
+    os.replace(tmp_path, path)
+
+# Словари для маппинга названий языков в коды и наоборот
+LANG_MAP = {"русский": "ru", "казахский": "kk", "английский": "en"}
+LANG_CODE_TO_NAME = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
+                     "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
+                     "de": "немецкий", "it": "итальянский", "pt": "португальский"}
+
+# Нормализация кодов языков; зависит только от пары аргументов, поэтому результат кэшируется
+@lru_cache(maxsize=64)
+def _language_codes(original_language, target_language):
+    """
+    Возвращает кортеж (код языка оригинала или None, если его нужно определить по тексту,
+    код целевого языка).
+    """
+    # Языку, определенному Whisper, доверяем, даже если его нет в словаре названий
+    orig_lang_code = original_language.lower() if original_language else None
+    if orig_lang_code == "unknown":
+        orig_lang_code = None
+    return orig_lang_code, LANG_MAP.get(target_language.lower(), "ru")
+
+# Функция для определения языка оригинала и необходимости перевода
+def resolve_languages(transcription, original_language, target_language):
+    """
+    Определяет язык оригинала и нужен ли перевод на целевой язык.
+    
+    Args:
+        transcription: Текст транскрибации
+        original_language: Код языка, определенный при транскрибации (может быть None)
+        target_language: Целевой язык ("русский", "казахский", "английский")
+        
+    Returns:
+        Кортеж (название языка оригинала, нужен ли перевод)
+    """
+    orig_lang_code, target_lang_code = _language_codes(original_language, target_language)
     
-    # Получаем код целевого языка
-    target_lang_code = lang_map.get(target_language.lower(), "ru")
+    # Определяем язык из текста, только если Whisper не вернул код языка
+    if orig_lang_code is None:
+        orig_lang_code = utils.detect_language(transcription)
     
     # Всегда переводим с языка, отличного от целевого
     need_translate = orig_lang_code != target_lang_code
-    translated_text = transcription  # По умолчанию используем оригинальный текст
+    orig_lang_name = LANG_CODE_TO_NAME.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
+    return orig_lang_name, need_translate
+
+# Функция для определения языка оригинала и перевода транскрибации
+def resolve_and_translate(transcription, original_language, target_language, file_name=None, translated_text=None):
+    """
+    Определяет язык оригинала и переводит транскрибацию, если он отличается от целевого.
+    
+    Args:
+        transcription: Текст транскрибации
+        original_language: Код языка, определенный при транскрибации (может быть None)
+        target_language: Целевой язык ("русский", "казахский", "английский")
+        file_name: Имя файла для сообщений о ходе обработки
+        translated_text: Готовый перевод (например, из пакетного задания), если он уже получен
+        
+    Returns:
+        Кортеж (переведённый текст, название языка оригинала, выполнялся ли перевод)
+    """
+    orig_lang_name, need_translate = resolve_languages(transcription, original_language, target_language)
     
     # Показываем информацию о языке оригинала для диагностики
-    orig_lang_name = lang_code_to_name.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
     st.info(f"Определен язык оригинала: {orig_lang_name}")
     
-    if need_translate:
-        with st.spinner(f"Переводим транскрибацию с {orig_lang_name} на {target_language}..."):
-            translated_text = utils.translate_text_gpt(transcription, target_language)
-        st.success(f"Перевод завершён!")
+    file_label = f" файла {file_name}" if file_name else ""
+    if not need_translate:
+        translated_text = transcription  # Используем оригинальный текст
+        for_file = f" для файла {file_name}" if file_name else ""
+        st.info(f"Язык оригинала ({orig_lang_name}){for_file} совпадает с целевым языком ({target_language}). Перевод не требуется.")
+    elif translated_text is not None:
+        st.success(f"Перевод{file_label} получен из пакетного задания")
     else:
-        st.info(f"Язык оригинала ({orig_lang_name}) совпадает с целевым языком ({target_language}). Перевод не требуется.")
-
-    # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
-    trans_txt_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.txt")
-    with open(trans_txt_path, "w", encoding="utf-8") as f:
-        f.write(translated_text)
-    if save_docx:
-        trans_docx_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.docx")
-        save_text_to_docx(translated_text, trans_docx_path)
-        st.success(f"Переведённый Word сохранен: {trans_docx_path}")
-    st.success(f"Переведённый TXT сохранен: {trans_txt_path}")
-
-    # Выводим оба текста
-    st.subheader("Оригинальная транскрибация")
-    st.text_area("Оригинал", transcription, height=200)
-    st.subheader(f"Транскрибация на {target_language.capitalize()}")
-    st.text_area("Перевод", translated_text, height=200)
-
-    # Создаём конспект по переводу
-    handbook_text = None
-    if create_handbook_option:
-        # Используем оригинальное имя файла без префикса "Conspect_"
-        handbook_text, md_processed_text = create_handbook(translated_text, file_dir, file_name, target_language)
-        return transcription, handbook_text, md_processed_text
+        with st.spinner(f"Переводим транскрибацию{file_label} с {orig_lang_name} на {target_language}..."):
+            translated_text = utils.translate_text_gpt(transcription, target_language)
+        st.success(f"Перевод{file_label} завершён!")
+    
+    return translated_text, orig_lang_name, need_translate
 
-    return transcription, None, None
+# Пакетный перевод транскрибаций нескольких файлов
+def batch_translate_pending(pending, target_language):
+    """
+    Дожидается транскрибации всех файлов и переводит нуждающиеся в переводе
+    одним пакетным заданием OpenAI Batch API.
+    
+    Args:
+        pending: Словарь {ключ файла: Future с результатом _transcribe_timed}
+        target_language: Целевой язык перевода
+        
+    Returns:
+        Словарь {ключ файла: переведённый текст}; при ошибке — пустой словарь,
+        и файлы переводятся обычными запросами
+    """
+    texts = {}
+    with st.spinner("Ожидаем транскрибацию всех файлов для пакетного перевода..."):
+        for key, future in pending.items():
+            try:
+                transcription, original_language, _, _ = future.result()
+            except Exception:
+                # Ошибка будет показана при обработке самого файла
+                continue
+            _, need_translate = resolve_languages(transcription, original_language, target_language)
+            if need_translate:
+                texts[key] = transcription
+    
+    if not texts:
+        return {}
+    
+    try:
+        with st.spinner(f"Выполняем пакетный перевод {len(texts)} файлов через OpenAI Batch API..."):
+            return utils.translate_texts_batch(texts, target_language)
+    except Exception as e:
+        st.warning(f"Пакетный перевод не удался, переводим файлы по отдельности: {str(e)}")
+        return {}
 
-# Функция для обработки YouTube видео
-def process_youtube_video(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False):
-    downloader = YouTubeDownloader(output_dir=AUDIO_FILES_DIR)
-    if not downloader.is_youtube_url(url):
-        st.error("Указанный URL не похож на ссылку YouTube видео.")
+# Параметры обработки аудио файлов
+@dataclass
+class ProcessOpts:
+    """
+    Настройки, общие для обработки файлов из любого источника.
+    """
+    save_txt: bool = True
+    save_docx: bool = True
+    create_handbook_option: bool = False
+    keep_source_audio: bool = False
+    use_batch_api: bool = False
+
+# Аудио файл, подготовленный к транскрибации
+@dataclass
+class AudioSource:
+    """
+    Аудио файл на диске и сведения, нужные для его обработки.
+    """
+    path: str
+    file_name: str
+    cache_key: Optional[str] = None  # Ключ кэша транскрибации (например, ID видео)
+    temporary: bool = False  # Временная копия: удаляется после транскрибации в любом случае
+
+# Результат обработки одного файла
+@dataclass
+class ProcessResult:
+    file_name: str
+    transcription: str
+    translated_text: str
+    handbook_text: Optional[str] = None
+    md_processed_text: Optional[str] = None
+    # Уже закодированные тексты, записанные в TXT; переиспользуются для кнопок скачивания
+    original_bytes: Optional[bytes] = None
+    translated_bytes: Optional[bytes] = None
+
+# Объем текста, который выводится в интерфейсе; полный текст доступен для скачивания
+PREVIEW_CHARS = 2048
+
+# Вывод начала текста с кнопкой скачивания полного варианта
+def _render_text(label, text, name, key, data=None):
+    # Значение виджета хранится только в session_state, а виджет ссылается на него по ключу
+    st.session_state[f"{key}_preview"] = text[:PREVIEW_CHARS] + ("…" if len(text) > PREVIEW_CHARS else "")
+    st.text_area(label, height=200, key=f"{key}_preview")
+    # on_click="ignore": скачивание не перезапускает страницу, и остальные
+    # результаты пакета остаются на экране
+    st.download_button(
+        f"Скачать: {label}",
+        data if data is not None else text.encode("utf-8"),
+        file_name=f"{name}.txt",
+        mime="text/plain",
+        key=f"{key}_download",
+        on_click="ignore"
+    )
+
+# Вывод результатов обработки файла
+def _render_result(result, target_language, index=0):
+    # Порядковый номер файла в ключах виджетов: у разных источников может совпадать имя
+    key = f"{index}_{result.file_name}"
+    # Выводим оба текста в сворачиваемом блоке, чтобы не загромождать страницу
+    with st.expander("Показать транскрибацию", expanded=False):
+        st.subheader("Оригинальная транскрибация")
+        _render_text(
+            "Оригинал", result.transcription, f"{result.file_name}_original",
+            f"{key}_original", result.original_bytes
+        )
+        st.subheader(f"Транскрибация на {target_language.capitalize()}")
+        _render_text(
+            "Перевод", result.translated_text, f"{result.file_name}_{target_language}",
+            f"{key}_{target_language}", result.translated_bytes
+        )
+
+# Приведение результатов к прежнему формату возврата функций process_*
+def _first_result(results, create_handbook_option):
+    """
+    Returns:
+        Кортеж (транскрипция, конспект, обработанный текст) для первого обработанного файла
+    """
+    if not results:
         return None, None, None
-    video_id = downloader.get_video_id(url) or "video"
-    file_name = f"youtube_{video_id}"
     
-    # Создаем отдельную папку для файла в директории экспорта
-    file_dir = os.path.join(save_path, file_name)
-    os.makedirs(file_dir, exist_ok=True)
+    # Если были созданы конспекты
+    handbooks = [result for result in results if result.handbook_text is not None]
+    if create_handbook_option and handbooks:
+        return results[0].transcription, handbooks[0].handbook_text, handbooks[0].md_processed_text
+    
+    return results[0].transcription, None, None
+
+# Ожидание документов Word, формируемых в фоне
+def _collect_docx(status, file_name, paths, translated_text, original_docx_job, translated_docx_job=None):
+    """
+    Дожидается фонового формирования документов Word и сообщает о результате в блоке статуса файла.
+    
+    Args:
+        status: Блок статуса обработки файла
+        file_name: Название файла
+        paths: Пути к результатам из output_paths
+        translated_text: Переведённый текст (нужен, если документ придется сформировать заново)
+        original_docx_job: Future с формированием документа оригинала
+        translated_docx_job: Future с формированием переведённого документа;
+            None, если перевод не требовался и документ копируется с оригинала
+    """
+    docx_ok = True
+    try:
+        original_docx_job.result()
+        status.success(f"Оригинал Word сохранен: {paths.orig_docx}")
+    except Exception as e:
+        status.error(f"Ошибка при сохранении DOCX: {str(e)}")
+        docx_ok = False
+    
+    try:
+        if translated_docx_job is not None:
+            translated_docx_job.result()
+        elif docx_ok and os.path.exists(paths.orig_docx):
+            # Текст не менялся — копируем уже сформированный документ вместо повторной генерации
+            shutil.copyfile(paths.orig_docx, paths.trans_docx)
+        else:
+            save_text_to_docx(translated_text, paths.trans_docx)
+        status.success(f"Переведённый Word сохранен: {paths.trans_docx}")
+    except Exception as e:
+        status.error(f"Ошибка при сохранении DOCX: {str(e)}")
+        docx_ok = False
+    
+    if docx_ok:
+        status.update(label=f"Файл {file_name} обработан", state="complete", expanded=False)
+    else:
+        status.update(label=f"Ошибка при сохранении документов {file_name}", state="error")
+
+# Признак окончания очереди файлов
+_QUEUE_DONE = object()
+
+# Постановка файлов в очередь транскрибации по мере их поступления
+def _submit_transcriptions(sources, transcribe_pool):
+    """
+    Перебирает источники в фоновом потоке и сразу ставит каждый файл на транскрибацию.
+    Не обращается к интерфейсу Streamlit.
+    
+    Args:
+        sources: Список AudioSource либо итератор, выдающий их по мере загрузки
+        transcribe_pool: Пул потоков для транскрибации
+        
+    Returns:
+        Очередь кортежей (AudioSource, Future, распознанный текст); в конце помещается _QUEUE_DONE
+    """
+    jobs = queue.Queue()
+    def feed():
+        try:
+            for source in sources:
+                # Распознанный текст файла по мере готовности фрагментов
+                live_text = {}
+                job = transcribe_pool.submit(
+                    _transcribe_timed, source.path, source.file_name, source.cache_key,
+                    lambda text, live=live_text: live.update(text=text)
+                )
+                jobs.put((source, job, live_text))
+        except Exception as e:
+            # Пул уже остановлен или загрузка прервалась — обрабатываем то, что успели получить
+            print(f"Ошибка при получении файлов для обработки: {str(e)}")
+        finally:
+            jobs.put(_QUEUE_DONE)
+    threading.Thread(target=feed, daemon=True).start()
+    return jobs
+
+# Чтение очереди в потоке скрипта
+def _iter_queue(items, on_wait=None, poll_interval=0.5):
+    """
+    Выдает элементы очереди до _QUEUE_DONE, вызывая on_wait, пока очередной элемент не готов.
+    """
+    while True:
+        try:
+            item = items.get(timeout=poll_interval)
+        except queue.Empty:
+            if on_wait is not None:
+                on_wait()
+            continue
+        if item is _QUEUE_DONE:
+            return
+        yield item
+
+# Фоновая загрузка файлов с выдачей путей по мере скачивания
+def _iter_downloads(download, progress_state):
+    """
+    Запускает загрузку в фоновом потоке и выдает пути к файлам, как только они скачаны.
+    Не обращается к интерфейсу Streamlit: прогресс записывается в progress_state.
+    
+    Args:
+        download: Функция загрузки, принимающая progress_callback и file_callback
+        progress_state: Словарь, в который записывается последний прогресс загрузки
+    """
+    downloaded = queue.Queue()
+    def progress_callback(percent, message):
+        progress_state["progress"] = (percent, message)
+    def worker():
+        try:
+            download(progress_callback=progress_callback, file_callback=downloaded.put)
+        except Exception as e:
+            progress_state["progress"] = (0, f"Ошибка загрузки: {str(e)}")
+        finally:
+            downloaded.put(_QUEUE_DONE)
+    threading.Thread(target=worker, daemon=True).start()
+    yield from _iter_queue(downloaded)
+
+# Создание конспекта для результата обработки файла
+def _create_result_handbook(result, file_dir, target_language, multiple=False):
+    try:
+        # Используем оригинальное имя файла без префикса "Conspect_"
+        result.handbook_text, result.md_processed_text = create_handbook(
+            result.translated_text, file_dir, result.file_name, target_language
+        )
+        if multiple:
+            st.success(f"Конспект для файла {result.file_name} успешно создан")
+    except Exception as e:
+        st.error(f"Ошибка при создании конспекта: {str(e)}")
+
+# Общая обработка аудио файлов: транскрибация, перевод, сохранение и конспект
+def _process_audio_files(sources, save_path, target_language, opts, multiple=None, on_wait=None):
+    """
+    Транскрибирует, переводит и сохраняет результаты для списка аудио файлов.
+    
+    Args:
+        sources: Список AudioSource либо итератор, выдающий их по мере загрузки
+        save_path: Путь для сохранения результатов
+        target_language: Целевой язык для перевода
+        opts: Настройки обработки ProcessOpts
+        multiple: Обрабатывается ли несколько файлов (по умолчанию определяется по длине списка)
+        on_wait: Функция, которая вызывается, пока следующий файл еще загружается
+        
+    Returns:
+        Список ProcessResult для успешно обработанных файлов
+    """
+    results = []
+    if multiple is None:
+        multiple = len(sources) > 1
+    
+    # Транскрибация выполняется в отдельном потоке по очереди для всех файлов:
+    # каждый файл распознается сразу после загрузки, а пока текущий файл
+    # переводится и сохраняется, следующий уже распознается
+    transcribe_pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        jobs = _iter_queue(_submit_transcriptions(sources, transcribe_pool), on_wait)
+        
+        # При пакетном режиме дожидаемся всех файлов и переводим их одним заданием заранее
+        batch_translations = {}
+        batch_handbooks = opts.use_batch_api and multiple
+        deferred_handbooks = []
+        if opts.use_batch_api and multiple:
+            jobs = list(jobs)
+            batch_translations = batch_translate_pending(
+                {index: job for index, (_, job, _) in enumerate(jobs)}, target_language
+            )
+        
+        for index, (source, job, live_text) in enumerate(jobs):
+            file_name = source.file_name
+            if multiple:
+                # Создаем разделитель между файлами
+                if index > 0:
+                    st.markdown("---")
+                st.subheader(f"Обработка файла: {file_name}")
+            
+            # Собираем все сообщения о ходе обработки в один сворачиваемый блок
+            with st.status(f"Обработка файла {file_name}...", expanded=True) as status:
+                # Создаем отдельную папку для файла в директории экспорта
+                file_dir = _ensure_dir(save_path, file_name)
+                paths = output_paths(file_dir, file_name, target_language)
+                
+                # Получаем информацию об аудио файле
+                try:
+                    audio = audio_info(source.path)
+                    st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
+                    st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
+                    st.write(f"Количество каналов: {audio.channels}")
+                except Exception as e:
+                    st.error(f"Ошибка при анализе файла: {str(e)}")
+                    # Уже запущенное задание не отменить: дожидаемся его, чтобы
+                    # оплаченный результат попал в кэш, и только потом решаем судьбу файла
+                    if not job.cancel():
+                        try:
+                            job.result()
+                        except Exception:
+                            pass
+                    if job.cancelled() or job.exception() is not None:
+                        # Исходный файл оставляем для повторной попытки, временную копию удаляем
+                        discard_source_audio(source.path, keep=not source.temporary)
+                    else:
+                        discard_source_audio(source.path, keep=opts.keep_source_audio and not source.temporary)
+                    status.update(label=f"Ошибка при обработке {file_name}", state="error")
+                    continue
+                
+                # Транскрибация аудио
+                with st.spinner(f"Выполняем транскрибацию файла {file_name}..."):
+                    try:
+                        transcription, original_language, from_cache, elapsed_time = _wait_transcription(
+                            job, live_text
+                        )
+                    except Exception as e:
+                        st.error(f"Ошибка при транскрибации: {str(e)}")
+                        status.update(label=f"Ошибка при обработке {file_name}", state="error")
+                        # Исходный файл оставляем, чтобы повторить транскрибацию без новой загрузки;
+                        # временная копия загруженного файла удаляется в любом случае
+                        discard_source_audio(source.path, keep=not source.temporary)
+                        continue
+                
+                # Транскрибация сохранена, исходный файл можно удалить
+                discard_source_audio(source.path, keep=opts.keep_source_audio and not source.temporary)
+                
+                if from_cache:
+                    st.info("Транскрибация найдена в кэше, повторное распознавание не требуется")
+                st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
+                
+                # Сохраняем оригинал в папку файла
+                # Кодируем текст один раз: байты пригодятся и для переведённого файла
+                original_bytes = transcription.encode("utf-8")
+                _write_text_atomic(paths.orig_txt, original_bytes)
+                if opts.save_docx:
+                    # Документ Word формируется в фоне, пока выполняется перевод
+                    original_docx_job = background_pool().submit(save_text_to_docx, transcription, paths.orig_docx)
+                st.success(f"Оригинал TXT сохранен: {paths.orig_txt}")
+                
+                # Определяем язык оригинала и при необходимости переводим транскрибацию
+                translated_text, orig_lang_name, need_translate = resolve_and_translate(
+                    transcription, original_language, target_language,
+                    file_name=file_name if multiple else None,
+                    translated_text=batch_translations.get(index)
+                )
+                
+                # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
+                translated_bytes = translated_text.encode("utf-8") if need_translate else original_bytes
+                _write_text_atomic(paths.trans_txt, translated_bytes)
+                st.success(f"Переведённый TXT сохранен: {paths.trans_txt}")
+                
+                translated_docx_job = None
+                if opts.save_docx:
+                    # Переведённый документ формируется в фоне параллельно с оригиналом,
+                    # а результат ожидаем только после создания конспекта
+                    if need_translate:
+                        translated_docx_job = background_pool().submit(save_text_to_docx, translated_text, paths.trans_docx)
+                    status.update(label=f"Файл {file_name}: формируем документы Word...", expanded=False)
+                else:
+                    status.update(label=f"Файл {file_name} обработан", state="complete", expanded=False)
+            
+            result = ProcessResult(
+                file_name, transcription, translated_text,
+                original_bytes=original_bytes, translated_bytes=translated_bytes
+            )
+            results.append(result)
+            _render_result(result, target_language, index)
+            
+            # Создаём конспект по переводу; в пакетном режиме конспекты всех файлов создаются в конце
+            if opts.create_handbook_option:
+                if batch_handbooks:
+                    deferred_handbooks.append((result, file_dir))
+                else:
+                    _create_result_handbook(result, file_dir, target_language, multiple)
+            
+            if opts.save_docx:
+                _collect_docx(status, file_name, paths, translated_text, original_docx_job, translated_docx_job)
+        
+        if deferred_handbooks:
+            st.markdown("---")
+            st.subheader("Конспекты")
+            try:
+                handbooks = create_handbooks_batch(
+                    [(result.translated_text, file_dir, result.file_name) for result, file_dir in deferred_handbooks],
+                    target_language
+                )
+                for (result, _), (handbook_text, md_processed_text) in zip(deferred_handbooks, handbooks):
+                    result.handbook_text, result.md_processed_text = handbook_text, md_processed_text
+                    st.success(f"Конспект для файла {result.file_name} успешно создан")
+            except Exception as e:
+                # Если пакетное задание не удалось, создаем конспекты обычными запросами
+                st.warning(f"Пакетное создание конспектов не удалось ({str(e)}), создаем конспекты по отдельности")
+                for result, file_dir in deferred_handbooks:
+                    _create_result_handbook(result, file_dir, target_language, multiple)
+    finally:
+        # Отменяем транскрибацию оставшихся файлов, если обработка прервалась
+        transcribe_pool.shutdown(wait=False, cancel_futures=True)
     
+    return results
+
+# Минимальный интервал между обновлениями индикатора загрузки, секунды
+PROGRESS_UPDATE_INTERVAL = 0.25
+
+# Индикатор прогресса загрузки
+def _download_progress():
+    """
+    Создает индикатор прогресса и возвращает функцию update_progress(percent, message).
+    Загрузчики вызывают ее на каждый полученный блок данных, поэтому интерфейс обновляется
+    не чаще PROGRESS_UPDATE_INTERVAL; завершение загрузки отображается всегда.
+    """
     progress_bar = st.progress(0)
     status_text = st.empty()
-    def update_progress(percent, message):
+    last_update = [0.0]
+    
+    def update_progress(percent, message, force=False):
+        now = time.monotonic()
+        if not force and percent < 100 and now - last_update[0] < PROGRESS_UPDATE_INTERVAL:
+            return
+        last_update[0] = now
         progress_bar.progress(int(percent) / 100)
         status_text.text(message)
+    
+    return update_progress
+
+# Сохранение загруженного файла во временный файл (без вызовов Streamlit)
+def _spool_upload(file_obj):
+    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file_obj.name).suffix) as tmp_file:
+        # Копируем блоками по 1 МБ, чтобы не держать в памяти вторую копию всего файла
+        file_obj.seek(0)
+        shutil.copyfileobj(file_obj, tmp_file, length=1024 * 1024)
+        return tmp_file.name
+
+# Функция для обработки нескольких загруженных файлов
+def process_uploaded_files(file_objs, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False, keep_source_audio=False):
+    """
+    Обрабатывает несколько загруженных файлов. Файлы сохраняются на диск в фоновом потоке
+    по одному: пока распознается текущий файл, следующий уже записывается во временный файл.
+    
+    Returns:
+        Список ProcessResult для успешно обработанных файлов
+    """
+    # Генератор выполняется в фоновом потоке постановки файлов на транскрибацию
+    def spooled_sources():
+        for file_obj in file_objs:
+            yield AudioSource(_spool_upload(file_obj), Path(file_obj.name).stem, temporary=True)
+    
+    opts = ProcessOpts(save_txt, save_docx, create_handbook_option, keep_source_audio)
+    return _process_audio_files(
+        spooled_sources(), save_path, target_language, opts, multiple=len(file_objs) > 1
+    )
+
+# Функция для обработки YouTube видео
+def process_youtube_video(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False, keep_source_audio=False):
+    downloader = _youtube_downloader()
+    if not downloader.is_youtube_url(url):
+        st.error("Указанный URL не похож на ссылку YouTube видео.")
+        return None, None, None
+    video_id = downloader.get_video_id(url)
+    file_name = f"youtube_{video_id or 'video'}"
+    
+    update_progress = _download_progress()
     with st.spinner("Загружаем аудио из YouTube видео..."):
         audio_file = downloader.download_audio(
             url=url, 
@@ -452,91 +1334,16 @@ def process_youtube_video(url, save_path, target_language, save_txt=True, save_d
         st.error("Ошибка при загрузке аудио из YouTube видео.")
         return None, None, None
     st.success(f"Аудио успешно загружено: {audio_file}")
-    audio = audio_info(audio_file)
-    st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
-    st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
-    st.write(f"Количество каналов: {audio.channels}")
-    # Транскрибация аудио
-    with st.spinner("Выполняем транскрибацию..."):
-        start_time = time.time()
-        transcription, original_language = transcribe_audio_whisper(
-            audio_path=audio_file,
-            file_title=file_name,
-            save_folder_path=TEMP_FILES_DIR  # Сохраняем рабочий файл во временную директорию
-        )
-        transcription = utils.format_transcription_paragraphs(transcription)
-        elapsed_time = time.time() - start_time
-    st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
-    
-    # Сохраняем оригинал в папку файла
-    original_txt_path = os.path.join(file_dir, f"Original_{file_name}.txt")
-    with open(original_txt_path, "w", encoding="utf-8") as f:
-        f.write(transcription)
-    if save_docx:
-        original_docx_path = os.path.join(file_dir, f"Original_{file_name}.docx")
-        save_text_to_docx(transcription, original_docx_path)
-        st.success(f"Оригинал Word сохранен: {original_docx_path}")
-    st.success(f"Оригинал TXT сохранен: {original_txt_path}")
-
-    # Унифицированная логика определения необходимости перевода
-    lang_map = {"русский": "ru", "казахский": "kk", "английский": "en"}
-    lang_code_to_name = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
-                        "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
-                        "de": "немецкий", "it": "итальянский", "pt": "португальский"}
-    
-    # Получаем код оригинального языка
-    orig_lang_code = original_language.lower() if original_language else "unknown"
-    
-    # Дополнительная проверка для корейского и других языков
-    if orig_lang_code == "unknown" or orig_lang_code not in ["ru", "kk", "en", "ko", "ja", "zh"]:
-        # Повторно определяем язык из текста
-        orig_lang_code = utils.detect_language(transcription)
-    
-    # Получаем код целевого языка
-    target_lang_code = lang_map.get(target_language.lower(), "ru")
-    
-    # Всегда переводим с языка, отличного от целевого
-    need_translate = orig_lang_code != target_lang_code
-    translated_text = transcription  # По умолчанию используем оригинальный текст
-    
-    # Показываем информацию о языке оригинала для диагностики
-    orig_lang_name = lang_code_to_name.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
-    st.info(f"Определен язык оригинала: {orig_lang_name}")
     
-    if need_translate:
-        with st.spinner(f"Переводим транскрибацию с {orig_lang_name} на {target_language}..."):
-            translated_text = utils.translate_text_gpt(transcription, target_language)
-        st.success(f"Перевод завершён!")
-    else:
-        st.info(f"Язык оригинала ({orig_lang_name}) совпадает с целевым языком ({target_language}). Перевод не требуется.")
-
-    # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
-    trans_txt_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.txt")
-    with open(trans_txt_path, "w", encoding="utf-8") as f:
-        f.write(translated_text)
-    if save_docx:
-        trans_docx_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.docx")
-        save_text_to_docx(translated_text, trans_docx_path)
-        st.success(f"Переведённый Word сохранен: {trans_docx_path}")
-    st.success(f"Переведённый TXT сохранен: {trans_txt_path}")
-
-    # Выводим оба текста
-    st.subheader("Оригинальная транскрибация")
-    st.text_area("Оригинал", transcription, height=200)
-    st.subheader(f"Транскрибация на {target_language.capitalize()}")
-    st.text_area("Перевод", translated_text, height=200)
-
-    # Создаём конспект по переводу
-    handbook_text = None
-    if create_handbook_option:
-        # Используем оригинальное имя файла без префикса "Conspect_"
-        handbook_text, md_processed_text = create_handbook(translated_text, file_dir, file_name, target_language)
-        return transcription, handbook_text, md_processed_text
-
-    return transcription, None, None
+    opts = ProcessOpts(save_txt, save_docx, create_handbook_option, keep_source_audio)
+    results = _process_audio_files(
+        [AudioSource(audio_file, file_name, cache_key=file_name if video_id else None)],
+        save_path, target_language, opts
+    )
+    return _first_result(results, create_handbook_option)
 
 # Функция для обработки видео из ВКонтакте
-def process_vk_video(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False):
+def process_vk_video(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False, keep_source_audio=False):
     """
     Скачивает и обрабатывает видео из ВКонтакте
     
@@ -547,29 +1354,22 @@ def process_vk_video(url, save_path, target_language, save_txt=True, save_docx=T
         save_txt: Сохранять ли результат в TXT
         save_docx: Сохранять ли результат в DOCX
         create_handbook_option: Создавать ли конспект
+        keep_source_audio: Сохранять ли скачанное аудио после транскрибации
         
     Returns:
         Кортеж с результатами (транскрипция, конспект, обработанный текст)
     """
-    downloader = VKVideoDownloader(output_dir=AUDIO_FILES_DIR)
+    downloader = _vk_downloader()
     if not downloader.is_vk_url(url):
         st.error("Указанный URL не похож на ссылку на видео ВКонтакте.")
         return None, None, None
     
     # Нормализуем URL, чтобы обработать ссылки из разных источников
     url = downloader.normalize_vk_url(url)
-    video_id = downloader.get_video_id(url) or "video"
-    file_name = f"vk_video_{video_id}"
+    video_id = downloader.get_video_id(url)
+    file_name = f"vk_video_{video_id or 'video'}"
     
-    # Создаем отдельную папку для файла в директории экспорта
-    file_dir = os.path.join(save_path, file_name)
-    os.makedirs(file_dir, exist_ok=True)
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    def update_progress(percent, message):
-        progress_bar.progress(int(percent) / 100)
-        status_text.text(message)
+    update_progress = _download_progress()
     
     with st.spinner("Загружаем аудио из видео ВКонтакте..."):
         audio_file = downloader.download_audio(
@@ -583,110 +1383,24 @@ def process_vk_video(url, save_path, target_language, save_txt=True, save_docx=T
         return None, None, None
     
     st.success(f"Аудио успешно загружено: {audio_file}")
-    audio = audio_info(audio_file)
-    st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
-    st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
-    st.write(f"Количество каналов: {audio.channels}")
-    
-    # Транскрибация аудио
-    with st.spinner("Выполняем транскрибацию..."):
-        start_time = time.time()
-        transcription, original_language = transcribe_audio_whisper(
-            audio_path=audio_file,
-            file_title=file_name,
-            save_folder_path=TEMP_FILES_DIR  # Сохраняем рабочий файл во временную директорию
-        )
-        transcription = utils.format_transcription_paragraphs(transcription)
-        elapsed_time = time.time() - start_time
-    
-    st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
-    
-    # Сохраняем оригинал в папку файла
-    original_txt_path = os.path.join(file_dir, f"Original_{file_name}.txt")
-    with open(original_txt_path, "w", encoding="utf-8") as f:
-        f.write(transcription)
-    if save_docx:
-        original_docx_path = os.path.join(file_dir, f"Original_{file_name}.docx")
-        save_text_to_docx(transcription, original_docx_path)
-        st.success(f"Оригинал Word сохранен: {original_docx_path}")
-    st.success(f"Оригинал TXT сохранен: {original_txt_path}")
-
-    # Определяем, нужен ли перевод
-    # Словари для маппинга названий языков в коды и наоборот
-    lang_map = {"русский": "ru", "казахский": "kk", "английский": "en"}
-    lang_code_to_name = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
-                        "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
-                        "de": "немецкий", "it": "итальянский", "pt": "португальский"}
-    
-    # Получаем код оригинального языка
-    orig_lang_code = original_language.lower() if original_language else "unknown"
-    
-    # Дополнительная проверка для корейского и других языков
-    if orig_lang_code == "unknown" or orig_lang_code not in ["ru", "kk", "en", "ko", "ja", "zh"]:
-        # Повторно определяем язык из текста
-        orig_lang_code = utils.detect_language(transcription)
-    
-    # Получаем код целевого языка
-    target_lang_code = lang_map.get(target_language.lower(), "ru")
-    
-    # Всегда переводим с языка, отличного от целевого
-    need_translate = orig_lang_code != target_lang_code
-    translated_text = transcription  # По умолчанию используем оригинальный текст
-    
-    # Показываем информацию о языке оригинала для диагностики
-    orig_lang_name = lang_code_to_name.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
-    st.info(f"Определен язык оригинала: {orig_lang_name}")
     
-    if need_translate:
-        with st.spinner(f"Переводим транскрибацию с {orig_lang_name} на {target_language}..."):
-            translated_text = utils.translate_text_gpt(transcription, target_language)
-        st.success(f"Перевод завершён!")
-    else:
-        st.info(f"Язык оригинала ({orig_lang_name}) совпадает с целевым языком ({target_language}). Перевод не требуется.")
-
-    # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
-    trans_txt_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.txt")
-    with open(trans_txt_path, "w", encoding="utf-8") as f:
-        f.write(translated_text)
-    if save_docx:
-        trans_docx_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.docx")
-        save_text_to_docx(translated_text, trans_docx_path)
-        st.success(f"Переведённый Word сохранен: {trans_docx_path}")
-    st.success(f"Переведённый TXT сохранен: {trans_txt_path}")
-
-    # Выводим оба текста
-    st.subheader("Оригинальная транскрибация")
-    st.text_area("Оригинал", transcription, height=200)
-    st.subheader(f"Транскрибация на {target_language.capitalize()}")
-    st.text_area("Перевод", translated_text, height=200)
-
-    # Создаём конспект по переводу
-    handbook_text = None
-    if create_handbook_option:
-        # Используем оригинальное имя файла без префикса "Conspect_"
-        handbook_text, md_processed_text = create_handbook(translated_text, file_dir, file_name, target_language)
-        return transcription, handbook_text, md_processed_text
-
-    return transcription, None, None
+    opts = ProcessOpts(save_txt, save_docx, create_handbook_option, keep_source_audio)
+    results = _process_audio_files(
+        [AudioSource(audio_file, file_name, cache_key=file_name if video_id else None)],
+        save_path, target_language, opts
+    )
+    return _first_result(results, create_handbook_option)
 
 # Функция для обработки Instagram видео
-def process_instagram_video(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False):
-    downloader = InstagramDownloader(output_dir=AUDIO_FILES_DIR)
+def process_instagram_video(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False, keep_source_audio=False):
+    downloader = _instagram_downloader()
     if not downloader.is_instagram_url(url):
         st.error("Указанный URL не похож на ссылку Instagram видео.")
         return None, None, None
-    shortcode = downloader.extract_shortcode(url) or "video"
-    file_name = f"instagram_{shortcode}"
+    shortcode = downloader.extract_shortcode(url)
+    file_name = f"instagram_{shortcode or 'video'}"
     
-    # Создаем отдельную папку для файла в директории экспорта
-    file_dir = os.path.join(save_path, file_name)
-    os.makedirs(file_dir, exist_ok=True)
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    def update_progress(percent, message):
-        progress_bar.progress(int(percent) / 100)
-        status_text.text(message)
+    update_progress = _download_progress()
     with st.spinner("Загружаем аудио из Instagram видео..."):
         audio_file = downloader.download_audio(
             url=url, 
@@ -697,91 +1411,54 @@ def process_instagram_video(url, save_path, target_language, save_txt=True, save
         st.error("Ошибка при загрузке аудио из Instagram видео.")
         return None, None, None
     st.success(f"Аудио успешно загружено: {audio_file}")
-    audio = audio_info(audio_file)
-    st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
-    st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
-    st.write(f"Количество каналов: {audio.channels}")
-    # Транскрибация аудио
-    with st.spinner("Выполняем транскрибацию..."):
-        start_time = time.time()
-        transcription, original_language = transcribe_audio_whisper(
-            audio_path=audio_file,
-            file_title=file_name,
-            save_folder_path=TEMP_FILES_DIR  # Сохраняем рабочий файл во временную директорию
-        )
-        transcription = utils.format_transcription_paragraphs(transcription)
-        elapsed_time = time.time() - start_time
-    st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
-    
-    # Сохраняем оригинал в папку файла
-    original_txt_path = os.path.join(file_dir, f"Original_{file_name}.txt")
-    with open(original_txt_path, "w", encoding="utf-8") as f:
-        f.write(transcription)
-    if save_docx:
-        original_docx_path = os.path.join(file_dir, f"Original_{file_name}.docx")
-        save_text_to_docx(transcription, original_docx_path)
-        st.success(f"Оригинал Word сохранен: {original_docx_path}")
-    st.success(f"Оригинал TXT сохранен: {original_txt_path}")
-
-    # Унифицированная логика определения необходимости перевода
-    lang_map = {"русский": "ru", "казахский": "kk", "английский": "en"}
-    lang_code_to_name = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
-                        "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
-                        "de": "немецкий", "it": "итальянский", "pt": "португальский"}
-    
-    # Получаем код оригинального языка
-    orig_lang_code = original_language.lower() if original_language else "unknown"
-    
-    # Дополнительная проверка для корейского и других языков
-    if orig_lang_code == "unknown" or orig_lang_code not in ["ru", "kk", "en", "ko", "ja", "zh"]:
-        # Повторно определяем язык из текста
-        orig_lang_code = utils.detect_language(transcription)
-    
-    # Получаем код целевого языка
-    target_lang_code = lang_map.get(target_language.lower(), "ru")
-    
-    # Всегда переводим с языка, отличного от целевого
-    need_translate = orig_lang_code != target_lang_code
-    translated_text = transcription  # По умолчанию используем оригинальный текст
-    
-    # Показываем информацию о языке оригинала для диагностики
-    orig_lang_name = lang_code_to_name.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
-    st.info(f"Определен язык оригинала: {orig_lang_name}")
     
-    if need_translate:
-        with st.spinner(f"Переводим транскрибацию с {orig_lang_name} на {target_language}..."):
-            translated_text = utils.translate_text_gpt(transcription, target_language)
-        st.success(f"Перевод завершён!")
-    else:
-        st.info(f"Язык оригинала ({orig_lang_name}) совпадает с целевым языком ({target_language}). Перевод не требуется.")
-
-    # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
-    trans_txt_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.txt")
-    with open(trans_txt_path, "w", encoding="utf-8") as f:
-        f.write(translated_text)
-    if save_docx:
-        trans_docx_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.docx")
-        save_text_to_docx(translated_text, trans_docx_path)
-        st.success(f"Переведённый Word сохранен: {trans_docx_path}")
-    st.success(f"Переведённый TXT сохранен: {trans_txt_path}")
-
-    # Выводим оба текста
-    st.subheader("Оригинальная транскрибация")
-    st.text_area("Оригинал", transcription, height=200)
-    st.subheader(f"Транскрибация на {target_language.capitalize()}")
-    st.text_area("Перевод", translated_text, height=200)
-
-    # Создаём конспект по переводу
-    handbook_text = None
-    if create_handbook_option:
-        # Используем оригинальное имя файла без префикса "Conspect_"
-        handbook_text, md_processed_text = create_handbook(translated_text, file_dir, file_name, target_language)
-        return transcription, handbook_text, md_processed_text
+    opts = ProcessOpts(save_txt, save_docx, create_handbook_option, keep_source_audio)
+    results = _process_audio_files(
+        [AudioSource(audio_file, file_name, cache_key=file_name if shortcode else None)],
+        save_path, target_language, opts
+    )
+    return _first_result(results, create_handbook_option)
 
-    return transcription, None, None
+# Обработка файлов, которые скачиваются в фоне
+def _process_downloads(download, save_path, target_language, opts, multiple):
+    """
+    Скачивает файлы в фоновом потоке и начинает обработку каждого файла сразу после его загрузки,
+    не дожидаясь остальных.
+    
+    Args:
+        download: Функция загрузки, принимающая progress_callback и file_callback
+        save_path: Путь для сохранения результатов
+        target_language: Целевой язык для перевода
+        opts: Настройки обработки ProcessOpts
+        multiple: Может ли источник содержать несколько файлов (папка)
+        
+    Returns:
+        Кортеж (список ProcessResult, количество скачанных файлов)
+    """
+    # Отображаем прогресс загрузки
+    show_progress = _download_progress()
+    progress_state = {}
+    downloaded_files = []
+    
+    def update_progress(force=False):
+        progress = progress_state.get("progress")
+        if progress is not None:
+            show_progress(*progress, force=force)
+    
+    def downloaded_sources():
+        for file_path in _iter_downloads(download, progress_state):
+            downloaded_files.append(file_path)
+            yield AudioSource(file_path, Path(file_path).stem)
+    
+    results = _process_audio_files(
+        downloaded_sources(), save_path, target_language, opts,
+        multiple=multiple, on_wait=update_progress
+    )
+    update_progress(force=True)
+    return results, len(downloaded_files)
 
 # Функция для обработки файлов с Яндекс Диска
-def process_yandex_disk_files(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False):
+def process_yandex_disk_files(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False, keep_source_audio=False, use_batch_api=False):
     """
     Скачивает и обрабатывает аудио и видео файлы с Яндекс Диска
     
@@ -792,161 +1469,32 @@ def process_yandex_disk_files(url, save_path, target_language, save_txt=True, sa
         save_txt: Сохранять ли результат в TXT
         save_docx: Сохранять ли результат в DOCX
         create_handbook_option: Создавать ли конспект
+        keep_source_audio: Сохранять ли скачанное аудио после транскрибации
+        use_batch_api: Переводить файлы одним пакетным заданием OpenAI Batch API
         
     Returns:
         Кортеж с результатами (транскрипция, конспект, обработанный текст)
     """
-    downloader = YandexDiskDownloader(output_dir=AUDIO_FILES_DIR)
+    downloader = _yandex_disk_downloader()
     if not downloader.is_yandex_disk_url(url):
         st.error("Указанный URL не является ссылкой на Яндекс Диск.")
         return None, None, None
     
-    # Отображаем прогресс загрузки
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    def update_progress(percent, message):
-        progress_bar.progress(int(percent) / 100)
-        status_text.text(message)
+    opts = ProcessOpts(save_txt, save_docx, create_handbook_option, keep_source_audio, use_batch_api)
+    results, downloaded_count = _process_downloads(
+        partial(downloader.process_yandex_disk_url, url), save_path, target_language, opts,
+        multiple=downloader.is_folder_url(url)
+    )
     
-    # Загружаем файлы с Яндекс Диска
-    with st.spinner("Загружаем файлы с Яндекс Диска..."):
-        downloaded_files = downloader.process_yandex_disk_url(url, progress_callback=update_progress)
-    
-    if not downloaded_files:
+    if not downloaded_count:
         st.error("Не удалось загрузить файлы с Яндекс Диска.")
         return None, None, None
     
-    st.success(f"Успешно загружено файлов: {len(downloaded_files)}")
-    
-    # Обрабатываем каждый скачанный файл
-    all_transcriptions = []
-    all_handbooks = []
-    
-    for file_path in downloaded_files:
-        if file_path is None or not os.path.exists(file_path):
-            st.warning(f"Пропускаем некорректный файл")
-            continue
-            
-        file_name = Path(file_path).stem
-        st.subheader(f"Обработка файла: {file_name}")
-        
-        # Создаем отдельную папку для файла в директории экспорта
-        file_dir = os.path.join(save_path, file_name)
-        os.makedirs(file_dir, exist_ok=True)
-        
-        # Получаем информацию об аудио файле
-        try:
-            audio = audio_info(file_path)
-            st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
-            st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
-            st.write(f"Количество каналов: {audio.channels}")
-        except Exception as e:
-            st.error(f"Ошибка при анализе файла: {str(e)}")
-            continue
-        
-        # Транскрибация аудио
-        with st.spinner(f"Выполняем транскрибацию файла {file_name}..."):
-            start_time = time.time()
-            try:
-                transcription, original_language = transcribe_audio_whisper(
-                    audio_path=file_path,
-                    file_title=file_name,
-                    save_folder_path=TEMP_FILES_DIR  # Сохраняем рабочий файл во временную директорию
-                )
-                transcription = utils.format_transcription_paragraphs(transcription)
-                elapsed_time = time.time() - start_time
-            except Exception as e:
-                st.error(f"Ошибка при транскрибации: {str(e)}")
-                continue
-
-        st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
-        
-        # Сохраняем оригинал в папку файла
-        original_txt_path = os.path.join(file_dir, f"Original_{file_name}.txt")
-        with open(original_txt_path, "w", encoding="utf-8") as f:
-            f.write(transcription)
-        if save_docx:
-            original_docx_path = os.path.join(file_dir, f"Original_{file_name}.docx")
-            save_text_to_docx(transcription, original_docx_path)
-            st.success(f"Оригинал Word сохранен: {original_docx_path}")
-        st.success(f"Оригинал TXT сохранен: {original_txt_path}")
-        
-        # Добавляем в список всех транскрипций
-        all_transcriptions.append((file_name, transcription, transcription))  # Временно добавляем без перевода
-
-        # Определяем, нужен ли перевод
-        # Словари для маппинга названий языков в коды и наоборот
-        lang_map = {"русский": "ru", "казахский": "kk", "английский": "en"}
-        lang_code_to_name = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
-                            "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
-                            "de": "немецкий", "it": "итальянский", "pt": "португальский"}
-        
-        # Получаем код оригинального языка
-        orig_lang_code = original_language.lower() if original_language else "unknown"
-        
-        # Дополнительная проверка для корейского и других языков
-        if orig_lang_code == "unknown" or orig_lang_code not in ["ru", "kk", "en", "ko", "ja", "zh"]:
-            # Определяем язык из текста с помощью нашей улучшенной функции
-            orig_lang_code = utils.detect_language(transcription)
-        
-        # Получаем код целевого языка
-        target_lang_code = lang_map.get(target_language.lower(), "ru")
-        
-        # Всегда переводим с языка, отличного от целевого
-        need_translate = orig_lang_code != target_lang_code
-        translated_text = transcription  # По умолчанию используем оригинальный текст
-        
-        # Показываем информацию о языке оригинала для диагностики
-        orig_lang_name = lang_code_to_name.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
-        st.info(f"Определен язык оригинала: {orig_lang_name}")
-        
-        if need_translate:
-            with st.spinner(f"Переводим транскрибацию файла {file_name} с {orig_lang_name} на {target_language}..."):
-                translated_text = utils.translate_text_gpt(transcription, target_language)
-            st.success(f"Перевод файла {file_name} завершён!")
-            # Обновляем перевод в списке транскрипций
-            all_transcriptions[-1] = (file_name, transcription, translated_text)
-        else:
-            st.info(f"Язык оригинала ({orig_lang_name}) для файла {file_name} совпадает с целевым языком ({target_language}). Перевод не требуется.")
-        
-        # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
-        trans_txt_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.txt")
-        with open(trans_txt_path, "w", encoding="utf-8") as f:
-            f.write(translated_text)
-        if save_docx:
-            trans_docx_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.docx")
-            save_text_to_docx(translated_text, trans_docx_path)
-            st.success(f"Переведённый Word сохранен: {trans_docx_path}")
-        st.success(f"Переведённый TXT сохранен: {trans_txt_path}")
-
-        # Выводим оба текста
-        st.subheader("Оригинальная транскрибация")
-        st.text_area("Оригинал", transcription, height=200)
-        st.subheader(f"Транскрибация на {target_language.capitalize()}")
-        st.text_area("Перевод", translated_text, height=200)
-
-        # Создаём конспект по переводу
-        handbook_text = None
-        if create_handbook_option:
-            # Используем оригинальное имя файла без префикса "Conspect_"
-            handbook_text, md_processed_text = create_handbook(translated_text, file_dir, file_name, target_language)
-            all_handbooks.append((file_name, handbook_text, md_processed_text))
-            st.success(f"Конспект для файла {file_name} успешно создан")
-    
-    # Если были созданы конспекты
-    if create_handbook_option and len(all_handbooks) > 0:
-        transcription = all_transcriptions[0][1] if len(all_transcriptions) > 0 else None
-        return transcription, all_handbooks[0][1], all_handbooks[0][2]
-    
-    # Возвращаем результаты для первого файла
-    if len(all_transcriptions) > 0:
-        return all_transcriptions[0][1], None, None
-    
-    return None, None, None
+    st.success(f"Успешно загружено файлов: {downloaded_count}")
+    return _first_result(results, create_handbook_option)
 
 # Функция для обработки Google Drive файлов
-def process_gdrive_files(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False):
+def process_gdrive_files(url, save_path, target_language, save_txt=True, save_docx=True, create_handbook_option=False, keep_source_audio=False, use_batch_api=False):
     """
     Скачивает и обрабатывает аудио и видео файлы с Google Drive
     
@@ -957,157 +1505,193 @@ def process_gdrive_files(url, save_path, target_language, save_txt=True, save_do
         save_txt: Сохранять ли результат в TXT
         save_docx: Сохранять ли результат в DOCX
         create_handbook_option: Создавать ли конспект
+        keep_source_audio: Сохранять ли скачанное аудио после транскрибации
+        use_batch_api: Переводить файлы одним пакетным заданием OpenAI Batch API
         
     Returns:
         Кортеж с результатами (транскрипция, конспект, обработанный текст)
     """
-    downloader = GoogleDriveDownloader(output_dir=AUDIO_FILES_DIR)
+    downloader = _gdrive_downloader()
     if not downloader.is_gdrive_url(url):
         st.error("Указанный URL не является ссылкой на Google Drive.")
         return None, None, None
     
-    # Отображаем прогресс загрузки
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    def update_progress(percent, message):
-        progress_bar.progress(int(percent) / 100)
-        status_text.text(message)
-    
-    # Загружаем файлы с Google Drive
-    with st.spinner("Загружаем файлы с Google Drive..."):
-        downloaded_files = downloader.process_gdrive_url(url, progress_callback=update_progress)
+    opts = ProcessOpts(save_txt, save_docx, create_handbook_option, keep_source_audio, use_batch_api)
+    results, downloaded_count = _process_downloads(
+        partial(downloader.process_gdrive_url, url), save_path, target_language, opts,
+        multiple=downloader.is_folder_url(url)
+    )
     
-    if not downloaded_files:
+    if not downloaded_count:
         st.error("Не удалось загрузить файлы с Google Drive.")
         return None, None, None
     
-    st.success(f"Успешно загружено файлов: {len(downloaded_files)}")
-    
-    # Обрабатываем каждый скачанный файл
-    all_transcriptions = []
-    all_handbooks = []
-    
-    for file_path in downloaded_files:
-        file_name = Path(file_path).stem
-        st.subheader(f"Обработка файла: {file_name}")
-        
-        # Создаем отдельную папку для файла в директории экспорта
-        file_dir = os.path.join(save_path, file_name)
-        os.makedirs(file_dir, exist_ok=True)
-        
-        # Получаем информацию об аудио файле
-        try:
-            audio = audio_info(file_path)
-            st.write(f"Продолжительность: {audio.duration_seconds / 60:.2f} мин.")
-            st.write(f"Частота дискретизации: {audio.frame_rate} Гц")
-            st.write(f"Количество каналов: {audio.channels}")
-        except Exception as e:
-            st.error(f"Ошибка при анализе файла: {str(e)}")
-            continue
-        
-        # Транскрибация аудио
-        with st.spinner(f"Выполняем транскрибацию файла {file_name}..."):
-            start_time = time.time()
-            try:
-                transcription, original_language = transcribe_audio_whisper(
-                    audio_path=file_path,
-                    file_title=file_name,
-                    save_folder_path=TEMP_FILES_DIR  # Сохраняем рабочий файл во временную директорию
+    st.success(f"Успешно загружено файлов: {downloaded_count}")
+    return _first_result(results, create_handbook_option)
+
+# Вкладки оформлены фрагментами: действия внутри вкладки перезапускают только ее,
+# не затрагивая остальные вкладки
+
+# Вкладка для локальных файлов
+@st.fragment
+def _local_files_tab(settings):
+    st.header("Загрузить локальный файл")
+    uploaded_files = st.file_uploader(
+        "Выберите аудио или видео файлы", 
+        type=["mp3", "mp4", "wav", "m4a", "avi", "mov"],
+        accept_multiple_files=True,  # Включаем поддержку множественной загрузки
+        key="local_uploader"
+    )
+
+    if uploaded_files:
+        # Показываем счетчик загруженных файлов
+        st.success(f"Загружено файлов: {len(uploaded_files)}")
+
+        # Создаем аккордеон для просмотра каждого файла
+        with st.expander("Просмотр загруженных файлов", expanded=False):
+            for i, uploaded_file in enumerate(uploaded_files):
+                st.subheader(f"Файл #{i+1}: {uploaded_file.name}")
+                if uploaded_file.type.startswith('audio/') or uploaded_file.name.endswith(('.mp3', '.wav', '.m4a')):
+                    st.audio(uploaded_file)
+                elif uploaded_file.type.startswith('video/') or uploaded_file.name.endswith(('.mp4', '.avi', '.mov')):
+                    st.video(uploaded_file)
+
+        if st.button("Транскрибировать выбранные файлы", key="local_transcribe_btn"):
+            if not settings.api_key:
+                st.error("Пожалуйста, введите API ключ OpenAI в настройках")
+            else:
+                # Обрабатываем загруженные файлы: запись на диск идет параллельно с транскрибацией
+                process_uploaded_files(
+                    uploaded_files,
+                    settings.save_dir,
+                    settings.target_language,
+                    save_txt=settings.save_txt,
+                    save_docx=settings.save_docx,
+                    create_handbook_option=settings.create_handbook,
+                    keep_source_audio=settings.keep_source_audio
                 )
-                transcription = utils.format_transcription_paragraphs(transcription)
-                elapsed_time = time.time() - start_time
-            except Exception as e:
-                st.error(f"Ошибка при транскрибации: {str(e)}")
-                continue
 
-        st.success(f"Транскрибация завершена за {elapsed_time / 60:.2f} минут!")
-        
-        # Сохраняем оригинал в папку файла
-        original_txt_path = os.path.join(file_dir, f"Original_{file_name}.txt")
-        with open(original_txt_path, "w", encoding="utf-8") as f:
-            f.write(transcription)
-        if save_docx:
-            original_docx_path = os.path.join(file_dir, f"Original_{file_name}.docx")
-            save_text_to_docx(transcription, original_docx_path)
-            st.success(f"Оригинал Word сохранен: {original_docx_path}")
-        st.success(f"Оригинал TXT сохранен: {original_txt_path}")
-        
-        # Добавляем транскрипцию в список
-        all_transcriptions.append((file_name, transcription))
-
-        # Определяем, нужен ли перевод
-        # Словари для маппинга названий языков в коды и наоборот
-        lang_map = {"русский": "ru", "казахский": "kk", "английский": "en"}
-        lang_code_to_name = {"ru": "русский", "kk": "казахский", "en": "английский", "ko": "корейский", 
-                            "ja": "японский", "zh": "китайский", "es": "испанский", "fr": "французский", 
-                            "de": "немецкий", "it": "итальянский", "pt": "португальский"}
-        
-        # Получаем код оригинального языка
-        orig_lang_code = original_language.lower() if original_language else "unknown"
-        
-        # Дополнительная проверка для корейского и других языков
-        if orig_lang_code == "unknown" or orig_lang_code not in ["ru", "kk", "en", "ko", "ja", "zh"]:
-            # Повторно определяем язык из текста
-            orig_lang_code = utils.detect_language(transcription)
-        
-        # Получаем код целевого языка
-        target_lang_code = lang_map.get(target_language.lower(), "ru")
-        
-        # Всегда переводим с языка, отличного от целевого
-        need_translate = orig_lang_code != target_lang_code
-        translated_text = transcription  # По умолчанию используем оригинальный текст
-        
-        # Показываем информацию о языке оригинала для диагностики
-        orig_lang_name = lang_code_to_name.get(orig_lang_code, f"неизвестный ({orig_lang_code})")
-        st.info(f"Определен язык оригинала: {orig_lang_name}")
-        
-        if need_translate:
-            with st.spinner(f"Переводим транскрибацию файла {file_name} с {orig_lang_name} на {target_language}..."):
-                translated_text = utils.translate_text_gpt(transcription, target_language)
-            st.success(f"Перевод файла {file_name} завершён!")
-        else:
-            st.info(f"Язык оригинала ({orig_lang_name}) для файла {file_name} совпадает с целевым языком ({target_language}). Перевод не требуется.")
-
-        # Сохраняем переведённую транскрипцию или оригинал, если перевод не нужен
-        trans_txt_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.txt")
-        with open(trans_txt_path, "w", encoding="utf-8") as f:
-            f.write(translated_text)
-        if save_docx:
-            trans_docx_path = os.path.join(file_dir, f"{target_language.capitalize()}_{file_name}.docx")
-            save_text_to_docx(translated_text, trans_docx_path)
-            st.success(f"Переведённый Word сохранен: {trans_docx_path}")
-        st.success(f"Переведённый TXT сохранен: {trans_txt_path}")
-
-        # Выводим оба текста
-        st.subheader("Оригинальная транскрибация")
-        st.text_area("Оригинал", transcription, height=200)
-        st.subheader(f"Транскрибация на {target_language.capitalize()}")
-        st.text_area("Перевод", translated_text, height=200)
+                st.success(f"Обработка всех файлов завершена! Всего обработано: {len(uploaded_files)}")
+
+# Вкладка для YouTube
+@st.fragment
+def _youtube_tab(settings):
+    st.header("YouTube видео")
+    youtube_url = st.text_input("Введите ссылку на YouTube видео", key="youtube_url")
+    if youtube_url:
+        if st.button("Транскрибировать YouTube видео", key="youtube_transcribe_btn"):
+            if not settings.api_key:
+                st.error("Пожалуйста, введите API ключ OpenAI в настройках")
+            else:
+                process_youtube_video(
+                    youtube_url,
+                    settings.save_dir,
+                    settings.target_language,
+                    save_txt=settings.save_txt,
+                    save_docx=settings.save_docx,
+                    create_handbook_option=settings.create_handbook,
+                    keep_source_audio=settings.keep_source_audio
+                )
 
-        # Создаём конспект по переводу
-        handbook_text = None
-        if create_handbook_option:
-            # Используем оригинальное имя файла без префикса "Conspect_"
-            try:
-                handbook_text, md_processed_text = create_handbook(translated_text, file_dir, file_name, target_language)
-                all_handbooks.append((file_name, handbook_text, md_processed_text))
-                st.success(f"Конспект для файла {file_name} успешно создан")
-            except Exception as e:
-                st.error(f"Ошибка при создании конспекта: {str(e)}")
-    
-    # Исправляем возврат результатов - добавляем проверки на пустые списки
-    # Если были созданы конспекты
-    if create_handbook_option and len(all_handbooks) > 0:
-        transcription = all_transcriptions[0][1] if len(all_transcriptions) > 0 else None
-        return transcription, all_handbooks[0][1], all_handbooks[0][2]
-    
-    # Возвращаем результаты для первого файла
-    if len(all_transcriptions) > 0:
-        return all_transcriptions[0][1], None, None
-    
-    return None, None, None
+# Новая вкладка для VK видео
+@st.fragment
+def _vk_tab(settings):
+    st.header("VK видео")
+    vk_url = st.text_input("Введите ссылку на видео ВКонтакте", key="vk_url")
+
+    st.info("""
+    Поддерживаются следующие типы ссылок:
+    - Прямые ссылки на видео: https://vk.com/video-220754053_456243260
+    - Ссылки из браузера: https://vk.com/vkvideo?z=video-220754053_456243260%2Fvideos-220754053%2Fpl_-220754053_-2
+    """)
+
+    if vk_url:
+        if st.button("Транскрибировать VK видео", key="vk_transcribe_btn"):
+            if not settings.api_key:
+                st.error("Пожалуйста, введите API ключ OpenAI в настройках")
+            else:
+                process_vk_video(
+                    vk_url,
+                    settings.save_dir,
+                    settings.target_language,
+                    save_txt=settings.save_txt,
+                    save_docx=settings.save_docx,
+                    create_handbook_option=settings.create_handbook,
+                    keep_source_audio=settings.keep_source_audio
+                )
+
+# Вкладка для Instagram
+@st.fragment
+def _instagram_tab(settings):
+    st.header("Instagram видео")
+    instagram_url = st.text_input("Введите ссылку на Instagram видео поста или reels", key="instagram_url")
+
+    if instagram_url:
+        if st.button("Транскрибировать Instagram видео", key="instagram_transcribe_btn"):
+            if not settings.api_key:
+                st.error("Пожалуйста, введите API ключ OpenAI в настройках")
+            else:
+                process_instagram_video(
+                    instagram_url,
+                    settings.save_dir,
+                    settings.target_language,
+                    save_txt=settings.save_txt,
+                    save_docx=settings.save_docx,
+                    create_handbook_option=settings.create_handbook,
+                    keep_source_audio=settings.keep_source_audio
+                )
+
+# Вкладка для Яндекс Диск
+@st.fragment
+def _yandex_disk_tab(settings):
+    st.header("Яндекс Диск")
+    yandex_url = st.text_input("Введите ссылку на файл или папку на Яндекс Диске", key="yandex_url")
+
+    if yandex_url:
+        if st.button("Транскрибировать файлы с Яндекс Диска", key="yandex_transcribe_btn"):
+            if not settings.api_key:
+                st.error("Пожалуйста, введите API ключ OpenAI в настройках")
+            else:
+                process_yandex_disk_files(
+                    yandex_url,
+                    settings.save_dir,
+                    settings.target_language,
+                    save_txt=settings.save_txt,
+                    save_docx=settings.save_docx,
+                    create_handbook_option=settings.create_handbook,
+                    keep_source_audio=settings.keep_source_audio,
+                    use_batch_api=settings.use_batch_api
+                )
 
+# Вкладка для Google Диск
+@st.fragment
+def _gdrive_tab(settings):
+    st.header("Google Диск")
+    gdrive_url = st.text_input("Введите ссылку на файл или папку на Google Диске", key="gdrive_url")
+
+    st.info("""
+    Поддерживаются следующие типы ссылок:
+    - Ссылки на файлы: https://drive.google.com/file/d/FILE_ID/view
+    - Ссылки на папки: https://drive.google.com/drive/folders/FOLDER_ID
+
+    Файлы и папки должны быть открыты для доступа по ссылке.
+    """)
+
+    if gdrive_url:
+        if st.button("Транскрибировать файлы с Google Drive", key="gdrive_transcribe_btn"):
+            if not settings.api_key:
+                st.error("Пожалуйста, введите API ключ OpenAI в настройках")
+            else:
+                process_gdrive_files(
+                    gdrive_url,
+                    settings.save_dir,
+                    settings.target_language,
+                    save_txt=settings.save_txt,
+                    save_docx=settings.save_docx,
+                    create_handbook_option=settings.create_handbook,
+                    keep_source_audio=settings.keep_source_audio,
+                    use_batch_api=settings.use_batch_api
+                )
 # Основная функция приложения
 def main():
     st.title("🎤 Транскрибатор аудио и видео")
@@ -1116,9 +1700,10 @@ def main():
     # Боковая панель для ввода API ключа и опций
     with st.sidebar:
         st.header("Настройки")
-        api_key = st.text_input("OpenAI API ключ", value=os.getenv("OPENAI_API_KEY", ""), type="password")
+        api_key = st.text_input("OpenAI API ключ", value=os.getenv("OPENAI_API_KEY", ""), type="password", key="openai_api_key")
         if api_key:
             os.environ["OPENAI_API_KEY"] = api_key
+            import openai
             openai.api_key = api_key
         else:
             st.warning("Пожалуйста, введите API ключ OpenAI")
@@ -1127,7 +1712,8 @@ def main():
         target_language = st.selectbox(
             "Выберите язык для конечной транскрибации:",
             ["русский", "казахский", "английский"],
-            index=0
+            index=0,
+            key="target_language"
         )
         st.subheader("Каталог сохранения")
         
@@ -1142,22 +1728,37 @@ def main():
         st.session_state['save_dir'] = save_dir
         
         # Кнопка выбора папки
-        if st.button("Выбрать папку"):
+        if st.button("Выбрать папку", key="choose_folder_btn"):
             folder_path = choose_folder()
             if folder_path:
                 st.session_state['save_dir'] = folder_path
                 st.rerun()
 
         st.subheader("Опции сохранения")
-        save_txt = st.checkbox("Сохранить в TXT", value=False) # Изменено значение по умолчанию на False
-        save_docx = st.checkbox("Сохранить в DOCX", value=True)
-        create_handbook = st.checkbox("Создать конспект", value=False)
+        save_txt = st.checkbox("Сохранить в TXT", value=False, key="opt_save_txt") # Изменено значение по умолчанию на False
+        save_docx = st.checkbox("Сохранить в DOCX", value=True, key="opt_save_docx")
+        create_handbook = st.checkbox("Создать конспект", value=False, key="opt_create_handbook")
+        use_batch_api = st.checkbox(
+            "Пакетный перевод (OpenAI Batch API)",
+            value=False,
+            help="Для нескольких файлов: перевод и конспекты одним заданием вдвое дешевле, но могут выполняться дольше",
+            key="opt_use_batch_api"
+        )
+        keep_source_audio = st.checkbox(
+            "Сохранять исходное аудио",
+            value=False,
+            help="Не удалять скачанное аудио после транскрибации (например, чтобы повторить обработку без повторной загрузки)",
+            key="opt_keep_source_audio"
+        )
         
         st.subheader("Очистка временных файлов")
-        days_old = st.number_input("Удалить файлы старше (дней):", min_value=1, max_value=30, value=7)
-        if st.button("Очистить временные файлы"):
+        days_old = st.number_input("Удалить файлы старше (дней):", min_value=1, max_value=30, value=7, key="cleanup_days_old")
+        if st.button("Очистить временные файлы", key="clean_temp_btn"):
             deleted_count, freed_space = clean_temp_files(TEMP_FILES_DIR, days_old)
             st.success(f"Удалено файлов: {deleted_count}, освобождено места: {freed_space / (1024 * 1024):.2f} MB")
+        if st.button("Очистить сейчас", help="Досрочно запустить плановую фоновую очистку", key="clean_now_btn"):
+            cleanup_wakeup.set()
+            st.info("Фоновая очистка запущена")
         
     # Основной контент с добавленной вкладкой VK video
     tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
@@ -1169,163 +1770,30 @@ def main():
         "Google Диск"
     ])
     
-    # Вкладка для локальных файлов
-    with tab1:
-        st.header("Загрузить локальный файл")
-        uploaded_files = st.file_uploader(
-            "Выберите аудио или видео файлы", 
-            type=["mp3", "mp4", "wav", "m4a", "avi", "mov"],
-            accept_multiple_files=True  # Включаем поддержку множественной загрузки
-        )
-        
-        if uploaded_files:
-            # Показываем счетчик загруженных файлов
-            st.success(f"Загружено файлов: {len(uploaded_files)}")
-            
-            # Создаем аккордеон для просмотра каждого файла
-            with st.expander("Просмотр загруженных файлов", expanded=False):
-                for i, uploaded_file in enumerate(uploaded_files):
-                    st.subheader(f"Файл #{i+1}: {uploaded_file.name}")
-                    if uploaded_file.type.startswith('audio/') or uploaded_file.name.endswith(('.mp3', '.wav', '.m4a')):
-                        st.audio(uploaded_file)
-                    elif uploaded_file.type.startswith('video/') or uploaded_file.name.endswith(('.mp4', '.avi', '.mov')):
-                        st.video(uploaded_file)
-            
-            if st.button("Транскрибировать выбранные файлы"):
-                if not api_key:
-                    st.error("Пожалуйста, введите API ключ OpenAI в настройках")
-                else:
-                    # Обрабатываем каждый загруженный файл по очереди
-                    for i, uploaded_file in enumerate(uploaded_files):
-                        # Создаем разделитель между файлами
-                        if i > 0:
-                            st.markdown("---")
-                        
-                        st.subheader(f"Обработка файла {i+1}/{len(uploaded_files)}: {uploaded_file.name}")
-                        
-                        # Получаем название файла без расширения
-                        file_name = Path(uploaded_file.name).stem
-                        
-                        # Обрабатываем загруженный файл
-                        process_uploaded_file(
-                            uploaded_file, 
-                            save_dir, 
-                            file_name, 
-                            target_language,
-                            save_txt=save_txt,
-                            save_docx=save_docx,
-                            create_handbook_option=create_handbook
-                        )
-                    
-                    st.success(f"Обработка всех файлов завершена! Всего обработано: {len(uploaded_files)}")
+    # Текущие настройки боковой панели для вкладок
+    settings = SimpleNamespace(
+        api_key=api_key,
+        target_language=target_language,
+        save_dir=save_dir,
+        save_txt=save_txt,
+        save_docx=save_docx,
+        create_handbook=create_handbook,
+        use_batch_api=use_batch_api,
+        keep_source_audio=keep_source_audio
+    )
     
-    # Вкладка для YouTube
+    with tab1:
+        _local_files_tab(settings)
     with tab2:
-        st.header("YouTube видео")
-        youtube_url = st.text_input("Введите ссылку на YouTube видео", key="youtube_url")
-        if youtube_url:
-            if st.button("Транскрибировать YouTube видео"):
-                if not api_key:
-                    st.error("Пожалуйста, введите API ключ OpenAI в настройках")
-                else:
-                    process_youtube_video(
-                        youtube_url,
-                        save_dir,
-                        target_language,
-                        save_txt=save_txt,
-                        save_docx=save_docx,
-                        create_handbook_option=create_handbook
-                    )
-    
-    # Новая вкладка для VK видео
+        _youtube_tab(settings)
     with tab3:
-        st.header("VK видео")
-        vk_url = st.text_input("Введите ссылку на видео ВКонтакте", key="vk_url")
-        
-        st.info("""
-        Поддерживаются следующие типы ссылок:
-        - Прямые ссылки на видео: https://vk.com/video-220754053_456243260
-        - Ссылки из браузера: https://vk.com/vkvideo?z=video-220754053_456243260%2Fvideos-220754053%2Fpl_-220754053_-2
-        """)
-        
-        if vk_url:
-            if st.button("Транскрибировать VK видео"):
-                if not api_key:
-                    st.error("Пожалуйста, введите API ключ OpenAI в настройках")
-                else:
-                    process_vk_video(
-                        vk_url,
-                        save_dir,
-                        target_language,
-                        save_txt=save_txt,
-                        save_docx=save_docx,
-                        create_handbook_option=create_handbook
-                    )
-    
-    # Вкладка для Instagram
+        _vk_tab(settings)
     with tab4:
-        st.header("Instagram видео")
-        instagram_url = st.text_input("Введите ссылку на Instagram видео поста или reels", key="instagram_url")
-        
-        if instagram_url:
-            if st.button("Транскрибировать Instagram видео"):
-                if not api_key:
-                    st.error("Пожалуйста, введите API ключ OpenAI в настройках")
-                else:
-                    process_instagram_video(
-                        instagram_url,
-                        save_dir,
-                        target_language,
-                        save_txt=save_txt,
-                        save_docx=save_docx,
-                        create_handbook_option=create_handbook
-                    )
-    
-    # Вкладка для Яндекс Диск
+        _instagram_tab(settings)
     with tab5:
-        st.header("Яндекс Диск")
-        yandex_url = st.text_input("Введите ссылку на файл или папку на Яндекс Диске", key="yandex_url")
-        
-        if yandex_url:
-            if st.button("Транскрибировать файлы с Яндекс Диска"):
-                if not api_key:
-                    st.error("Пожалуйста, введите API ключ OpenAI в настройках")
-                else:
-                    process_yandex_disk_files(
-                        yandex_url,
-                        save_dir,
-                        target_language,
-                        save_txt=save_txt,
-                        save_docx=save_docx,
-                        create_handbook_option=create_handbook
-                    )
-    
-    # Вкладка для Google Диск
+        _yandex_disk_tab(settings)
     with tab6:
-        st.header("Google Диск")
-        gdrive_url = st.text_input("Введите ссылку на файл или папку на Google Диске", key="gdrive_url")
-        
-        st.info("""
-        Поддерживаются следующие типы ссылок:
-        - Ссылки на файлы: https://drive.google.com/file/d/FILE_ID/view
-        - Ссылки на папки: https://drive.google.com/drive/folders/FOLDER_ID
-        
-        Файлы и папки должны быть открыты для доступа по ссылке.
-        """)
-        
-        if gdrive_url:
-            if st.button("Транскрибировать файлы с Google Drive"):
-                if not api_key:
-                    st.error("Пожалуйста, введите API ключ OpenAI в настройках")
-                else:
-                    process_gdrive_files(
-                        gdrive_url,
-                        save_dir,
-                        target_language,
-                        save_txt=save_txt,
-                        save_docx=save_docx,
-                        create_handbook_option=create_handbook
-                    )
+        _gdrive_tab(settings)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
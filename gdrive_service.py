@@ -1,13 +1,22 @@
 import logging
 import os
+import random
 import re
+import shutil
 import tempfile
-from pathlib import Path
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from email.message import Message
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import gdown
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+from urllib3.util.retry import Retry
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,6 +25,143 @@ logging.basicConfig(
 )
 logger = logging.getLogger('gdrive_service')
 
+# Регулярные выражения для разбора ссылок Google Drive компилируются один раз при импорте
+# Общее выражение сразу определяет тип ссылки по имени сработавшей группы и ее ID
+_GDRIVE_RE = re.compile(
+    r'https?://(?:'
+    r'drive\.google\.com/file/d/(?P<file>[a-zA-Z0-9_-]+)'
+    r'|drive\.google\.com/open\?id=(?P<open>[a-zA-Z0-9_-]+)'
+    r'|docs\.google\.com/document/d/(?P<doc>[a-zA-Z0-9_-]+)'
+    r'|drive\.google\.com/drive/folders/(?P<folder>[a-zA-Z0-9_-]+)'
+    r')'
+)
+_FILE_RE = re.compile(r'drive\.google\.com/file/d/([a-zA-Z0-9_-]+)')
+_OPEN_RE = re.compile(r'open\?id=([a-zA-Z0-9_-]+)')
+_FOLDER_RE = re.compile(r'drive/folders/([a-zA-Z0-9_-]+)')
+_DOC_RE = re.compile(r'document/d/([a-zA-Z0-9_-]+)')
+_TITLE_RE = re.compile(r'<title>([^<]+)( - Google Drive)?</title>')
+
+# Таблица замены недопустимых для файловой системы символов на "_"
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '\\/*?:"<>|'})
+
+# Расширения аудио и видео файлов, которые скачиваются из папок
+MEDIA_EXTENSIONS = frozenset({'.mp3', '.mp4', '.wav', '.m4a', '.avi', '.mov'})
+
+# Количество одновременных загрузок файлов из папки. Лимит фиксированный:
+# файлы качает gdown, и скорость видна только по завершенным файлам, а при
+# нескольких крупных файлах такой сигнал - почти всегда ноль с редкими всплесками,
+# по которому число загрузок менялось бы случайно
+MAX_PARALLEL_DOWNLOADS = 8
+
+# Размер пула HTTP соединений общей сессии
+HTTP_POOL_SIZE = 32
+
+# Коды ответов, при которых запрос повторяется (лимит запросов и ошибки сервера)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Количество попыток скачать файл через requests, если поток оборвался
+DOWNLOAD_ATTEMPTS = 5
+MAX_RETRY_DELAY = 60
+
+# Файлы больше этого размера скачиваются по частям в несколько потоков
+RANGED_DOWNLOAD_MIN_SIZE = 200 * 1024 * 1024
+RANGED_DOWNLOAD_PARTS = 4
+
+# Прямая ссылка на содержимое файла. Для файлов больше ~100 МБ обычная ссылка
+# uc?export=download отдает страницу с предупреждением о проверке на вирусы;
+# confirm=t пропускает ее, поэтому ответ содержит сам файл с Content-Length
+# и поддержкой Range
+DIRECT_DOWNLOAD_URL = (
+    "https://drive.usercontent.google.com/download?id={}&export=download&confirm=t"
+)
+# Интервал (сек) между сообщениями о прогрессе при загрузке по частям
+RANGED_PROGRESS_INTERVAL = 0.5
+
+
+# Разбор ссылок - чистые функции от строки, поэтому результаты кэшируются:
+# одна и та же ссылка проверяется несколько раз за обработку
+@lru_cache(maxsize=2048)
+def _is_gdrive_url(url: str) -> bool:
+    return _GDRIVE_RE.match(url) is not None
+
+
+@lru_cache(maxsize=2048)
+def _extract_file_id(url: str) -> Optional[str]:
+    # Проверяем URL с файлом
+    file_match = _FILE_RE.search(url)
+    if file_match:
+        return file_match.group(1)
+    
+    # Проверяем URL с открытием по ID
+    open_match = _OPEN_RE.search(url)
+    if open_match:
+        return open_match.group(1)
+    
+    # Проверяем URL с папкой
+    folder_match = _FOLDER_RE.search(url)
+    if folder_match:
+        return folder_match.group(1)
+    
+    # Проверяем URL с Google Doc
+    doc_match = _DOC_RE.search(url)
+    if doc_match:
+        return doc_match.group(1)
+    
+    # Если прямая ссылка с ID в параметре
+    parsed_url = urlparse(url)
+    query_params = parse_qs(parsed_url.query)
+    if 'id' in query_params:
+        return query_params['id'][0]
+    
+    return None
+
+
+@lru_cache(maxsize=2048)
+def _is_folder_url(url: str) -> bool:
+    return bool(_FOLDER_RE.search(url))
+
+
+@lru_cache(maxsize=2048)
+def _classify(url: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Определяет тип ссылки Google Drive и ID за один проход регулярного выражения
+    
+    Args:
+        url: URL для проверки
+        
+    Returns:
+        Кортеж (тип, ID): тип - "folder" или "file", для чужой ссылки (None, None)
+    """
+    match = _GDRIVE_RE.match(url)
+    if not match:
+        return None, None
+    kind = "folder" if match.lastgroup == "folder" else "file"
+    return kind, match.group(match.lastgroup)
+
+
+def _is_media_file(name: str) -> bool:
+    """Проверяет по расширению, что файл - аудио или видео"""
+    dot = name.rfind('.')
+    return dot >= 0 and name[dot:].lower() in MEDIA_EXTENSIONS
+
+
+def _iter_media_files(root: str):
+    """
+    Рекурсивно обходит директорию и возвращает пути к аудио и видео файлам
+    
+    Args:
+        root: Директория для обхода
+        
+    Yields:
+        Пути к найденным аудио и видео файлам
+    """
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_media_files(entry.path)
+            elif _is_media_file(entry.name):
+                yield entry.path
+
 
 class GoogleDriveDownloader:
     """
@@ -32,6 +178,27 @@ class GoogleDriveDownloader:
         """
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        
+        # Общая сессия с пулом соединений: повторные запросы к Google Drive
+        # не устанавливают заново TCP и TLS соединение. Пул рассчитан на
+        # параллельную загрузку файлов папки
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=1.0,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True
+            )
+        )
+        self.session.mount("https://", adapter)
+        
+        # Имена файлов и заголовки ссылок скачивания, уже полученные по ID файла
+        self._filenames: Dict[str, str] = {}
+        self._download_headers: Dict[str, Dict] = {}
     
     def sanitize_filename(self, filename: str) -> str:
         """
@@ -44,7 +211,7 @@ class GoogleDriveDownloader:
             Безопасное имя файла
         """
         # Заменяем недопустимые для файловой системы символы
-        return re.sub(r'[\\/*?:"<>|]', "_", filename)
+        return filename.translate(_SANITIZE_TABLE)
     
     def is_gdrive_url(self, url: str) -> bool:
         """
@@ -56,18 +223,7 @@ class GoogleDriveDownloader:
         Returns:
             True, если URL указывает на Google Drive
         """
-        gdrive_patterns = [
-            r'https?://drive\.google\.com/file/d/([a-zA-Z0-9_-]+)',
-            r'https?://drive\.google\.com/open\?id=([a-zA-Z0-9_-]+)',
-            r'https?://docs\.google\.com/document/d/([a-zA-Z0-9_-]+)',
-            r'https?://drive\.google\.com/drive/folders/([a-zA-Z0-9_-]+)'
-        ]
-        
-        for pattern in gdrive_patterns:
-            if re.match(pattern, url):
-                return True
-        
-        return False
+        return _is_gdrive_url(url)
     
     def extract_file_id(self, url: str) -> Optional[str]:
         """
@@ -79,33 +235,7 @@ class GoogleDriveDownloader:
         Returns:
             ID файла или папки, или None, если URL не распознан
         """
-        # Проверяем URL с файлом
-        file_match = re.search(r'drive\.google\.com/file/d/([a-zA-Z0-9_-]+)', url)
-        if file_match:
-            return file_match.group(1)
-        
-        # Проверяем URL с открытием по ID
-        open_match = re.search(r'open\?id=([a-zA-Z0-9_-]+)', url)
-        if open_match:
-            return open_match.group(1)
-        
-        # Проверяем URL с папкой
-        folder_match = re.search(r'drive/folders/([a-zA-Z0-9_-]+)', url)
-        if folder_match:
-            return folder_match.group(1)
-        
-        # Проверяем URL с Google Doc
-        doc_match = re.search(r'document/d/([a-zA-Z0-9_-]+)', url)
-        if doc_match:
-            return doc_match.group(1)
-        
-        # Если прямая ссылка с ID в параметре
-        parsed_url = urlparse(url)
-        query_params = parse_qs(parsed_url.query)
-        if 'id' in query_params:
-            return query_params['id'][0]
-        
-        return None
+        return _extract_file_id(url)
     
     def is_folder_url(self, url: str) -> bool:
         """
@@ -117,11 +247,38 @@ class GoogleDriveDownloader:
         Returns:
             True, если URL указывает на папку
         """
-        return bool(re.search(r'drive/folders/([a-zA-Z0-9_-]+)', url))
+        return _is_folder_url(url)
+    
+    def list_folder(self, folder_id: str) -> List:
+        """
+        Получает список файлов папки Google Drive без скачивания самих файлов
+        
+        Args:
+            folder_id: ID папки
+            
+        Returns:
+            Список файлов папки от gdown (id, path, local_path), где local_path -
+            путь, по которому файл будет сохранен во временной папке
+        """
+        url = f"https://drive.google.com/drive/folders/{folder_id}"
+        output_dir = os.path.join(self.output_dir, f"temp_folder_{folder_id}")
+        folder_files = gdown.download_folder(
+            url=url,
+            output=output_dir,
+            quiet=True,
+            use_cookies=False,
+            skip_download=True
+        )
+        if folder_files is None:
+            raise RuntimeError(f"gdown не вернул список файлов папки: {url}")
+        return folder_files
     
     def list_folder_contents(self, folder_id: str) -> List[Dict]:
         """
-        Получает список файлов в папке Google Drive
+        Получает список аудио и видео файлов в папке Google Drive
+        
+        Файлы не скачиваются: возвращаются только их ID и имена, для загрузки
+        используется download_folder.
         
         Args:
             folder_id: ID папки
@@ -130,58 +287,271 @@ class GoogleDriveDownloader:
             Список словарей с информацией о файлах
         """
         try:
-            url = f"https://drive.google.com/drive/folders/{folder_id}"
-            output_dir = os.path.join(self.output_dir, f"temp_folder_{folder_id}")
+            folder_files = [
+                {
+                    'id': item.id,
+                    'name': item.path,
+                    'path': item.local_path
+                }
+                for item in self.list_folder(folder_id)
+                if _is_media_file(os.path.basename(item.local_path))
+            ]
+            logger.info(f"Найдено {len(folder_files)} файлов в папке")
+            return folder_files
             
-            # Создаем временную директорию для скачивания файлов
-            os.makedirs(output_dir, exist_ok=True)
+        except Exception as e:
+            logger.error(f"Ошибка при получении содержимого папки: {e}")
+            return []
+    
+    def _head_download(self, file_id: str):
+        """
+        Выполняет HEAD запрос к ссылке скачивания файла
+        
+        Заголовки ответа запоминаются: по ним определяется и имя файла,
+        и возможность скачать его по частям.
+        
+        Args:
+            file_id: ID файла Google Drive
             
-            # Используем gdown.download_folder вместо list_folder_files
-            downloaded_files = []
+        Returns:
+            Заголовки ответа
+        """
+        if file_id not in self._download_headers:
+            response = self.session.head(
+                DIRECT_DOWNLOAD_URL.format(file_id), allow_redirects=True
+            )
+            self._download_headers[file_id] = response.headers
+        return self._download_headers[file_id]
+    
+    def _probe_filename(self, file_id: str) -> Optional[str]:
+        """
+        Определяет реальное имя файла Google Drive
+        
+        Сначала выполняется HEAD запрос к прямой ссылке скачивания: имя берется
+        из заголовка Content-Disposition, тело файла при этом не загружается.
+        Если заголовка нет (например, файл недоступен по прямой ссылке),
+        имя ищется в заголовке страницы просмотра.
+        
+        Args:
+            file_id: ID файла Google Drive
+            
+        Returns:
+            Имя файла или None, если его не удалось определить
+        """
+        if file_id in self._filenames:
+            return self._filenames[file_id]
+        
+        filename = None
+        content_disposition = self._head_download(file_id).get("Content-Disposition")
+        if content_disposition:
+            message = Message()
+            message["Content-Disposition"] = content_disposition
+            filename = message.get_filename()
+        
+        if not filename:
+            # Получаем страницу просмотра файла и ищем заголовок с именем файла
+            view_url = f"https://drive.google.com/file/d/{file_id}/view"
+            response = self.session.get(view_url)
+            title_match = _TITLE_RE.search(response.text)
+            if title_match:
+                filename = title_match.group(1).strip()
+        
+        if filename:
+            self._filenames[file_id] = filename
+        return filename
+    
+    def _download_with_retries(self, file_id: str, output_path: str) -> str:
+        """
+        Скачивает файл напрямую через requests с повторными попытками
+        
+        Ответы 429/5xx повторяет сама сессия. Здесь дополнительно повторяется
+        скачивание, если соединение оборвалось посреди потока: ожидание растет
+        экспоненциально со случайной добавкой, а заголовок Retry-After сервера
+        имеет приоритет.
+        
+        Args:
+            file_id: ID файла Google Drive
+            output_path: Путь для сохранения файла
+            
+        Returns:
+            Путь к загруженному файлу
+        """
+        # URL для скачивания файла
+        download_url = f"https://drive.google.com/uc?id={file_id}&export=download"
+        for attempt in range(DOWNLOAD_ATTEMPTS):
             try:
-                logger.info(f"Начинаем скачивание папки: {url}")
-                
-                # Скачиваем папку целиком
-                gdown.download_folder(
-                    url=url,
-                    output=output_dir,
-                    quiet=False,
-                    use_cookies=False
-                )
+                # Запрос на скачивание
+                response = self.session.get(download_url, stream=True)
+                response.raise_for_status()
                 
-                # Собираем информацию о скачанных файлах
-                for root, dirs, files in os.walk(output_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        file_rel_path = os.path.relpath(file_path, output_dir)
-                        
-                        # Фильтруем только аудио и видео файлы
-                        file_ext = Path(file).suffix.lower()
-                        if file_ext in [
-                            '.mp3', '.mp4', '.wav', '.m4a', '.avi', '.mov'
-                        ]:
-                            downloaded_files.append({
-                                'id': f"local_{len(downloaded_files)}",
-                                'name': file_rel_path,
-                                'path': file_path
-                            })
+                # Сохраняем файл блоками по 1 МБ напрямую из потока ответа
+                response.raw.decode_content = True
+                with open(output_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+                return output_path
+            except (requests.RequestException, Urllib3HTTPError) as e:
+                # Поток читается из response.raw, поэтому обрыв приходит исключением urllib3
+                if attempt == DOWNLOAD_ATTEMPTS - 1:
+                    raise
                 
-                logger.info(f"Скачано {len(downloaded_files)} файлов из папки")
-                return downloaded_files
-                
-            except Exception as e:
-                logger.error(f"Ошибка при скачивании папки: {e}")
-                return []
+                delay = min(2 ** attempt + random.random(), MAX_RETRY_DELAY)
+                response = getattr(e, "response", None)
+                retry_after = (
+                    response.headers.get("Retry-After")
+                    if response is not None else None
+                )
+                if retry_after and retry_after.isdigit():
+                    delay = min(int(retry_after), MAX_RETRY_DELAY)
+                logger.warning(
+                    f"Ошибка при скачивании через requests: {str(e)}, "
+                    f"повторная попытка через {delay:.1f} с"
+                )
+                time.sleep(delay)
+    
+    def _resolve_filename(self, file_id: str) -> str:
+        """
+        Определяет безопасное имя для сохранения файла Google Drive
+        
+        Args:
+            file_id: ID файла Google Drive
+            
+        Returns:
+            Реальное имя файла без недопустимых символов или имя по ID файла
+        """
+        try:
+            filename = self._probe_filename(file_id)
             
+            if filename:
+                # Очищаем имя файла от недопустимых символов
+                output_filename = self.sanitize_filename(filename)
+                logger.info(f"Получено реальное имя файла: {output_filename}")
+            else:
+                # Если не удалось получить имя, используем ID
+                output_filename = f"gdrive_{file_id}"
+                logger.warning(
+                    "Не удалось получить реальное имя файла, "
+                    f"используем: {output_filename}"
+                )
         except Exception as e:
-            logger.error(f"Ошибка при получении содержимого папки: {e}")
-            return []
+            # В случае ошибки используем временное имя файла
+            output_filename = f"gdrive_{file_id}"
+            logger.warning(
+                f"Ошибка при получении имени файла: {str(e)}, "
+                f"используем: {output_filename}"
+            )
+        return output_filename
+    
+    def _download_ranged(
+        self,
+        file_id: str,
+        output_path: Optional[str] = None,
+        parts: int = RANGED_DOWNLOAD_PARTS,
+        progress_callback=None
+    ) -> Optional[str]:
+        """
+        Скачивает большой файл по частям в несколько параллельных потоков
+        
+        Одно TCP соединение редко загружает канал полностью, поэтому файл
+        делится на равные диапазоны байт, каждый скачивается отдельным запросом
+        с заголовком Range и записывается на свое место в заранее созданный файл.
+        Запросы идут к прямой ссылке DIRECT_DOWNLOAD_URL, минуя страницу
+        с предупреждением о проверке на вирусы.
+        
+        Args:
+            file_id: ID файла Google Drive
+            output_path: Путь для сохранения файла; если не указан, имя файла
+                определяется только после проверки размера и поддержки Range
+            parts: Количество частей
+            progress_callback: Функция обратного вызова для отображения прогресса
+            
+        Returns:
+            Путь к загруженному файлу или None, если сервер не поддерживает
+            загрузку по частям или файл слишком мал
+        """
+        headers = self._head_download(file_id)
+        size = int(headers.get("Content-Length") or 0)
+        if (
+            headers.get("Accept-Ranges") != "bytes"
+            or size < RANGED_DOWNLOAD_MIN_SIZE
+        ):
+            return None
+        
+        if output_path is None:
+            output_path = os.path.join(self.output_dir, self._resolve_filename(file_id))
+        
+        download_url = DIRECT_DOWNLOAD_URL.format(file_id)
+        part_size = -(-size // parts)
+        ranges = [
+            (start, min(start + part_size, size) - 1)
+            for start in range(0, size, part_size)
+        ]
+        
+        # Создаем файл нужного размера, чтобы части писались на свои места
+        with open(output_path, 'wb') as f:
+            f.truncate(size)
+        
+        # Потоки только считают байты, прогресс сообщается из вызывающего потока
+        downloaded = [0]
+        downloaded_lock = threading.Lock()
+        
+        def download_part(byte_range):
+            start, end = byte_range
+            response = self.session.get(
+                download_url, headers={"Range": f"bytes={start}-{end}"}, stream=True
+            )
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RuntimeError("Сервер вернул файл целиком вместо части")
+            expected = end - start + 1
+            written = 0
+            with open(output_path, 'r+b') as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    written += len(chunk)
+                    if written > expected:
+                        raise RuntimeError(
+                            f"Сервер вернул больше данных, чем запрошено: bytes={start}-{end}"
+                        )
+                    f.write(chunk)
+                    with downloaded_lock:
+                        downloaded[0] += len(chunk)
+            # Оборванное соединение оставило бы в заранее созданном файле нули
+            if written != expected:
+                raise RuntimeError(
+                    f"Часть bytes={start}-{end} получена не полностью: {written} из {expected} байт"
+                )
+        
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                running = {executor.submit(download_part, r) for r in ranges}
+                while running:
+                    finished, running = wait(
+                        running, timeout=RANGED_PROGRESS_INTERVAL,
+                        return_when=FIRST_COMPLETED
+                    )
+                    for future in finished:
+                        future.result()
+                    if progress_callback:
+                        with downloaded_lock:
+                            done = downloaded[0]
+                        progress_callback(
+                            30 + int(65 * done / size),
+                            f"Скачано {done / (1 << 20):.0f} из {size / (1 << 20):.0f} МБ"
+                        )
+        except Exception as e:
+            logger.warning(f"Не удалось скачать файл по частям: {str(e)}")
+            os.remove(output_path)
+            return None
+        
+        logger.info(f"Файл скачан по частям ({len(ranges)}): {output_path}")
+        return output_path
     
     def download_file(
         self,
         file_id: str,
         output_filename: Optional[str] = None,
-        progress_callback=None
+        progress_callback=None,
+        ranged: bool = False
     ) -> Optional[str]:
         """
         Скачивает файл с Google Drive
@@ -190,6 +560,7 @@ class GoogleDriveDownloader:
             file_id: ID файла Google Drive
             output_filename: Имя выходного файла (без расширения)
             progress_callback: Функция обратного вызова для отображения прогресса
+            ranged: Скачивать большой файл по частям в несколько потоков
             
         Returns:
             Путь к загруженному файлу или None в случае ошибки
@@ -201,69 +572,48 @@ class GoogleDriveDownloader:
             if progress_callback:
                 progress_callback(10, "Начинаем загрузку файла с Google Drive...")
             
-            # Сначала получаем информацию о файле, чтобы узнать его реальное имя
-            if not output_filename:
+            # Без заданного имени файл сохраняется под именем из Content-Disposition:
+            # gdown определяет его сам по первому же ответу, поэтому отдельный
+            # запрос за именем нужен только для загрузки по частям и через requests
+            output_path = (
+                os.path.join(self.output_dir, output_filename)
+                if output_filename else None
+            )
+            
+            if progress_callback:
+                progress_callback(
+                    30, f"Скачиваем файл: {output_filename or file_id}..."
+                )
+            
+            # Большой файл пробуем скачать по частям, остальные - через gdown
+            downloaded_path = None
+            if ranged:
                 try:
-                    # Получаем информацию о файле через HEAD запрос
-                    view_url = f"https://drive.google.com/file/d/{file_id}/view"
-                    response = requests.get(view_url)
-                    
-                    # Ищем заголовок страницы с именем файла
-                    title_match = re.search(
-                        r'<title>([^<]+)( - Google Drive)?</title>',
-                        response.text
+                    # Имя файла определяется внутри, только если файл подходит по размеру
+                    downloaded_path = self._download_ranged(
+                        file_id, output_path, progress_callback=progress_callback
                     )
-                    
-                    if title_match:
-                        # Извлекаем имя файла из заголовка
-                        filename = title_match.group(1).strip()
-                        # Очищаем имя файла от недопустимых символов
-                        output_filename = self.sanitize_filename(filename)
-                        logger.info(f"Получено реальное имя файла: {output_filename}")
-                    else:
-                        # Если не удалось получить имя, используем ID
-                        output_filename = f"gdrive_{file_id}"
-                        logger.warning(
-                            "Не удалось получить реальное имя файла, "
-                            f"используем: {output_filename}"
-                        )
                 except Exception as e:
-                    # В случае ошибки используем временное имя файла
-                    output_filename = f"gdrive_{file_id}"
-                    logger.warning(
-                        f"Ошибка при получении имени файла: {str(e)}, "
-                        f"используем: {output_filename}"
-                    )
-            
-            # Определяем путь для сохранения
-            output_path = os.path.join(self.output_dir, output_filename)
-            
-            if progress_callback:
-                progress_callback(30, f"Скачиваем файл: {output_filename}...")
+                    logger.warning(f"Ошибка при скачивании по частям: {str(e)}")
             
             # Скачиваем файл с использованием gdown и реального имени файла
             try:
-                downloaded_path = gdown.download(file_url, output_path, quiet=False)
+                if not downloaded_path:
+                    downloaded_path = gdown.download(
+                        file_url, output_path or self.output_dir + os.sep, quiet=False
+                    )
             except Exception as e:
                 # Если gdown не смог скачать файл, пробуем другой подход
                 logger.warning(f"Ошибка при скачивании с gdown: {str(e)}")
                 try:
                     # Попытка 2: напрямую через requests
                     logger.info("Пробуем скачать файл через requests")
-                    # URL для скачивания файла
-                    download_url = (
-                        f"https://drive.google.com/uc?id={file_id}&export=download"
+                    downloaded_path = self._download_with_retries(
+                        file_id,
+                        output_path or os.path.join(
+                            self.output_dir, self._resolve_filename(file_id)
+                        )
                     )
-                    # Запрос на скачивание
-                    response = requests.get(download_url, stream=True)
-                    response.raise_for_status()
-                    
-                    # Сохраняем файл
-                    with open(output_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    
-                    downloaded_path = output_path
                     logger.info(
                         f"Файл успешно скачан через requests: {downloaded_path}"
                     )
@@ -287,13 +637,77 @@ class GoogleDriveDownloader:
                 progress_callback(0, f"Ошибка загрузки: {str(e)}")
             return None
     
-    def download_folder(self, folder_id: str, progress_callback=None) -> List[str]:
+    def _download_folder_files(
+        self,
+        folder_files,
+        max_workers: int,
+        progress_callback=None,
+        file_callback=None
+    ) -> List[str]:
+        """
+        Параллельно скачивает аудио и видео файлы из списка файлов папки
+        
+        Args:
+            folder_files: Список файлов папки от gdown (id, path, local_path)
+            max_workers: Максимальное количество одновременных загрузок
+            progress_callback: Функция обратного вызова для отображения прогресса
+            file_callback: Функция, которая вызывается с путем каждого скачанного файла
+            
+        Returns:
+            Список путей к загруженным файлам
+        """
+        # Фильтруем только аудио и видео файлы
+        media_files = [
+            item for item in folder_files
+            if _is_media_file(os.path.basename(item.local_path))
+        ]
+        total = len(media_files)
+        if progress_callback:
+            progress_callback(20, f"Скачиваем файлы папки: 0 из {total}")
+        
+        def download(item):
+            os.makedirs(os.path.dirname(item.local_path), exist_ok=True)
+            return self.download_file(
+                file_id=item.id,
+                output_filename=os.path.relpath(item.local_path, self.output_dir)
+            )
+        
+        downloaded_files = []
+        done = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(download, item) for item in media_files]
+            # Каждый файл передаем дальше сразу после загрузки, не дожидаясь остальных
+            for future in as_completed(futures):
+                done += 1
+                file_path = future.result()
+                if file_path:
+                    downloaded_files.append(file_path)
+                    if file_callback:
+                        file_callback(file_path)
+                if progress_callback:
+                    progress_callback(
+                        20 + int(80 * done / total),
+                        f"Скачиваем файлы папки: {done} из {total}"
+                    )
+        
+        logger.info(f"Скачано {len(downloaded_files)} аудио/видео файлов из папки")
+        return downloaded_files
+    
+    def download_folder(
+        self,
+        folder_id: str,
+        progress_callback=None,
+        file_callback=None,
+        max_workers: int = MAX_PARALLEL_DOWNLOADS
+    ) -> List[str]:
         """
         Скачивает все файлы из папки Google Drive
         
         Args:
             folder_id: ID папки Google Drive
             progress_callback: Функция обратного вызова для отображения прогресса
+            file_callback: Функция, которая вызывается с путем каждого найденного файла
+            max_workers: Максимальное количество одновременных загрузок файлов
             
         Returns:
             Список путей к загруженным файлам
@@ -309,6 +723,22 @@ class GoogleDriveDownloader:
             # Создаем временную директорию для скачивания файлов
             os.makedirs(output_dir, exist_ok=True)
             
+            # Получаем список файлов папки без скачивания и загружаем их параллельно:
+            # каждый файл — независимый HTTP запрос, поэтому канал не простаивает
+            try:
+                folder_files = self.list_folder(folder_id)
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось получить список файлов папки: {str(e)}, "
+                    "скачиваем папку целиком"
+                )
+                folder_files = None
+            
+            if folder_files is not None:
+                return self._download_folder_files(
+                    folder_files, max_workers, progress_callback, file_callback
+                )
+            
             if progress_callback:
                 progress_callback(20, "Скачиваем содержимое папки...")
             
@@ -331,14 +761,10 @@ class GoogleDriveDownloader:
             
             # Собираем информацию о скачанных файлах
             downloaded_files = []
-            for root, dirs, files in os.walk(output_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    
-                    # Фильтруем только аудио и видео файлы
-                    file_ext = Path(file).suffix.lower()
-                    if file_ext in ['.mp3', '.mp4', '.wav', '.m4a', '.avi', '.mov']:
-                        downloaded_files.append(file_path)
+            for file_path in _iter_media_files(output_dir):
+                downloaded_files.append(file_path)
+                if file_callback:
+                    file_callback(file_path)
             
             if progress_callback:
                 progress_callback(100, f"Загружено {len(downloaded_files)} файлов")
@@ -352,19 +778,28 @@ class GoogleDriveDownloader:
                 progress_callback(0, f"Ошибка загрузки папки: {str(e)}")
             return []
     
-    def process_gdrive_url(self, url: str, progress_callback=None) -> List[str]:
+    def process_gdrive_url(
+        self,
+        url: str,
+        progress_callback=None,
+        file_callback=None
+    ) -> List[str]:
         """
         Обрабатывает URL Google Drive и загружает файлы
         
         Args:
             url: URL Google Drive (файл или папка)
             progress_callback: Функция обратного вызова для отображения прогресса
+            file_callback: Функция, которая вызывается с путем каждого файла сразу после его загрузки
             
         Returns:
             Список путей к загруженным файлам
         """
+        # Определяем тип ссылки и ID за один разбор URL
+        kind, file_or_folder_id = _classify(url)
+        
         # Проверяем, что это URL Google Drive
-        if not self.is_gdrive_url(url):
+        if kind is None:
             if progress_callback:
                 progress_callback(
                     0, "Указанный URL не является ссылкой на Google Drive"
@@ -372,8 +807,7 @@ class GoogleDriveDownloader:
             logger.error("Указанный URL не является ссылкой на Google Drive")
             return []
         
-        # Извлекаем ID файла или папки
-        file_or_folder_id = self.extract_file_id(url)
+        # Проверяем, что удалось извлечь ID файла или папки
         if not file_or_folder_id:
             if progress_callback:
                 progress_callback(0, "Не удалось извлечь ID файла или папки из URL")
@@ -381,14 +815,15 @@ class GoogleDriveDownloader:
             return []
         
         # Если это ссылка на папку
-        if self.is_folder_url(url):
+        if kind == "folder":
             if progress_callback:
                 progress_callback(
                     10, "Обнаружена папка Google Drive, загружаем файлы..."
                 )
             return self.download_folder(
                 folder_id=file_or_folder_id, 
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                file_callback=file_callback
             )
         
         # Если это ссылка на файл
@@ -397,6 +832,9 @@ class GoogleDriveDownloader:
                 progress_callback(10, "Обнаружен файл Google Drive, загружаем...")
             downloaded_file = self.download_file(
                 file_id=file_or_folder_id,
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                ranged=True
             )
+            if downloaded_file and file_callback:
+                file_callback(downloaded_file)
             return [downloaded_file] if downloaded_file else []
\ No newline at end of file
@@ -1,46 +1,172 @@
-import json
 import logging
 import os
 import re
 import shutil
 import subprocess
+import sys
 import tempfile
-import time
-from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-import instaloader
-import requests
+# Логирование настраивает приложение, модуль только пишет в свой логгер
+logger = logging.getLogger(__name__)
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO, 
-    format='%(asctime)s - %(levelname)s - %(message)s'
+# Регулярные выражения для разбора ссылок Instagram компилируются один раз при импорте
+_IG_POST_RE = re.compile(r'https?://(?:www\.)?instagram\.com/(p|reel)/([^/?#&]+)')
+_IG_STORY_RE = re.compile(
+    r'https?://(?:www\.)?instagram\.com/stories/([^/?#&]+)/(\d+)'
 )
-logger = logging.getLogger(__name__)
+_POST_PATH_RE = re.compile(r'/(p|reel)/([^/?#&]+)')
+_STORY_PATH_RE = re.compile(r'/stories/([^/?#&]+)/(\d+)')
+
+# Размер пула HTTP соединений сессии instaloader
+HTTP_POOL_CONNECTIONS = 10
+HTTP_POOL_SIZE = 20
+
+# Параметры кодирования аудио для транскрибации: речь распознается по моно
+# 16 кГц, поэтому более высокое качество только увеличивает файл и время ffmpeg
+AUDIO_ENCODE_ARGS = ("-b:a", "64k", "-ac", "1", "-ar", "16000")
+
+# Минимальное изменение прогресса (в процентах), о котором сообщается вызывающему коду
+PROGRESS_MIN_STEP = 5
+
+# Количество одновременных загрузок в download_many
+MAX_PARALLEL_DOWNLOADS = 8
+
+
+# Разбор ссылок - чистые функции от строки, поэтому результаты кэшируются:
+# одна и та же ссылка проверяется несколько раз за обработку
+@lru_cache(maxsize=10000)
+def _parse_ig_url(url):
+    # Ссылки не на Instagram отсекаем без регулярных выражений
+    if 'instagram.com/' not in url:
+        return None, None
+    
+    match = _IG_POST_RE.match(url)
+    if match:
+        return "post", match.group(2)
+    
+    match = _IG_STORY_RE.match(url)
+    if match:
+        return "story", f"stories_{match.group(1)}_{match.group(2)}"
+    
+    return None, None
+
+
+@lru_cache(maxsize=10000)
+def _extract_shortcode(url):
+    # Для постов и рилсов
+    match = _POST_PATH_RE.search(url)
+    if match:
+        return match.group(2)
+        
+    # Для сторис (более сложный случай)
+    match = _STORY_PATH_RE.search(url)
+    if match:
+        return f"stories_{match.group(1)}_{match.group(2)}"
+        
+    return None
+
+
+def _ffmpeg_path():
+    """Возвращает путь к ffmpeg"""
+    # Если мы на Windows, и ffmpeg.exe есть в текущей директории
+    local_ffmpeg = os.path.join(os.getcwd(), "ffmpeg.exe")
+    if os.name == 'nt' and os.path.exists(local_ffmpeg):
+        return local_ffmpeg
+    # По умолчанию используем системный ffmpeg
+    return "ffmpeg"
+
+
+def _throttled(progress_callback):
+    """
+    Оборачивает функцию обратного вызова, пропуская мелкие шаги прогресса
+    
+    Вызов пропускается, если прогресс изменился меньше чем на
+    PROGRESS_MIN_STEP процентов; начало (0) и конец (100) передаются всегда.
+    Последний переданный процент хранится в замыкании: у каждой загрузки
+    свое состояние, даже если загрузчик общий для сессий и потоков.
+    
+    Args:
+        progress_callback: Функция обратного вызова или None
+        
+    Returns:
+        Обернутая функция или None, если функция не передана
+    """
+    if not progress_callback:
+        return None
+    last_percent = [0]
+    
+    def notify(percent, message):
+        if (
+            percent not in (0, 100)
+            and abs(percent - last_percent[0]) < PROGRESS_MIN_STEP
+        ):
+            return
+        last_percent[0] = percent
+        progress_callback(percent, message)
+    
+    return notify
 
 
 class InstagramDownloader:
     """Класс для загрузки медиа файлов из Instagram"""
     
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, enable_instaloader_fallback=False):
         """
         Инициализация загрузчика Instagram
         
         Args:
             output_dir: Директория для сохранения загруженных файлов
+            enable_instaloader_fallback: Пробовать загрузить пост через instaloader,
+                если yt-dlp не справился. По умолчанию выключено: без авторизации
+                instaloader обычно тоже не может загрузить видео, а попытка
+                удваивает время ожидания ошибки
         """
         self.output_dir = output_dir or os.path.join(os.getcwd(), "downloads")
         os.makedirs(self.output_dir, exist_ok=True)
+        # Префикс путей к файлам в директории загрузки
+        self._dir = os.path.join(self.output_dir, "")
+        self.enable_instaloader_fallback = enable_instaloader_fallback
         
-        # Инициализация instaloader
-        self.loader = instaloader.Instaloader(
-            dirname_pattern=self.output_dir,
-            download_video_thumbnails=False,
-            download_geotags=False,
-            download_comments=False,
-            save_metadata=False,
-            compress_json=False
-        )
+        # instaloader импортируется и создается при первом обращении к loader:
+        # он нужен только для запасной загрузки постов
+        self._loader = None
+        self._loader_init_lock = threading.Lock()
+        # Загрузчик общий для всех запросов, а директория загрузки меняется
+        # на время скачивания поста
+        self._loader_lock = threading.Lock()
+        
+        # Путь к ffmpeg определяем один раз
+        self._ffmpeg_path = _ffmpeg_path()
+    
+    @property
+    def loader(self):
+        """Общий экземпляр instaloader.Instaloader"""
+        with self._loader_init_lock:
+            if self._loader is None:
+                import instaloader
+                from requests.adapters import HTTPAdapter
+                
+                loader = instaloader.Instaloader(
+                    dirname_pattern=self.output_dir,
+                    filename_pattern="{shortcode}",
+                    download_video_thumbnails=False,
+                    download_geotags=False,
+                    download_comments=False,
+                    save_metadata=False,
+                    compress_json=False
+                )
+                # Пул соединений сессии instaloader: TCP и TLS соединения
+                # с Instagram и его CDN переиспользуются между загрузками
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_SIZE
+                )
+                loader.context._session.mount("https://", adapter)
+                self._loader = loader
+        return self._loader
     
     def is_instagram_url(self, url):
         """
@@ -52,18 +178,8 @@ class InstagramDownloader:
         Returns:
             bool: True, если URL является ссылкой на Instagram
         """
-        instagram_patterns = [
-            r'https?://(?:www\.)?instagram\.com/p/([^/?#&]+)',  # Посты
-            r'https?://(?:www\.)?instagram\.com/reel/([^/?#&]+)',  # Рилсы
-            # Сторис
-            r'https?://(?:www\.)?instagram\.com/stories/([^/?#&]+)/(\d+)',
-        ]
-        
-        for pattern in instagram_patterns:
-            if re.match(pattern, url):
-                return True
-        
-        return False
+        # Посты, рилсы и сторис
+        return _parse_ig_url(url)[0] is not None
     
     def extract_shortcode(self, url):
         """
@@ -75,17 +191,35 @@ class InstagramDownloader:
         Returns:
             str: Идентификатор (shortcode) поста или рилса
         """
-        # Для постов и рилсов
-        match = re.search(r'/(p|reel)/([^/?#&]+)', url)
-        if match:
-            return match.group(2)
-            
-        # Для сторис (более сложный случай)
-        match = re.search(r'/stories/([^/?#&]+)/(\d+)', url)
-        if match:
-            return f"stories_{match.group(1)}_{match.group(2)}"
+        return _extract_shortcode(url)
+    
+    def _parse_url(self, url):
+        """
+        Проверяет URL Instagram и извлекает из него shortcode за один разбор
+        
+        Args:
+            url: URL на Instagram пост, рилс или сторис
             
-        return None
+        Returns:
+            tuple: Тип ссылки ("post" или "story") и shortcode,
+                либо (None, None), если URL не распознан
+        """
+        return _parse_ig_url(url)
+    
+    def _notify(self, progress_callback, percent, message):
+        """
+        Передает прогресс в функцию обратного вызова, если она задана
+        
+        Публичные методы заранее оборачивают функцию через _throttled,
+        поэтому мелкие шаги прогресса отсекаются отдельно для каждой загрузки.
+        
+        Args:
+            progress_callback: Функция обратного вызова или None
+            percent: Процент выполнения
+            message: Сообщение о текущем этапе
+        """
+        if progress_callback:
+            progress_callback(percent, message)
     
     def _download_using_yt_dlp(self, url, output_path, progress_callback=None):
         """
@@ -100,8 +234,7 @@ class InstagramDownloader:
             bool: True при успешной загрузке, иначе False
         """
         try:
-            if progress_callback:
-                progress_callback(30, "Загрузка видео с помощью yt-dlp...")
+            self._notify(progress_callback, 30, "Загрузка видео с помощью yt-dlp...")
             
             # Импортируем yt-dlp (уже должен быть установлен в проекте для YouTube)
             import yt_dlp
@@ -119,10 +252,16 @@ class InstagramDownloader:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 ydl.download([url])
             
-            # Проверяем, что файл был загружен
-            if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-                if progress_callback:
-                    progress_callback(70, "Видео успешно загружено с помощью yt-dlp")
+            # Проверяем, что файл был загружен (один вызов stat)
+            try:
+                size = os.stat(output_path).st_size
+            except FileNotFoundError:
+                size = 0
+            
+            if size > 0:
+                self._notify(
+                    progress_callback, 70, "Видео успешно загружено с помощью yt-dlp"
+                )
                 logger.info(f"Видео успешно загружено с помощью yt-dlp: {output_path}")
                 return True
             else:
@@ -133,6 +272,76 @@ class InstagramDownloader:
             logger.error(f"Ошибка при загрузке видео с помощью yt-dlp: {e}")
             return False
     
+    def _download_audio_streamed(self, url, audio_path, progress_callback=None):
+        """
+        Загружает аудио дорожку из Instagram, передавая поток yt-dlp сразу в ffmpeg
+        
+        yt-dlp пишет загружаемый поток в stdout, ffmpeg читает его из stdin и
+        кодирует в mp3, поэтому промежуточный файл на диск не записывается.
+        
+        Args:
+            url: URL на Instagram пост или рилс
+            audio_path: Путь для сохранения аудио файла
+            progress_callback: Функция обратного вызова для прогресса
+            
+        Returns:
+            bool: True при успешной загрузке, иначе False
+        """
+        try:
+            self._notify(progress_callback, 30, "Загрузка аудио с помощью yt-dlp...")
+            
+            yt_dlp_process = subprocess.Popen(
+                [
+                    sys.executable, "-m", "yt_dlp",
+                    "-f", "bestaudio/best",  # Лучший аудио поток
+                    "--quiet", "--no-warnings",
+                    "-o", "-",               # Поток в stdout
+                    url
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+            ffmpeg_process = subprocess.Popen(
+                [
+                    self._ffmpeg_path,
+                    "-loglevel", "error",  # Выводить только ошибки
+                    "-nostats",        # Без строк прогресса
+                    "-i", "pipe:0",    # Входной поток из yt-dlp
+                    "-vn",             # Без видео
+                    *AUDIO_ENCODE_ARGS,
+                    "-f", "mp3",
+                    "-y",              # Перезаписать выходной файл если существует
+                    audio_path         # Выходной файл
+                ],
+                stdin=yt_dlp_process.stdout,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+            # Закрываем свой конец канала, чтобы yt-dlp получил SIGPIPE,
+            # если ffmpeg завершится раньше
+            yt_dlp_process.stdout.close()
+            _, stderr = ffmpeg_process.communicate()
+            yt_dlp_process.wait()
+            
+            if yt_dlp_process.returncode != 0 or ffmpeg_process.returncode != 0:
+                logger.error(
+                    "Не удалось загрузить аудио потоком yt-dlp -> ffmpeg: "
+                    f"{stderr.decode(errors='replace')}"
+                )
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
+                return False
+            
+            self._notify(
+                progress_callback, 70, "Аудио успешно загружено с помощью yt-dlp"
+            )
+            logger.info(f"Аудио успешно загружено с помощью yt-dlp: {audio_path}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке аудио с помощью yt-dlp: {e}")
+            return False
+    
     def download_media(self, url, output_filename=None, progress_callback=None):
         """
         Загружает медиа файл из Instagram
@@ -145,44 +354,60 @@ class InstagramDownloader:
         Returns:
             str: Путь к загруженному медиа файлу или None в случае ошибки
         """
-        if not self.is_instagram_url(url):
+        kind, shortcode = self._parse_url(url)
+        if not kind:
             logger.error(f"URL не распознан как ссылка на Instagram: {url}")
             return None
-            
-        shortcode = self.extract_shortcode(url)
-        if not shortcode:
-            logger.error(f"Не удалось извлечь shortcode из URL: {url}")
-            return None
         
+        return self._download_media(
+            url, kind, shortcode, output_filename, _throttled(progress_callback)
+        )
+    
+    def _download_media(
+        self, url, kind, shortcode, output_filename=None, progress_callback=None
+    ):
+        """
+        Загружает медиа файл из Instagram по уже разобранному URL
+        
+        Args:
+            url: URL на Instagram пост, рилс или сторис
+            kind: Тип ссылки ("post" или "story")
+            shortcode: Идентификатор поста, рилса или сторис
+            output_filename: Имя выходного файла (без расширения)
+            progress_callback: Функция обратного вызова для отображения прогресса
+            
+        Returns:
+            str: Путь к загруженному медиа файлу или None в случае ошибки
+        """
         # Формируем имя файла, если не указано
         if not output_filename:
             output_filename = f"instagram_{shortcode}"
         
         # Полный путь к выходному файлу
-        output_path = os.path.join(self.output_dir, f"{output_filename}.mp4")
+        output_path = f"{self._dir}{output_filename}.mp4"
         
         # Пробуем разные методы загрузки
         try:
-            if progress_callback:
-                progress_callback(10, "Загрузка видео из Instagram...")
+            self._notify(progress_callback, 10, "Загрузка видео из Instagram...")
             
             # Сначала пробуем загрузить с помощью yt-dlp
             if self._download_using_yt_dlp(url, output_path, progress_callback):
-                if progress_callback:
-                    progress_callback(100, "Видео успешно загружено")
+                self._notify(progress_callback, 100, "Видео успешно загружено")
                 return output_path
             
-            logger.info(
-                "Не удалось загрузить с помощью yt-dlp, "
-                "пробуем с помощью instaloader..."
-            )
-            
             # Если не удалось загрузить с помощью yt-dlp, пробуем через instaloader
-            if '/p/' in url or '/reel/' in url:
-                if progress_callback:
-                    progress_callback(40, "Попытка загрузки через instaloader...")
+            if kind == "post" and self.enable_instaloader_fallback:
+                logger.info(
+                    "Не удалось загрузить с помощью yt-dlp, "
+                    "пробуем с помощью instaloader..."
+                )
+                self._notify(
+                    progress_callback, 40, "Попытка загрузки через instaloader..."
+                )
                     
                 try:
+                    import instaloader
+                    
                     # Загрузка поста или рилса через instaloader
                     post = instaloader.Post.from_shortcode(
                         self.loader.context, shortcode
@@ -193,67 +418,99 @@ class InstagramDownloader:
                         logger.error("Данный пост не содержит видео")
                         return None
                         
-                    # Временная директория для загрузки
-                    with tempfile.TemporaryDirectory() as temp_dir:
-                        # Настройка временной директории для загрузки
-                        temp_loader = instaloader.Instaloader(
-                            dirname_pattern=temp_dir,
-                            download_video_thumbnails=False,
-                            download_geotags=False,
-                            download_comments=False,
-                            save_metadata=False,
-                            compress_json=False
-                        )
+                    # Временная директория для загрузки создается рядом с целевой,
+                    # чтобы видео переносилось из нее переименованием, без копирования
+                    with tempfile.TemporaryDirectory(dir=self.output_dir) as temp_dir:
+                        # Загрузка поста общим загрузчиком: его HTTP сессия
+                        # сохраняет соединения с Instagram между загрузками
+                        with self._loader_lock:
+                            self.loader.dirname_pattern = temp_dir
+                            try:
+                                self.loader.download_post(post, target=shortcode)
+                            finally:
+                                self.loader.dirname_pattern = self.output_dir
                         
-                        # Загрузка поста
-                        temp_loader.download_post(post, target=shortcode)
+                        self._notify(
+                            progress_callback, 80,
+                            "Перемещение видео в целевую директорию..."
+                        )
                         
-                        if progress_callback:
-                            progress_callback(
-                                80, "Перемещение видео в целевую директорию..."
-                            )
+                        # Имя видео файла задано шаблоном, поэтому ищем его
+                        # напрямую; в постах с несколькими видео имена получают
+                        # номер, тогда берем первое видео из директории
+                        video_file = os.path.join(temp_dir, f"{shortcode}.mp4")
+                        if not os.path.isfile(video_file):
+                            with os.scandir(temp_dir) as entries:
+                                video_file = next(
+                                    (
+                                        entry.path for entry in sorted(
+                                            entries, key=lambda entry: entry.name
+                                        )
+                                        if entry.name.endswith(".mp4")
+                                    ),
+                                    None
+                                )
                         
-                        # Находим видео файл в временной директории
                         video_found = False
-                        for file in Path(temp_dir).glob(f"**/*{shortcode}*.mp4"):
-                            # Копируем файл в целевую директорию
+                        if video_file:
+                            # Переносим файл в целевую директорию
                             try:
-                                shutil.copy2(str(file), output_path)
+                                try:
+                                    os.replace(video_file, output_path)
+                                except OSError:
+                                    # Если директории на разных дисках
+                                    shutil.move(video_file, output_path)
                                 video_found = True
                                 logger.info(f"Видео успешно загружено: {output_path}")
-                                break
                             except Exception as e:
-                                logger.error(f"Ошибка при копировании файла: {e}")
+                                logger.error(f"Ошибка при перемещении файла: {e}")
                         
                         if video_found:
-                            if progress_callback:
-                                progress_callback(100, "Загрузка завершена")
+                            self._notify(progress_callback, 100, "Загрузка завершена")
                             return output_path
                 
                 except Exception as e:
                     logger.error(f"Ошибка при загрузке через instaloader: {e}")
             
-            elif '/stories/' in url:
+            elif kind == "story":
                 # Для сторис нужна аутентификация
                 logger.error("Загрузка сторис требует аутентификации в Instagram")
-                if progress_callback:
-                    progress_callback(
-                        100, "Ошибка: загрузка сторис требует аутентификации"
-                    )
+                self._notify(
+                    progress_callback, 100,
+                    "Ошибка: загрузка сторис требует аутентификации"
+                )
                 return None
             
             # Если все методы не сработали, сообщаем об ошибке
             logger.error("Не удалось загрузить видео ни одним из доступных методов")
-            if progress_callback:
-                progress_callback(100, "Ошибка: не удалось загрузить видео")
+            self._notify(progress_callback, 100, "Ошибка: не удалось загрузить видео")
             return None
                 
         except Exception as e:
             logger.error(f"Неизвестная ошибка при загрузке из Instagram: {e}")
-            if progress_callback:
-                progress_callback(100, f"Ошибка: {str(e)}")
+            self._notify(progress_callback, 100, f"Ошибка: {str(e)}")
             return None
         
+    def download_many(self, urls):
+        """
+        Параллельно загружает медиа файлы по нескольким ссылкам Instagram
+        
+        Args:
+            urls: Список URL на Instagram посты, рилсы или сторис
+            
+        Returns:
+            list: Пути к загруженным файлам в порядке ссылок,
+                None для ссылок, которые не удалось загрузить
+        """
+        if not urls:
+            return []
+        
+        # Загрузка ограничена сетью, поэтому потоки ждут ответов параллельно
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_PARALLEL_DOWNLOADS, len(urls))
+        ) as executor:
+            return list(executor.map(self.download_media, urls))
+    
     def download_audio(self, url, output_filename=None, progress_callback=None):
         """
         Загружает видео файл из Instagram и извлекает из него аудио
@@ -266,89 +523,93 @@ class InstagramDownloader:
         Returns:
             str: Путь к извлеченному аудио файлу или None в случае ошибки
         """
+        progress_callback = _throttled(progress_callback)
         try:
             # Получаем shortcode из URL для формирования имени файла
-            shortcode = self.extract_shortcode(url)
-            if not shortcode:
-                logger.error(f"Не удалось извлечь shortcode из URL: {url}")
+            kind, shortcode = self._parse_url(url)
+            if not kind:
+                logger.error(f"URL не распознан как ссылка на Instagram: {url}")
                 return None
             
             # Формируем имя файла если не указано
             if not output_filename:
                 output_filename = f"instagram_{shortcode}"
                 
-            # Сначала загружаем видео
-            if progress_callback:
-                progress_callback(10, "Загрузка видео из Instagram...")
-                
-            video_path = self.download_media(url, output_filename, progress_callback)
+            # Путь к выходному аудио файлу
+            audio_path = f"{self._dir}{output_filename}.mp3"
+            
+            self._notify(progress_callback, 10, "Загрузка аудио из Instagram...")
+            
+            # Сначала пробуем загрузить сразу аудио, без промежуточного видео файла
+            if self._download_audio_streamed(url, audio_path, progress_callback):
+                self._notify(progress_callback, 100, "Аудио успешно извлечено")
+                logger.info(f"Аудио успешно извлечено: {audio_path}")
+                return audio_path
+            
+            # Иначе загружаем видео и извлекаем из него аудио
+            video_path = self._download_media(
+                url, kind, shortcode, output_filename, progress_callback
+            )
             
             if not video_path:
                 logger.error("Не удалось загрузить видео из Instagram")
                 return None
-                
-            # Путь к выходному аудио файлу
-            audio_path = os.path.join(self.output_dir, f"{output_filename}.mp3")
-            
-            if progress_callback:
-                progress_callback(60, "Извлечение аудио дорожки...")
             
-            # Определение пути к ffmpeg
-            ffmpeg_path = "ffmpeg"  # По умолчанию используем системный ffmpeg
-            
-            # Если мы на Windows, и ffmpeg.exe есть в текущей директории
-            if os.name == 'nt' and os.path.exists(
-                    os.path.join(os.getcwd(), "ffmpeg.exe")
-                ):
-                ffmpeg_path = os.path.join(os.getcwd(), "ffmpeg.exe")
+            self._notify(progress_callback, 60, "Извлечение аудио дорожки...")
             
             # Извлекаем аудио дорожку с помощью ffmpeg
             ffmpeg_command = [
-                ffmpeg_path,
+                self._ffmpeg_path,
+                "-loglevel", "error",  # Выводить только ошибки
+                "-nostats",        # Без строк прогресса
                 "-i", video_path,  # Входной файл
-                "-q:a", "0",       # Качество аудио (0 = наилучшее)
+                "-vn",             # Без видео
+                *AUDIO_ENCODE_ARGS,
                 "-map", "a",       # Только аудио
                 "-y",              # Перезаписать выходной файл если существует
                 audio_path         # Выходной файл
             ]
             
             # Выполняем команду ffmpeg
-            process = subprocess.Popen(
+            process = subprocess.run(
                 ffmpeg_command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=False
             )
-            _, stderr = process.communicate()
             
             # Если ffmpeg завершился с ошибкой
             if process.returncode != 0:
-                logger.error(f"Ошибка при извлечении аудио: {stderr.decode()}")
-                if progress_callback:
-                    progress_callback(100, "Ошибка при извлечении аудио")
+                logger.error(
+                    f"Ошибка при извлечении аудио: {process.stderr.decode(errors='replace')}"
+                )
+                self._notify(progress_callback, 100, "Ошибка при извлечении аудио")
                 return None
                 
             # Проверяем, создался ли файл аудио
             if not os.path.exists(audio_path):
                 logger.error("Аудио файл не был создан")
-                if progress_callback:
-                    progress_callback(100, "Ошибка: аудио файл не был создан")
+                self._notify(progress_callback, 100, "Ошибка: аудио файл не был создан")
                 return None
                 
-            if progress_callback:
-                progress_callback(100, "Аудио успешно извлечено")
+            self._notify(progress_callback, 100, "Аудио успешно извлечено")
                 
             logger.info(f"Аудио успешно извлечено: {audio_path}")
             return audio_path
             
         except Exception as e:
             logger.error(f"Ошибка при извлечении аудио из Instagram видео: {e}")
-            if progress_callback:
-                progress_callback(100, f"Ошибка: {str(e)}")
+            self._notify(progress_callback, 100, f"Ошибка: {str(e)}")
             return None
 
 
 # Пример использования
 if __name__ == "__main__":
+    # Настройка логирования
+    logging.basicConfig(
+        level=logging.INFO, 
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     downloader = InstagramDownloader()
     url = "https://www.instagram.com/reel/DDrvwBqoMhn/"
     audio_path = downloader.download_audio(url)
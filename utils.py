@@ -1,21 +1,32 @@
 import datetime
 import glob
+import json
 import os
 import platform
+import random
 import re
 import shutil
+import subprocess
 import tempfile
 import textwrap
-from typing import Any, Dict, List, Optional, Tuple
-
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import faiss
+import httpx
 import numpy as np
 import openai
 import tiktoken
-import yt_dlp
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 from langchain.text_splitter import (
     CharacterTextSplitter,
     MarkdownHeaderTextSplitter
 )
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 from langchain_openai import OpenAIEmbeddings
 from langdetect import LangDetectException, detect
@@ -43,8 +54,51 @@ def setup_ffmpeg_path():
 setup_ffmpeg_path()
 
 
+# Основные параметры аудио файла
+class AudioInfo(NamedTuple):
+    duration_seconds: float
+    frame_rate: int
+    channels: int
+
+
+# Чтение параметров аудио из заголовков контейнера (без декодирования файла)
+@lru_cache(maxsize=256)
+def _probe_audio(audio_file: str, mtime_ns: int, size: int) -> AudioInfo:
+    """
+    Получает параметры аудио через ffprobe. Время изменения и размер файла
+    входят в ключ кэша, чтобы измененный файл был прочитан заново.
+    """
+    try:
+        result = subprocess.run(
+            [
+                os.environ.get("FFPROBE_BINARY", "ffprobe"),
+                "-v", "quiet",
+                "-print_format", "json",
+                "-show_format",
+                "-show_streams",
+                audio_file
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        info = json.loads(result.stdout)
+        stream = next(
+            s for s in info.get('streams', []) if s.get('codec_type') == 'audio'
+        )
+        duration = float(
+            info.get('format', {}).get('duration') or stream['duration']
+        )
+        return AudioInfo(duration, int(stream['sample_rate']), int(stream['channels']))
+    except Exception as e:
+        # Если ffprobe не справился, декодируем файл целиком
+        print(f"Не удалось прочитать заголовки {audio_file}: {e}")
+        audio = AudioSegment.from_file(audio_file)
+        return AudioInfo(audio.duration_seconds, audio.frame_rate, audio.channels)
+
+
 # Информация об аудио файлe
-def audio_info(audio_file: str) -> AudioSegment:
+def audio_info(audio_file: str) -> AudioInfo:
     """
     Получает информацию об аудио файле.
     
@@ -52,22 +106,76 @@ def audio_info(audio_file: str) -> AudioSegment:
         audio_file: Путь к аудио файлу
     
     Returns:
-        AudioSegment объект
+        AudioInfo с длительностью, частотой дискретизации и количеством каналов
     """
-    audio = AudioSegment.from_file(audio_file)
+    stat = os.stat(audio_file)
+    audio = _probe_audio(audio_file, stat.st_mtime_ns, stat.st_size)
     print(f'\nПродолжительность: {audio.duration_seconds / 60:.2f} мин.')
     print(f'Частота дискретизаци: {audio.frame_rate}')
     print(f'Количество каналов: {audio.channels}')
     return audio
 
 
+# Битрейт фрагментов для Whisper API (бит/с) и лимит API на размер файла.
+# При постоянном битрейте размер фрагмента известен заранее по длительности
+CHUNK_BITRATE = 64000
+WHISPER_MAX_FILE_SIZE = 25_000_000
+
+
+# Нарезка аудио на фрагменты для Whisper API
+def _split_audio(audio_path: str, output_dir: str, segment_time: int) -> List[str]:
+    """
+    Нарезает аудиофайл на фрагменты mp3 одним вызовом ffmpeg.
+    
+    Файл декодируется один раз, а фрагменты пишутся сегментным мультиплексором
+    по ходу кодирования, без загрузки всего аудио в память.
+    
+    Фрагменты перекодируются в mp3 с постоянным битрейтом, а не копируются
+    (-c copy): только так размер фрагмента заранее известен по длительности
+    и гарантированно укладывается в лимит Whisper API, а сам фрагмент
+    получается в формате mp3 для любого исходного контейнера и кодека.
+    Кроме того, при копировании потока разрез возможен только по границам
+    пакетов исходного кодека.
+    
+    Args:
+        audio_path: Путь к аудио файлу
+        output_dir: Папка для фрагментов
+        segment_time: Длительность фрагмента в секундах
+    
+    Returns:
+        Пути к фрагментам в порядке следования
+    """
+    subprocess.run(
+        [
+            AudioSegment.converter,
+            "-loglevel", "error",
+            "-nostats",
+            "-y",
+            "-i", audio_path,
+            "-vn",
+            "-f", "segment",
+            "-segment_time", str(segment_time),
+            "-reset_timestamps", "1",
+            "-c:a", "libmp3lame",
+            "-b:a", f"{CHUNK_BITRATE // 1000}k",
+            os.path.join(output_dir, "chunk_%04d.mp3")
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True
+    )
+    return sorted(glob.glob(os.path.join(output_dir, "chunk_*.mp3")))
+
+
 # Транскрибация аудио в текст (OpenAI - whisper)
 def transcribe_audio_whisper(
     audio_path: str,
     file_title: str,
     save_folder_path: str,
-    max_duration: int = 10*60*1000
-) -> Tuple[str, str]:
+    max_duration: int = 10*60*1000,
+    max_workers: Optional[int] = None,
+    segment_callback: Optional[Callable[[str], None]] = None
+) -> Tuple[str, str, bool]:
     """
     Транскрибация аудиофайла по частям с использованием OpenAI Whisper API.
 
@@ -76,80 +184,96 @@ def transcribe_audio_whisper(
         file_title: Название файла для сохранения результатов
         save_folder_path: Папка для сохранения результатов
         max_duration: Максимальная длительность фрагмента (в миллисекундах)
+        max_workers: Количество одновременных запросов к API
+            (по умолчанию MAX_PARALLEL_REQUESTS)
+        segment_callback: Функция, которая вызывается с текстом каждого
+            фрагмента в исходном порядке сразу после его распознавания
 
     Returns:
-        Кортеж из текста транскрипции и языка транскрибации
+        Кортеж из текста транскрипции, языка транскрибации и признака того,
+        что распознаны все фрагменты (при ошибке API текст обрывается на
+        фрагменте, предшествующем ошибочному)
     """
     # Создание папки для сохранения результатов, если она ещё не существует
     os.makedirs(save_folder_path, exist_ok=True)
 
-    # Загрузка аудиофайла
-    audio = AudioSegment.from_file(audio_path)
-
     # Создание временной папки для хранения аудио фрагментов
     temp_dir = tempfile.mkdtemp()
 
     # Инициализация переменных для обработки аудио фрагментов
-    current_start_time = 0  # Текущее время начала фрагмента
-    chunk_index = 1         # Индекс текущего фрагмента
+    # Длительность фрагмента в секундах, не больше той, при которой размер
+    # фрагмента с заданным битрейтом достигает лимита API
+    segment_time = min(
+        max_duration // 1000,
+        WHISPER_MAX_FILE_SIZE * 8 // CHUNK_BITRATE
+    )
+    chunk_paths = []        # Пути к фрагментам в порядке следования
     transcriptions = []     # Список для хранения всех транскрибаций
     detected_language = None
+    complete = False
 
-    # Обработка аудиофайла частями
-    while current_start_time < len(audio):
-        # Выделение фрагмента из аудиофайла
-        chunk = audio[current_start_time:current_start_time + max_duration]
-        # Формирование имени и пути файла фрагмента
-        chunk_name = f"chunk_{chunk_index}.mp3"
-        chunk_path = os.path.join(temp_dir, chunk_name)
-        # Экспорт фрагмента
-        chunk.export(chunk_path, format="mp3")
-
-        # Проверка размера файла фрагмента на соответствие лимиту API
-        if os.path.getsize(chunk_path) > 26000000:  # почти 25 MB
-            print(
-                f"Фрагмент {chunk_index} превышает максимальный размер для API. "
-                "Пробуем уменьшить..."
-            )
-            max_duration = int(max_duration * 0.8)  # Уменьшение длительности
-            os.remove(chunk_path)  # Удаление фрагмента, превышающего лимит
-            continue
-
-        # Открытие файла фрагмента для чтения в двоичном режиме
+    def transcribe_chunk(chunk_path):
+        chunk_name = os.path.basename(chunk_path)
+        print(f"Транскрибация {chunk_name}...")
+        # Фрагмент читается в память один раз и сразу удаляется с диска,
+        # повторные попытки отправляют те же байты без повторного открытия файла
         with open(chunk_path, "rb") as src_file:
-            print(f"Транскрибация {chunk_name}...")
+            chunk_bytes = src_file.read()
+        os.remove(chunk_path)
+        # Параллельные запросы быстрее упираются в лимит API, поэтому повторяем
+        # запрос с экспоненциальной задержкой при превышении лимита и сбое связи
+        for attempt in range(MAX_RETRY_ATTEMPTS):
             try:
                 # Запрос на транскрибацию фрагмента с использованием модели Whisper
-                transcript_response = openai.audio.transcriptions.create(
+                return _openai_client().audio.transcriptions.create(
                     model="whisper-1",
-                    file=src_file
+                    file=(chunk_name, chunk_bytes, "audio/mpeg")
                 )
-                
-                # Добавление результата транскрибации в список транскрипций
-                transcriptions.append(transcript_response.text)
-                
-                # Пытаемся определить язык от API, если он доступен
-                response_language = getattr(transcript_response, 'language', None)
-                
-                # Сохраняем язык транскрибации от первого фрагмента
-                if detected_language is None:
-                    # Если API не вернул язык, пробуем определить самостоятельно
-                    if not response_language or response_language == "unknown":
-                        # Пробуем определить язык самостоятельно из текста
-                        text_language = detect_language(transcript_response.text)
-                        detected_language = text_language
-                    else:
-                        detected_language = response_language
-                    
-                    print(f"Определен язык: {detected_language}")
-                    
+            except (openai.RateLimitError, openai.APIConnectionError):
+                if attempt == MAX_RETRY_ATTEMPTS - 1:
+                    raise
+                time.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+
+    try:
+        # Нарезка аудиофайла на фрагменты одним проходом ffmpeg
+        chunk_paths = _split_audio(audio_path, temp_dir, segment_time)
+
+        # Фрагменты независимы, поэтому отправляем их в Whisper API параллельно.
+        # executor.map возвращает ответы в исходном порядке фрагментов
+        with ThreadPoolExecutor(
+            max_workers=max_workers or MAX_PARALLEL_REQUESTS
+        ) as executor:
+            responses = executor.map(transcribe_chunk, chunk_paths)
+            try:
+                for transcript_response in responses:
+                    # Добавление результата транскрибации в список транскрипций
+                    transcriptions.append(transcript_response.text)
+                    # Передаем фрагмент дальше, пока следующие еще распознаются
+                    if segment_callback is not None:
+                        segment_callback(transcript_response.text)
+
+                    # Сохраняем язык транскрибации от первого фрагмента
+                    if detected_language is None:
+                        # Пытаемся определить язык от API, если он доступен
+                        response_language = getattr(
+                            transcript_response, 'language', None
+                        )
+                        # Если API не вернул язык, пробуем определить самостоятельно
+                        if not response_language or response_language == "unknown":
+                            detected_language = detect_language(
+                                transcript_response.text
+                            )
+                        else:
+                            detected_language = response_language
+
+                        print(f"Определен язык: {detected_language}")
+                complete = True
             except openai.BadRequestError as e:
+                # Оставляем текст фрагментов, предшествующих ошибочному
                 print(f"Произошла ошибка: {e}")
-                break
-                
-        # Переход к следующему фрагменту
-        current_start_time += max_duration
-        chunk_index += 1
+    finally:
+        # Удаляем временную папку и все оставшиеся в ней файлы
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
     # Сохранение всех транскрибаций в один текстовый файл
     result_text = "\n".join(transcriptions)
@@ -163,9 +287,7 @@ def transcribe_audio_whisper(
         detected_language = detect_language(result_text)
         print(f"Язык определен из полного текста: {detected_language}")
 
-    # Удаляем временную папку и все файлы в ней
-    shutil.rmtree(temp_dir)
-    return result_text, detected_language
+    return result_text, detected_language, complete
 
 
 # Функция для форматирования текста по абзацам
@@ -180,16 +302,11 @@ def format_text(text: str, width: int = 120) -> str:
     Returns:
         Отформатированный текст
     """
-    # Разделяем текст на абзацы
-    paragraphs = text.split('\n')
-    # Форматируем каждый абзац отдельно
-    formatted_paragraphs = []
-    for paragraph in paragraphs:
-        # Используем textwrap.fill для форматирования абзаца
-        formatted_paragraph = textwrap.fill(paragraph, width)
-        formatted_paragraphs.append(formatted_paragraph)
-    # Объединяем абзацы с символом новой строки
-    return '\n'.join(formatted_paragraphs)
+    # Один объект TextWrapper используется для всех абзацев, вместо нового
+    # объекта на каждый вызов textwrap.fill
+    wrapper = textwrap.TextWrapper(width=width)
+    # Форматируем каждый абзац отдельно и объединяем символом новой строки
+    return '\n'.join(wrapper.fill(paragraph) for paragraph in text.split('\n'))
 
 
 # Функция возвращает количество токенов в строке в зависимости от модели
@@ -204,19 +321,23 @@ def num_tokens_from_string(string: str, model: str = 'gpt-4o-mini') -> int:
     Returns:
         Количество токенов
     """
-    # Получаем имя кодировки для указанной модели
+    # Кодируем строку и вычисляем количество токенов
+    return len(_get_encoding(model).encode(string)) + 10
+
+
+# Кодировка токенизатора для модели, создается один раз на процесс
+@lru_cache(maxsize=16)
+def _get_encoding(model: str) -> tiktoken.Encoding:
     try:
-        encoding_name = tiktoken.encoding_for_model(model).name
-        # Получаем объект кодировки на основе имени кодировки
-        encoding = tiktoken.get_encoding(encoding_name)
-        # Кодируем строку и вычисляем количество токенов
-        num_tokens = len(encoding.encode(string)) + 10
+        # Получаем кодировку для указанной модели
+        return tiktoken.encoding_for_model(model)
     except KeyError:
         # Если модель не найдена, используем cl100k_base
-        encoding = tiktoken.get_encoding("cl100k_base")
-        num_tokens = len(encoding.encode(string)) + 10
-    # Возвращаем количество токенов
-    return num_tokens
+        return tiktoken.get_encoding("cl100k_base")
+
+
+# Последовательности пробельных символов
+_WS_RE = re.compile(r'\s+')
 
 
 # (CharacterTextSplitter) Формируем чанки из текста по количеству символов
@@ -237,7 +358,7 @@ def split_text(
         Список текстовых фрагментов
     """
     # Удалить пустые строки и лишние пробелы
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _WS_RE.sub(' ', text).strip()
     # Создаем экземпляр CharacterTextSplitter с заданными парамаетрами
     splitter = CharacterTextSplitter(
         chunk_size=chunk_size,
@@ -274,23 +395,67 @@ def split_markdown_text(markdown_text: str, strip_headers: bool = False):
     return markdown_splitter.split_text(markdown_text)
 
 
+# Параметры параллельной обработки запросов к модели. Число одновременных
+# запросов можно изменить переменной окружения под лимиты своего аккаунта
+MAX_PARALLEL_REQUESTS = int(os.getenv("LLM_MAX_PARALLEL_REQUESTS", "8"))
+MAX_RETRY_ATTEMPTS = 5
+
+# Блокировка для накопления статистики токенов из нескольких потоков
+_usage_lock = threading.Lock()
+
+
+# Клиент OpenAI создается один раз для каждого API ключа, чтобы параллельные
+# запросы использовали общий пул соединений
+@lru_cache(maxsize=4)
+def _client_for_key(api_key: Optional[str]) -> openai.OpenAI:
+    return openai.OpenAI(
+        api_key=api_key,
+        http_client=openai.DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=MAX_PARALLEL_REQUESTS * 2,
+                max_keepalive_connections=MAX_PARALLEL_REQUESTS
+            )
+        )
+    )
+
+
+def _openai_client() -> openai.OpenAI:
+    """
+    Возвращает общий клиент OpenAI для текущего API ключа.
+    
+    Ключ вводится в интерфейсе после импорта модуля, поэтому клиент
+    создается при первом запросе, а не при загрузке модуля.
+    
+    Returns:
+        Клиент OpenAI
+    """
+    return _client_for_key(openai.api_key or os.getenv("OPENAI_API_KEY"))
+
+
 # Функция получения ответа от модели
 def generate_answer(
     system: str,
     user: str,
     text: str,
     temp: float = 0.3,
-    model: str = 'gpt-4o-mini'
+    model: str = 'gpt-4o-mini',
+    usage: Optional[Dict[str, int]] = None
 ) -> str:
     """
     Получает ответ от модели OpenAI.
     
+    Системное сообщение и начало пользовательского должны быть одинаковыми
+    для всех запросов серии: тогда OpenAI переиспользует закэшированный префикс
+    промпта, а меняется только текст в конце сообщения.
+    
     Args:
         system: Системное сообщение
         user: Пользовательское сообщение
         text: Текст для анализа
         temp: Температура генерации
         model: Модель для использования
+        usage: Словарь для накопления статистики токенов
+            (prompt_tokens, cached_tokens)
     
     Returns:
         Ответ от модели
@@ -299,37 +464,83 @@ def generate_answer(
         {'role': 'system', 'content': system},
         {'role': 'user', 'content': user + '\n' + text}
     ]
-    completion = openai.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temp
-    )
+    # Повторяем запрос с экспоненциальной задержкой при превышении лимита
+    # запросов и сбое связи
+    for attempt in range(MAX_RETRY_ATTEMPTS):
+        try:
+            completion = _openai_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temp
+            )
+            break
+        except (openai.RateLimitError, openai.APIConnectionError):
+            if attempt == MAX_RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+    if usage is not None and completion.usage is not None:
+        details = getattr(completion.usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+        with _usage_lock:
+            usage['prompt_tokens'] = (
+                usage.get('prompt_tokens', 0) + completion.usage.prompt_tokens
+            )
+            usage['cached_tokens'] = (
+                usage.get('cached_tokens', 0) + cached_tokens
+            )
     return completion.choices[0].message.content
 
 
-# Обработка текстовых чанков по очереди
+# Обработка текстовых чанков
 def process_text_chunks(
     text_chunks: List[str],
     system: str,
-    user: str
+    user: str,
+    usage: Optional[Dict[str, int]] = None
 ) -> str:
     """
     Обрабатывает список текстовых чанков с помощью модели.
     
+    Чанки отправляются в модель параллельно, порядок ответов сохраняется.
+    
     Args:
         text_chunks: Список текстовых чанков
         system: Системное сообщение
         user: Пользовательское сообщение
+        usage: Словарь для накопления статистики токенов
     
     Returns:
         Обработанный текст
     """
-    processed_text = ''
-    for chunk in text_chunks:
-        # Получение ответа от модели для каждого чанка
-        answer = generate_answer(system, user, chunk)
-        processed_text += f'{answer}\n\n'  # Добавляем ответ в результат
-    return processed_text
+    # Получение ответа от модели для каждого чанка; executor.map возвращает
+    # ответы в исходном порядке чанков
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as executor:
+        answers = executor.map(
+            lambda chunk: generate_answer(system, user, chunk, usage=usage),
+            text_chunks
+        )
+        return ''.join(f'{answer}\n\n' for answer in answers)
+
+
+# Пользовательский промпт с усиленной инструкцией языка ответа
+def enhance_language_prompt(user: str, target_language: str) -> str:
+    """
+    Дополняет пользовательский промпт строгим указанием языка ответа.
+    
+    Args:
+        user: Пользовательское сообщение
+        target_language: Целевой язык ответа
+    
+    Returns:
+        Пользовательское сообщение с языковой инструкцией
+    """
+    language_instruction = get_language_instruction(target_language)
+    return (
+        f"{user}\n\nЭТО КРАЙНЕ ВАЖНО: {language_instruction}\n"
+        f"Весь текст, ВКЛЮЧАЯ ЗАГОЛОВКИ, должен быть ТОЛЬКО на "
+        f"{target_language} языке! Заголовки и всё содержание должны быть "
+        f"на {target_language}!"
+    )
 
 
 # Обработка каждого чанка (документа) для формирования методички
@@ -339,11 +550,16 @@ def process_documents(
     system: str,
     user: str,
     original_filename: str = "transcript",
-    target_language: str = "русский"
+    target_language: str = "русский",
+    usage: Optional[Dict[str, int]] = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None
 ) -> str:
     """
     Обрабатывает список документов и формирует методичку.
     
+    Разделы отправляются в модель параллельно, порядок разделов в итоговом
+    тексте сохраняется.
+    
     Args:
         save_folder_path: Путь для сохранения результатов
         documents: Список документов
@@ -351,39 +567,41 @@ def process_documents(
         user: Пользовательское сообщение
         original_filename: Имя оригинального файла 
         target_language: Целевой язык для конспекта
+        usage: Словарь для накопления статистики токенов
+        progress_callback: Функция (обработано, всего), вызываемая после
+            каждого готового раздела
     
     Returns:
         Текст методички
     """
-    processed_text_for_handbook = ""  # Строка для конкатенации обработанного текста
+    # Усиливаем запрос инструкцией языка. Системное сообщение оставляем
+    # неизменным, чтобы оно служило общим кэшируемым префиксом для всех разделов
+    enhanced_user = enhance_language_prompt(user, target_language)
     
-    # Получаем стандартную языковую инструкцию
-    language_instruction = get_language_instruction(target_language)
+    # Каждый документ обрабатываем отдельным запросом; запросы ждут сеть,
+    # поэтому выполняем их в пуле потоков
+    answers = [None] * len(documents)
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as executor:
+        futures = {
+            executor.submit(
+                generate_answer,
+                system,
+                enhanced_user,
+                document.page_content,
+                usage=usage
+            ): index
+            for index, document in enumerate(documents)
+        }
+        # Прогресс обновляем из вызывающего потока по мере готовности разделов
+        for done, future in enumerate(as_completed(futures), start=1):
+            answers[futures[future]] = future.result()
+            if progress_callback is not None:
+                progress_callback(done, len(documents))
     
-    # Для каждого документа обрабатываем отдельно с явным указанием языка
-    for document in documents:
-        # Усиливаем систему инструкцией языка для каждого отдельного документа
-        enhanced_system = (
-            f"{system}\n\nЭТО КРАЙНЕ ВАЖНО: {language_instruction}\n"
-            f"Весь текст, ВКЛЮЧАЯ ЗАГОЛОВКИ, должен быть только на "
-            f"{target_language} языке!"
-        )
-        
-        # Усиливаем запрос инструкцией языка
-        enhanced_user = (
-            f"{user}\n\nВАЖНО: Весь текст должен быть ТОЛЬКО на "
-            f"{target_language} языке! Заголовки и всё содержание должны быть "
-            f"на {target_language}!"
-        )
-        
-        # Получаем ответ от модели для каждого документа
-        answer = generate_answer(
-            enhanced_system,
-            enhanced_user,
-            document.page_content
-        )
-        # Добавляем обработанный текст в общую строку
-        processed_text_for_handbook += f"{answer}\n\n"
+    # Собираем обработанный текст в исходном порядке разделов
+    processed_text_for_handbook = "".join(
+        f"{answer}\n\n" for answer in answers
+    )
     
     # Записываем полученный текст во временный файл с уникальным именем
     result_path = os.path.join(
@@ -395,6 +613,27 @@ def process_documents(
     return processed_text_for_handbook
 
 
+# Языковые инструкции для промптов. Строки заданы один раз при импорте, поэтому
+# промпты с ними остаются побайтно одинаковыми между вызовами
+_LANG_INSTRUCTIONS = {
+    "казахский": """БАРЛЫҚ МӘТІНДІ ТЕК ҚАНА ҚАЗАҚ ТІЛІНДЕ ЖАЗУ КЕРЕК!
+        Басқа тілдерді МҮЛДЕМ қолданбаңыз. 
+        Тақырыптар, мәтін мазмұны, бөлімдер - БӘРІ қазақ тілінде болуы МІНДЕТТІ.
+        Орыс немесе ағылшын сөздерін араластыруға ТЫЙЫМ САЛЫНҒАН.
+        БҰЛ НҰСҚАУЛЫҚТЫ ҚАТАҢ ТҮРДЕ САҚТАУ ҚАЖЕТ!""",
+    "английский": """ALL TEXT MUST BE WRITTEN ONLY IN ENGLISH!
+        DO NOT use other languages AT ALL.
+        Headings, content, sections - EVERYTHING must be in English ONLY.
+        DO NOT mix in Russian or Kazakh words under ANY circumstances.
+        THIS INSTRUCTION MUST BE FOLLOWED STRICTLY!""",
+    "русский": """ВЕСЬ ТЕКСТ ДОЛЖЕН БЫТЬ НАПИСАН ТОЛЬКО НА РУССКОМ ЯЗЫКЕ!
+        НЕ используйте другие языки ВООБЩЕ.
+        Заголовки, содержание, разделы - ВСЁ должно быть ТОЛЬКО на русском языке.
+        НЕ смешивайте с казахскими или английскими словами НИ ПРИ КАКИХ ОБСТОЯТЕЛЬСТВАХ.
+        ЭТО УКАЗАНИЕ ДОЛЖНО БЫТЬ СТРОГО СОБЛЮДЕНО!""",
+}
+
+
 # Вспомогательная функция для получения языковой инструкции
 def get_language_instruction(target_language: str) -> str:
     """
@@ -406,24 +645,97 @@ def get_language_instruction(target_language: str) -> str:
     Returns:
         Строка с инструкцией на соответствующем языке
     """
-    if target_language.lower() == "казахский":
-        return """БАРЛЫҚ МӘТІНДІ ТЕК ҚАНА ҚАЗАҚ ТІЛІНДЕ ЖАЗУ КЕРЕК!
-        Басқа тілдерді МҮЛДЕМ қолданбаңыз. 
-        Тақырыптар, мәтін мазмұны, бөлімдер - БӘРІ қазақ тілінде болуы МІНДЕТТІ.
-        Орыс немесе ағылшын сөздерін араластыруға ТЫЙЫМ САЛЫНҒАН.
-        БҰЛ НҰСҚАУЛЫҚТЫ ҚАТАҢ ТҮРДЕ САҚТАУ ҚАЖЕТ!"""
-    elif target_language.lower() == "английский":
-        return """ALL TEXT MUST BE WRITTEN ONLY IN ENGLISH!
-        DO NOT use other languages AT ALL.
-        Headings, content, sections - EVERYTHING must be in English ONLY.
-        DO NOT mix in Russian or Kazakh words under ANY circumstances.
-        THIS INSTRUCTION MUST BE FOLLOWED STRICTLY!"""
-    else:  # русский по умолчанию
-        return """ВЕСЬ ТЕКСТ ДОЛЖЕН БЫТЬ НАПИСАН ТОЛЬКО НА РУССКОМ ЯЗЫКЕ!
-        НЕ используйте другие языки ВООБЩЕ.
-        Заголовки, содержание, разделы - ВСЁ должно быть ТОЛЬКО на русском языке.
-        НЕ смешивайте с казахскими или английскими словами НИ ПРИ КАКИХ ОБСТОЯТЕЛЬСТВАХ.
-        ЭТО УКАЗАНИЕ ДОЛЖНО БЫТЬ СТРОГО СОБЛЮДЕНО!"""
+    return _LANG_INSTRUCTIONS.get(target_language.lower(), _LANG_INSTRUCTIONS["русский"])
+
+
+# Максимальный размер пакета текстов в одном запросе к Embedding API
+EMBEDDING_BATCH_SIZE = 512
+
+
+# Параметры индекса FAISS: IVF включается, когда векторов достаточно для
+# обучения кластеров (faiss рекомендует от 39 точек на кластер)
+IVF_MIN_POINTS_PER_LIST = 39
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+
+
+# Папка кэша эмбеддингов внутри папки векторной базы
+EMBEDDINGS_CACHE_DIR = ".emb_cache"
+
+
+# Модель эмбеддингов с кэшем на диске
+def _cached_embeddings(folder_path: str) -> CacheBackedEmbeddings:
+    """
+    Создает модель эмбеддингов, которая хранит уже посчитанные векторы на диске.
+    
+    Повторные тексты и запросы берутся из кэша без обращения к API.
+    
+    Args:
+        folder_path: Папка векторной базы, в которой хранится кэш
+    
+    Returns:
+        Модель эмбеддингов с кэшем
+    """
+    embeddings = OpenAIEmbeddings()
+    return CacheBackedEmbeddings.from_bytes_store(
+        embeddings,
+        LocalFileStore(os.path.join(folder_path, EMBEDDINGS_CACHE_DIR)),
+        namespace=embeddings.model,
+        query_embedding_cache=True
+    )
+
+
+# Параллельное получение эмбеддингов пакетами
+def _embed_texts(texts: List[str], embeddings: CacheBackedEmbeddings) -> np.ndarray:
+    """
+    Получает эмбеддинги текстов, отправляя пакеты в Embedding API параллельно.
+    
+    Args:
+        texts: Список текстов
+        embeddings: Модель эмбеддингов
+    
+    Returns:
+        Матрица эмбеддингов размера (N, d) типа float32
+    """
+    batches = [
+        texts[i:i + EMBEDDING_BATCH_SIZE]
+        for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REQUESTS) as executor:
+        vectors = list(executor.map(embeddings.embed_documents, batches))
+    return np.concatenate(
+        [np.asarray(batch, dtype=np.float32) for batch in vectors]
+    )
+
+
+# Построение индекса FAISS с хранением векторов в float16
+def _build_faiss_index(vectors: np.ndarray):
+    """
+    Строит индекс FAISS с половинной точностью хранения векторов.
+    
+    Для больших наборов используется IVF, чтобы поиск просматривал только
+    ближайшие кластеры, для небольших - полный перебор.
+    
+    Args:
+        vectors: Матрица эмбеддингов размера (N, d) типа float32
+    
+    Returns:
+        Индекс FAISS с добавленными векторами
+    """
+    n, d = vectors.shape
+    nlist = max(4, int(4 * np.sqrt(n)))
+    
+    if n >= IVF_MIN_POINTS_PER_LIST * nlist:
+        quantizer = faiss.IndexFlatL2(d)
+        index = faiss.IndexIVFScalarQuantizer(
+            quantizer, d, nlist, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2
+        )
+        index.train(vectors)
+        index.nprobe = FAISS_NPROBE
+    else:
+        index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_fp16)
+    
+    index.add(vectors)
+    return index
 
 
 # Создание индексной (векторной) базы из чанков и сохранение на диск
@@ -439,10 +751,18 @@ def create_db_index_from_documents_save(chunks_documents, index_name: str, path:
     Returns:
         Векторная база FAISS
     """
-    # Создаем индексную базу с использованием FAISS
-    db_index = FAISS.from_documents(
-        chunks_documents,
-        OpenAIEmbeddings()
+    embeddings = _cached_embeddings(path)
+    texts = [doc.page_content for doc in chunks_documents]
+    vectors = _embed_texts(texts, embeddings)
+    
+    # Создаем индексную базу с использованием FAISS из готовых эмбеддингов
+    db_index = FAISS(
+        embedding_function=embeddings,
+        index=_build_faiss_index(vectors),
+        docstore=InMemoryDocstore(
+            {str(i): doc for i, doc in enumerate(chunks_documents)}
+        ),
+        index_to_docstore_id={i: str(i) for i in range(len(chunks_documents))}
     )
     # Сохраняем индексную базу
     db_index.save_local(
@@ -464,12 +784,17 @@ def load_db_vector(folder_path_db_index: str, index_name: str):
     Returns:
         Векторная база FAISS
     """
-    return FAISS.load_local(
+    db_index = FAISS.load_local(
         allow_dangerous_deserialization=True,  # Разрешает десериализацию
-        embeddings=OpenAIEmbeddings(),  # Указывает векторные представления
+        embeddings=_cached_embeddings(folder_path_db_index),  # Указывает векторные представления
         folder_path=folder_path_db_index,  # путь к сохраненной векторной базе
         index_name=index_name  # имя сохраненной векторной базы
     )
+    # Число просматриваемых кластеров IVF задается при каждой загрузке
+    ivf_index = faiss.try_extract_index_ivf(db_index.index)
+    if ivf_index is not None:
+        ivf_index.nprobe = FAISS_NPROBE
+    return db_index
 
 
 # Функция запроса и ответа от OpenAI с поиском по векторной базе данных
@@ -498,13 +823,11 @@ def generate_db_answer(
     # Поиск чанков по векторной базе данных
     similar_documents = db_index.similarity_search(query, k=k)
     
-    # Формирование текстового контента из выбранных чанков для модели
-    message_content = re.sub(
-        r'\n{2}', ' ', 
-        '\n '.join([
-            f'Отрывок документа № {i+1}:\n' + doc.page_content
-            for i, doc in enumerate(similar_documents)
-        ])
+    # Формирование текстового контента из выбранных чанков для модели,
+    # двойные переводы строк заменяются в каждом отрывке до объединения
+    message_content = '\n '.join(
+        f'Отрывок документа № {i+1}:\n{doc.page_content}'.replace('\n\n', ' ')
+        for i, doc in enumerate(similar_documents)
     )
     
     if verbose:
@@ -519,7 +842,7 @@ def generate_db_answer(
         {"role": "user", "content": f'Вопрос пользователя: {query}'}
     ]
     
-    response = openai.chat.completions.create(
+    response = _openai_client().chat.completions.create(
         model=model,
         messages=messages,
         temperature=temp
@@ -553,6 +876,23 @@ def save_text_to_docx(text: str, file_path: str) -> None:
     print(f"Документ сохранен: {file_path}")
 
 
+# Регулярные выражения разметки markdown компилируются один раз при импорте
+_HEADER_RE = re.compile(r'^(#{1,4})\s+(.+)')
+_BULLET_RE = re.compile(r'^(\s*)[*\-+]\s+(.+)')
+_NUMBER_RE = re.compile(r'^(\s*)\d+\.\s+(.+)')
+_NESTED_RE = re.compile(r'^(\s+)[o°]\s+(.+)')
+# Форматирование внутри строки: экранированная звездочка, ***жирный курсив***,
+# **жирный** и *курсив*. Номер сработавшей группы задает форматирование
+_INLINE_FORMAT_RE = re.compile(
+    r'\\\*|\*\*\*(.*?)\*\*\*|\*\*(.*?)\*\*|\*(.*?)\*'
+)
+_INLINE_FORMATS = {
+    1: (True, True),   # (жирный, курсив)
+    2: (True, False),
+    3: (False, True),
+}
+
+
 # Сохранение markdown текста в формате DOCX с форматированием
 def markdown_to_docx(markdown_text: str, file_path: str) -> None:
     """
@@ -563,13 +903,26 @@ def markdown_to_docx(markdown_text: str, file_path: str) -> None:
         file_path: Путь для сохранения файла
     """
     from docx import Document
+    from docx.oxml import OxmlElement
     from docx.shared import Pt, Inches
     from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-    import re
+    from docx.text.paragraph import Paragraph
 
     # Создаем новый документ
     doc = Document()
 
+    # Параграфы собираются отдельными XML элементами и вставляются в тело
+    # документа одной операцией после разбора всего текста
+    elements = []
+
+    def new_paragraph(style=None):
+        element = OxmlElement('w:p')
+        elements.append(element)
+        paragraph = Paragraph(element, doc)
+        if style is not None:
+            paragraph.style = style
+        return paragraph
+
     # Устанавливаем поля страницы
     for section in doc.sections:
         section.left_margin = Inches(1)
@@ -577,63 +930,49 @@ def markdown_to_docx(markdown_text: str, file_path: str) -> None:
         section.top_margin = Inches(1)
         section.bottom_margin = Inches(1)
 
-    # Очищаем markdown от лишних пустых строк и пробелов
-    markdown_text = re.sub(r'\s+$', '', markdown_text, flags=re.MULTILINE)
-    markdown_text = re.sub(r'\n{3,}', '\n\n', markdown_text)
-    lines = [line.rstrip() for line in markdown_text.strip().split('\n')]
-
-    # Удаляем лишние пустые строки между блоками
+    # Очищаем markdown от пробелов в конце строк и лишних пустых строк
+    # между блоками за один проход по строкам
     cleaned_lines = []
     prev_empty = True
-    for line in lines:
-        if not line.strip():
+    for line in markdown_text.splitlines():
+        line = line.rstrip()
+        if not line:
             if not prev_empty:
                 cleaned_lines.append('')
             prev_empty = True
         else:
             cleaned_lines.append(line)
             prev_empty = False
+    # Пустые строки в конце не нужны: параграфы для пустых строк не создаются,
+    # поэтому в конце документа пустых параграфов не остается
+    while cleaned_lines and not cleaned_lines[-1].strip():
+        cleaned_lines.pop()
 
     # Функция для применения форматирования текста внутри параграфа
     def process_formatted_text(paragraph, text):
-        text = text.replace('\\*', '___ASTERISK___')
-        formats = [
-            (
-                r'\*\*\*(.*?)\*\*\*',
-                lambda t: {'text': t, 'bold': True, 'italic': True}
-            ),
-            (r'\*\*(.*?)\*\*', lambda t: {'text': t, 'bold': True}),
-            (r'\*(.*?)\*', lambda t: {'text': t, 'italic': True}),
-        ]
-        tokens = [(text, {})]
-        for pattern, formatter in formats:
-            new_tokens = []
-            for token_text, token_format in tokens:
-                if token_format:
-                    new_tokens.append((token_text, token_format))
-                    continue
-                parts = []
-                last_end = 0
-                for match in re.finditer(pattern, token_text):
-                    if match.start() > last_end:
-                        parts.append((token_text[last_end:match.start()], {}))
-                    format_props = formatter(match.group(1))
-                    parts.append((format_props['text'], format_props))
-                    last_end = match.end()
-                if last_end < len(token_text):
-                    parts.append((token_text[last_end:], {}))
-                if parts:
-                    new_tokens.extend(parts)
-                else:
-                    new_tokens.append((token_text, token_format))
-            tokens = new_tokens
-        for token_text, token_format in tokens:
-            run = paragraph.add_run(token_text.replace('___ASTERISK___', '*'))
+        # Разбираем строку за один проход: каждое совпадение - экранированная
+        # звездочка или отрывок с форматированием, между ними - обычный текст
+        tokens = []
+        last_end = 0
+        for match in _INLINE_FORMAT_RE.finditer(text):
+            if match.start() > last_end:
+                tokens.append((text[last_end:match.start()], False, False))
+            if match.lastindex is None:
+                # Экранированная звездочка выводится как есть
+                tokens.append(('*', False, False))
+            else:
+                bold, italic = _INLINE_FORMATS[match.lastindex]
+                tokens.append((match.group(match.lastindex), bold, italic))
+            last_end = match.end()
+        if last_end < len(text):
+            tokens.append((text[last_end:], False, False))
+        for token_text, bold, italic in tokens:
+            run = paragraph.add_run(token_text)
             run.font.name = 'Arial'
             run.font.size = Pt(11)
-            if token_format.get('bold'):
+            if bold:
                 run.bold = True
-            if token_format.get('italic'):
+            if italic:
                 run.italic = True
 
     # Основной цикл по строкам
@@ -641,22 +980,23 @@ def markdown_to_docx(markdown_text: str, file_path: str) -> None:
     while i < len(cleaned_lines):
         line = cleaned_lines[i]
         # Заголовки
-        header_match = re.match(r'^(#{1,4})\s+(.+)', line)
+        header_match = _HEADER_RE.match(line)
         if header_match:
             level = len(header_match.group(1))
             header_text = header_match.group(2)
-            p = doc.add_heading(header_text, level=level)
+            p = new_paragraph(f'Heading {level}')
+            p.add_run(header_text)
             p.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
             for run in p.runs:
                 run.font.name = 'Arial'
             i += 1
             continue
         # Маркированные списки
-        bullet_match = re.match(r'^(\s*)[*\-+]\s+(.+)', line)
+        bullet_match = _BULLET_RE.match(line)
         if bullet_match:
             indent = len(bullet_match.group(1))
             list_text = bullet_match.group(2)
-            p = doc.add_paragraph(style='List Bullet')
+            p = new_paragraph('List Bullet')
             if indent > 0:
                 p.paragraph_format.left_indent = Inches(0.25 * (indent // 2))
             process_formatted_text(p, list_text)
@@ -664,11 +1004,11 @@ def markdown_to_docx(markdown_text: str, file_path: str) -> None:
             i += 1
             continue
         # Нумерованные списки
-        number_match = re.match(r'^(\s*)\d+\.\s+(.+)', line)
+        number_match = _NUMBER_RE.match(line)
         if number_match:
             indent = len(number_match.group(1))
             list_text = number_match.group(2)
-            p = doc.add_paragraph(style='List Number')
+            p = new_paragraph('List Number')
             if indent > 0:
                 p.paragraph_format.left_indent = Inches(0.25 * (indent // 2))
             process_formatted_text(p, list_text)
@@ -676,11 +1016,11 @@ def markdown_to_docx(markdown_text: str, file_path: str) -> None:
             i += 1
             continue
         # Вложенные списки (o, °)
-        nested_match = re.match(r'^(\s+)[o°]\s+(.+)', line)
+        nested_match = _NESTED_RE.match(line)
         if nested_match:
             indent = len(nested_match.group(1))
             list_text = nested_match.group(2)
-            p = doc.add_paragraph(style='List Bullet')
+            p = new_paragraph('List Bullet')
             p.paragraph_format.left_indent = Inches(0.25 * (indent // 2))
             process_formatted_text(p, list_text)
             p.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
@@ -691,15 +1031,15 @@ def markdown_to_docx(markdown_text: str, file_path: str) -> None:
             i += 1
             continue
         # Обычный абзац
-        p = doc.add_paragraph()
+        p = new_paragraph()
         process_formatted_text(p, line)
         p.alignment = WD_PARAGRAPH_ALIGNMENT.JUSTIFY
         i += 1
 
-    # Удаляем пустые параграфы в конце
-    while doc.paragraphs and not doc.paragraphs[-1].text.strip():
-        p = doc.paragraphs[-1]
-        p._element.getparent().remove(p._element)
+    # Вставляем все параграфы перед свойствами раздела (w:sectPr)
+    body = doc.element.body
+    insert_at = len(body) if body.sectPr is None else body.index(body.sectPr)
+    body[insert_at:insert_at] = elements
 
     doc.save(file_path)
     print(f"Документ с форматированием Streamlit сохранен: {file_path}")
@@ -716,7 +1056,6 @@ def format_transcription_paragraphs(text: str, model: str = 'gpt-4o-mini') -> st
     Returns:
         Текст с разбивкой на абзацы
     """
-    import openai
     system = (
         "Ты профессиональный редактор. Тебе дан текст транскрибации, "
         "в котором нет абзацев. Разбей его на абзацы так, чтобы текст "
@@ -728,7 +1067,7 @@ def format_transcription_paragraphs(text: str, model: str = 'gpt-4o-mini') -> st
         "аккуратно оформленный текст. Не меняй и не сокращай сам текст, "
         "только оформи абзацы. Текст:\n" + text
     )
-    response = openai.chat.completions.create(
+    response = _openai_client().chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": system},
@@ -739,17 +1078,16 @@ def format_transcription_paragraphs(text: str, model: str = 'gpt-4o-mini') -> st
     return response.choices[0].message.content.strip()
 
 
-def translate_text_gpt(text: str, target_language: str, model: str = 'gpt-4o-mini') -> str:
+def _translation_messages(text: str, target_language: str) -> List[Dict[str, str]]:
     """
-    Переводит текст на целевой язык с помощью GPT-4o-mini.
+    Формирует сообщения для запроса перевода текста на целевой язык.
     
     Args:
         text: Исходный текст
         target_language: Язык перевода ("русский", "казахский", "английский")
-        model: Модель OpenAI для перевода
     
     Returns:
-        Переведённый текст
+        Список сообщений для chat completions
     """
     language_map = {
         "русский": "Russian",
@@ -762,17 +1100,156 @@ def translate_text_gpt(text: str, target_language: str, model: str = 'gpt-4o-min
         f"Сохрани структуру и смысл. Не добавляй ничего от себя."
     )
     user = f"Переведи на {lang}:\n{text}"
-    response = openai.chat.completions.create(
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user}
+    ]
+
+
+def translate_text_gpt(text: str, target_language: str, model: str = 'gpt-4o-mini') -> str:
+    """
+    Переводит текст на целевой язык с помощью GPT-4o-mini.
+    
+    Args:
+        text: Исходный текст
+        target_language: Язык перевода ("русский", "казахский", "английский")
+        model: Модель OpenAI для перевода
+    
+    Returns:
+        Переведённый текст
+    """
+    response = _openai_client().chat.completions.create(
         model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user}
-        ],
+        messages=_translation_messages(text, target_language),
         temperature=0.1
     )
     return response.choices[0].message.content.strip()
 
 
+# Выполнение нескольких запросов chat completions пакетным заданием OpenAI Batch API
+def chat_completions_batch(
+    requests: Dict[Any, List[Dict[str, str]]],
+    model: str = 'gpt-4o-mini',
+    temperature: float = 0.3,
+    poll_interval: float = 5.0,
+    max_poll_interval: float = 60.0,
+    batch_name: str = "requests"
+) -> Dict[Any, str]:
+    """
+    Отправляет несколько запросов одним пакетным заданием OpenAI Batch API.
+    Пакетные запросы стоят вдвое дешевле обычных, но результат приходит
+    не сразу, поэтому функция опрашивает статус задания до его завершения.
+    
+    Args:
+        requests: Словарь {идентификатор: сообщения для chat completions}
+        model: Модель OpenAI
+        temperature: Температура генерации
+        poll_interval: Начальный интервал опроса статуса (в секундах)
+        max_poll_interval: Максимальный интервал опроса статуса (в секундах)
+        batch_name: Название задания для входного файла и журнала
+    
+    Returns:
+        Словарь {идентификатор: ответ модели}; запросы, завершившиеся
+        ошибкой, в словарь не попадают
+    """
+    if not requests:
+        return {}
+    
+    # Каждый запрос — отдельная строка в JSONL файле задания
+    keys = list(requests)
+    lines = []
+    for index, key in enumerate(keys):
+        lines.append(json.dumps({
+            "custom_id": str(index),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": requests[key],
+                "temperature": temperature
+            }
+        }, ensure_ascii=False))
+    batch_input = ("\n".join(lines) + "\n").encode("utf-8")
+    
+    client = _openai_client()
+    input_file = client.files.create(
+        file=(f"{batch_name}.jsonl", batch_input),
+        purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+    print(f"Создано пакетное задание {batch_name} {batch.id} ({len(keys)} запросов)")
+    
+    # Опрашиваем статус задания с экспоненциально растущим интервалом
+    delay = poll_interval
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        time.sleep(delay)
+        delay = min(delay * 2, max_poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(
+            f"Пакетное задание {batch.id} завершилось со статусом {batch.status}"
+        )
+    
+    # Разбираем результаты и сопоставляем их с исходными идентификаторами
+    results = {}
+    output = client.files.content(batch.output_file_id).text
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        results[keys[int(record["custom_id"])]] = content
+    
+    return results
+
+
+# Пакетный перевод нескольких текстов через OpenAI Batch API
+def translate_texts_batch(
+    texts: Dict[str, str],
+    target_language: str,
+    model: str = 'gpt-4o-mini',
+    poll_interval: float = 5.0,
+    max_poll_interval: float = 60.0
+) -> Dict[str, str]:
+    """
+    Переводит несколько текстов одним пакетным заданием OpenAI Batch API.
+    
+    Args:
+        texts: Словарь {идентификатор: текст для перевода}
+        target_language: Язык перевода ("русский", "казахский", "английский")
+        model: Модель OpenAI для перевода
+        poll_interval: Начальный интервал опроса статуса (в секундах)
+        max_poll_interval: Максимальный интервал опроса статуса (в секундах)
+    
+    Returns:
+        Словарь {идентификатор: переведённый текст}
+    """
+    answers = chat_completions_batch(
+        {key: _translation_messages(text, target_language) for key, text in texts.items()},
+        model=model,
+        temperature=0.1,
+        poll_interval=poll_interval,
+        max_poll_interval=max_poll_interval,
+        batch_name="translations"
+    )
+    results = {key: answer.strip() for key, answer in answers.items()}
+    
+    # Тексты, которые не удалось перевести в пакете, переводим обычным запросом
+    for key in texts:
+        if key not in results:
+            results[key] = translate_text_gpt(texts[key], target_language, model)
+    
+    return results
+
+
 def detect_language(text: str) -> str:
     """
     Определяет язык текста с большей точностью, используя несколько методов.
@@ -790,50 +1267,133 @@ def detect_language(text: str) -> str:
     
     # Использовать первые 1000 символов для более точного определения
     sample_text = text[:1000] if len(text) > 1000 else text
+    # Короткие отрывки определяются без кэша, чтобы не занимать его
+    # нестабильными результатами
+    if len(sample_text) <= LANGUAGE_CACHE_MIN_LENGTH:
+        return _detect_language_sample.__wrapped__(sample_text)
+    return _detect_language_sample(sample_text)
+
+
+# Минимальная длина отрывка, результат определения языка для которого кэшируется
+LANGUAGE_CACHE_MIN_LENGTH = 100
+
+# Доля символов CJK письма, начиная с которой язык определяется без langdetect
+CJK_SHARE_THRESHOLD = 0.3
+
+# Частые английские служебные слова и их минимальное количество в тексте
+_ENGLISH_STOP_WORDS = frozenset({
+    "the", "and", "is", "are", "you", "that", "this", "of", "to", "in",
+    "it", "for", "with", "was", "what", "have"
+})
+ENGLISH_STOP_WORDS_MIN = 3
+
+# Английские слова, по которым исправляется ошибочное определение русского
+_ENG_MARKERS = frozenset({
+    "the", "and", "you", "is", "are", "this", "that", "what", "where",
+    "when", "how", "fibonacci", "trend", "level", "market", "usd",
+    "uptrend", "continue", "profit"
+})
+
+# Русские слова, по которым исправляется ошибочное определение македонского
+_RUS_MARKERS = frozenset({
+    "это", "привет", "спасибо", "пожалуйста", "да", "нет",
+    "говорить", "русский"
+})
+
+_WORD_RE = re.compile(r'\w+')
+
+
+# Результат зависит только от начала текста, поэтому повторные проверки
+# одной и той же транскрибации берутся из кэша
+@lru_cache(maxsize=128)
+def _detect_language_sample(sample_text: str) -> str:
+    # Считаем символы корейского, японского и китайского письма векторно по кодам
+    codes = np.frombuffer(sample_text.encode('utf-32-le'), dtype=np.uint32)
+    korean = int(((codes >= 0xAC00) & (codes <= 0xD7A3)).sum())
+    japanese = int(((codes >= 0x3040) & (codes <= 0x30FF)).sum())
+    chinese = int(((codes >= 0x4E00) & (codes <= 0x9FFF)).sum())
+    
+    # Текст преимущественно на CJK языке определяется без langdetect
+    if korean + japanese + chinese > CJK_SHARE_THRESHOLD * len(codes):
+        if korean:
+            return "ko"
+        if japanese:
+            return "ja"
+        return "zh"
+    
+    # Слова текста в нижнем регистре выделяются один раз для всех проверок
+    words = set(_WORD_RE.findall(sample_text.lower()))
+    
+    # Английский текст из одних ASCII символов с частыми служебными словами
+    # тоже определяется без langdetect
+    if (
+        bool((codes < 128).all())
+        and len(_ENGLISH_STOP_WORDS & words) >= ENGLISH_STOP_WORDS_MIN
+    ):
+        return "en"
     
     try:
         # Пробуем определить язык с помощью langdetect
         lang_code = detect(sample_text)
         
         # Проверяем язык на некоторые известные проблемы определения
-        if lang_code == "ru" and any(eng_word in sample_text.lower() for eng_word in [
-            "the", "and", "you", "is", "are", "this", "that", "what", "where",
-            "when", "how", "fibonacci", "trend", "level", "market", "usd",
-            "uptrend", "continue", "profit"
-        ]):
+        if lang_code == "ru" and _ENG_MARKERS & words:
             # Если обнаружены очевидные английские слова, но язык определился как русский
             return "en"
             
         # Определение корейского языка (проверка на наличие корейских символов)
-        if any('\uAC00' <= c <= '\uD7A3' for c in sample_text):
+        if korean:
             return "ko"
         
         # Определение японского языка (проверка на наличие японских символов)
-        if any('\u3040' <= c <= '\u30FF' for c in sample_text):
+        if japanese:
             return "ja"
             
         # Другие корректировки при необходимости
-        if lang_code == "mk" and any(rus_word in sample_text.lower() for rus_word in [
-            "это", "привет", "спасибо", "пожалуйста", "да", "нет",
-            "говорить", "русский"
-        ]):
+        if lang_code == "mk" and _RUS_MARKERS & words:
             # Македонский иногда путается с русским
             return "ru"
             
         return lang_code
     except LangDetectException:
         # В случае ошибки проверяем наличие символов определенных языков
-        if any('\uAC00' <= c <= '\uD7A3' for c in sample_text):  # Корейский
+        if korean:  # Корейский
             return "ko"
-        elif any('\u3040' <= c <= '\u30FF' for c in sample_text):  # Японский
+        elif japanese:  # Японский
             return "ja"
-        elif any('\u4E00' <= c <= '\u9FFF' for c in sample_text):  # Китайский
+        elif chinese:  # Китайский
             return "zh"
         
         # Если не удалось определить, возвращаем unknown
         return "unknown"
 
 
+def _iter_file_stats(directory):
+    """
+    Рекурсивно обходит директорию и возвращает размер и время изменения файлов
+    
+    Args:
+        directory: Директория для обхода
+        
+    Yields:
+        tuple: (размер в байтах, время изменения)
+    """
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from _iter_file_stats(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        # Размер и время изменения берутся из одного вызова stat
+                        st_info = entry.stat(follow_symlinks=False)
+                        yield st_info.st_size, st_info.st_mtime
+                except OSError as e:
+                    print(f"Ошибка при анализе файла {entry.path}: {str(e)}")
+    except OSError as e:
+        print(f"Ошибка при чтении директории {directory}: {str(e)}")
+
+
 def analyze_temp_files(directory):
     """
     Анализирует временные файлы в указанной директории
@@ -847,39 +1407,27 @@ def analyze_temp_files(directory):
     if not os.path.exists(directory):
         return 0, 0, {}
     
-    now = datetime.datetime.now()
-    count = 0
-    total_size = 0
+    stats = list(_iter_file_stats(directory))
+    sizes = np.array([size for size, _ in stats], dtype=np.int64)
+    mtimes = np.array([mtime for _, mtime in stats], dtype=np.float64)
+    
+    # Распределяем по возрастным группам векторными сравнениями
+    ages_days = (datetime.datetime.now().timestamp() - mtimes) / 86400
+    age_masks = {
+        "less_than_day": ages_days < 1,
+        "1_to_7_days": (ages_days >= 1) & (ages_days < 7),
+        "older_than_7_days": ages_days >= 7
+    }
     files_by_age = {
-        "less_than_day": {"count": 0, "size": 0},
-        "1_to_7_days": {"count": 0, "size": 0},
-        "older_than_7_days": {"count": 0, "size": 0}
+        age_group: {"count": int(mask.sum()), "size": int(sizes[mask].sum())}
+        for age_group, mask in age_masks.items()
     }
     
-    for file_path in glob.glob(f"{directory}/**/*", recursive=True):
-        if os.path.isfile(file_path):
-            try:
-                file_size = os.path.getsize(file_path)
-                file_mtime = datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-                file_age = now - file_mtime
-                
-                count += 1
-                total_size += file_size
-                
-                # Распределяем по возрастным группам
-                if file_age.days < 1:
-                    files_by_age["less_than_day"]["count"] += 1
-                    files_by_age["less_than_day"]["size"] += file_size
-                elif file_age.days < 7:
-                    files_by_age["1_to_7_days"]["count"] += 1
-                    files_by_age["1_to_7_days"]["size"] += file_size
-                else:
-                    files_by_age["older_than_7_days"]["count"] += 1
-                    files_by_age["older_than_7_days"]["size"] += file_size
-            except Exception as e:
-                print(f"Ошибка при анализе файла {file_path}: {str(e)}")
-    
-    return count, total_size, files_by_age
+    return len(stats), int(sizes.sum()), files_by_age
+
+
+# Единицы измерения размера файлов
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
 
 
 def format_file_size(size_bytes):
@@ -892,8 +1440,10 @@ def format_file_size(size_bytes):
     Returns:
         str: Отформатированный размер
     """
-    # Определяем единицы измерения
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if size_bytes < 1024 or unit == 'TB':
-            return f"{size_bytes:.2f} {unit}"
-        size_bytes /= 1024.0
\ No newline at end of file
+    # Единица измерения определяется по числу двоичных разрядов размера:
+    # каждые 10 разрядов - следующая единица
+    unit_index = min(
+        len(_SIZE_UNITS) - 1,
+        max(int(abs(size_bytes)).bit_length() - 1, 0) // 10
+    )
+    return f"{size_bytes / (1 << (10 * unit_index)):.2f} {_SIZE_UNITS[unit_index]}"
\ No newline at end of file
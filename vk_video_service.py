@@ -1,6 +1,9 @@
 import logging
 import os
 import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple
 
 import yt_dlp
@@ -12,6 +15,44 @@ logging.basicConfig(
 )
 logger = logging.getLogger('vk_video_service')
 
+# Регулярные выражения компилируются один раз при импорте модуля
+_SANITIZE_RE = re.compile(r'[\\/*?:"<>|]')
+# Ссылки на VK видео одним выражением: прямая ссылка на видео, ссылка
+# из браузера и мобильная ссылка. Поиск ведется по всей строке, поэтому
+# необязательные схема и поддомен в начале ссылки на результат не влияют
+_VK_URL_RE = re.compile(
+    r'vk\.com/(?:'
+    r'video-?[0-9]+_[0-9]+'
+    r'|vkvideo.*video-?[0-9]+_[0-9]+'
+    r'|video.*\?z=video-?[0-9]+_[0-9]+'
+    r')'
+)
+_DIRECT_URL_RE = re.compile(r'(?:https?://)?(?:www\.)?vk\.com/video-?[0-9]+_[0-9]+')
+_VIDEO_ID_RE = re.compile(r'video(-?[0-9]+_[0-9]+)')
+
+
+@lru_cache(maxsize=128)
+def _extract_info(url: str) -> Dict[str, Any]:
+    """
+    Получает информацию о видео через yt-dlp с кэшированием по URL.
+    
+    Ошибки не кэшируются: исключение пробрасывается вызывающему коду.
+    
+    Args:
+        url: Нормализованный URL видео VK
+        
+    Returns:
+        Словарь с информацией о видео
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
 class VKVideoDownloader:
     """
     Класс для скачивания аудио из VK видео
@@ -39,28 +80,23 @@ class VKVideoDownloader:
             Безопасное имя файла
         """
         # Заменяем недопустимые для файловой системы символы
-        return re.sub(r'[\\/*?:"<>|]', "_", filename)
+        return _SANITIZE_RE.sub("_", filename)
     
     def get_video_info(self, url: str) -> Dict[str, Any]:
         """
         Получает информацию о видео
         
+        Повторные запросы одного и того же видео берутся из кэша
+        (сбросить его можно через _extract_info.cache_clear()).
+        
         Args:
             url: URL видео VK
             
         Returns:
             Словарь с информацией о видео
         """
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return info
+            return _extract_info(self.normalize_vk_url(url))
         except Exception as e:
             logger.error(f"Ошибка при получении информации о видео: {e}")
             return {}
@@ -69,15 +105,21 @@ class VKVideoDownloader:
         self, 
         url: str, 
         output_filename: Optional[str] = None, 
-        progress_callback=None
+        progress_callback=None,
+        force_mp3: bool = False
     ) -> Optional[str]:
         """
         Скачивает аудио из VK видео
         
+        По умолчанию аудиодорожка сохраняется в исходном кодеке без
+        перекодирования: дальнейшая обработка принимает любой формат,
+        который читает ffmpeg.
+        
         Args:
             url: URL видео VK
             output_filename: Имя выходного файла (без расширения)
             progress_callback: Функция обратного вызова для отображения прогресса
+            force_mp3: Перекодировать аудио в MP3 192 кбит/с, как раньше
             
         Returns:
             Путь к загруженному аудио файлу или None в случае ошибки
@@ -109,12 +151,16 @@ class VKVideoDownloader:
         # Настройки для загрузки
         ydl_opts = {
             'format': 'bestaudio/best',
-            'outtmpl': output_path,
+            # Расширение подставляет yt-dlp: при 'best' аудиодорожка в m4a/mp3/opus
+            # не переименовывается постпроцессором. Символ % экранируется удвоением
+            'outtmpl': f"{output_path.replace('%', '%%')}.%(ext)s",
             'noplaylist': True,  # Только видео, не плейлист
+            # 'best' оставляет кодек исходной дорожки: аудиофайл не
+            # перекодируется, а из видео дорожка только извлекается
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
+                'preferredcodec': 'mp3' if force_mp3 else 'best',
+                'preferredquality': '192' if force_mp3 else '0',
             }],
             'verbose': False
         }
@@ -151,17 +197,18 @@ class VKVideoDownloader:
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 logger.info(f"Начинаем загрузку: {url}")
-                ydl.download([url])
+                info = ydl.extract_info(url, download=True) or {}
             
-            # Проверяем, какой файл был создан
-            result_file = f"{output_path}.mp3"
+            # yt-dlp сообщает путь к итоговому файлу после постобработки
+            requested = info.get('requested_downloads') or []
+            result_file = requested[-1].get('filepath') if requested else None
             
-            if os.path.exists(result_file):
+            if result_file and os.path.exists(result_file):
                 logger.info(f"Файл успешно загружен: {result_file}")
                 return result_file
             
             # Если файл не найден с ожидаемым расширением, ищем другие варианты
-            for ext in ['.m4a', '.wav', '.opus', '.webm', '.mp3']:
+            for ext in ['.m4a', '.wav', '.opus', '.ogg', '.flac', '.webm', '.mp3']:
                 possible_file = f"{output_path}{ext}"
                 if os.path.exists(possible_file):
                     logger.info(f"Найден файл с другим расширением: {possible_file}")
@@ -173,6 +220,82 @@ class VKVideoDownloader:
             logger.error(f"Ошибка при загрузке аудио: {str(e)}")
             return None
     
+    def _convert_to_mp3(self, audio_file: str) -> Optional[str]:
+        """
+        Перекодирует аудио файл в MP3 через ffmpeg
+        
+        Args:
+            audio_file: Путь к скачанному аудио файлу
+            
+        Returns:
+            Путь к MP3 файлу или None в случае ошибки
+        """
+        if audio_file.endswith('.mp3'):
+            return audio_file
+        
+        mp3_file = f"{os.path.splitext(audio_file)[0]}.mp3"
+        try:
+            subprocess.run(
+                [
+                    os.environ.get("FFMPEG_BINARY", "ffmpeg"),
+                    "-loglevel", "error",
+                    "-y",
+                    "-i", audio_file,
+                    "-vn",
+                    "-codec:a", "libmp3lame",
+                    "-b:a", "192k",
+                    mp3_file
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                check=True
+            )
+            os.remove(audio_file)
+            return mp3_file
+        except Exception as e:
+            logger.error(f"Ошибка при перекодировании {audio_file} в MP3: {str(e)}")
+            return None
+    
+    def download_many(
+        self,
+        urls: List[str],
+        force_mp3: bool = False
+    ) -> List[Optional[str]]:
+        """
+        Скачивает аудио из нескольких VK видео
+        
+        Загрузка и перекодирование в MP3 выполняются в отдельных потоках:
+        пока ffmpeg перекодирует один файл, следующий уже скачивается.
+        
+        Args:
+            urls: Список URL видео VK
+            force_mp3: Перекодировать аудио в MP3
+            
+        Returns:
+            Пути к аудио файлам в порядке ссылок,
+            None для ссылок, которые не удалось загрузить
+        """
+        if not urls:
+            return []
+        
+        with ThreadPoolExecutor(max_workers=1) as download_executor, \
+                ThreadPoolExecutor(max_workers=1) as convert_executor:
+            downloads = [
+                download_executor.submit(self.download_audio, url) for url in urls
+            ]
+            if not force_mp3:
+                return [future.result() for future in downloads]
+            
+            # Каждый скачанный файл сразу передаем на перекодирование
+            conversions = []
+            for future in downloads:
+                audio_file = future.result()
+                conversions.append(
+                    convert_executor.submit(self._convert_to_mp3, audio_file)
+                    if audio_file else None
+                )
+            return [future.result() if future else None for future in conversions]
+    
     @staticmethod
     def is_vk_url(url: str) -> bool:
         """
@@ -184,20 +307,7 @@ class VKVideoDownloader:
         Returns:
             True, если URL указывает на VK видео
         """
-        vk_patterns = [
-            # Прямая ссылка на видео
-            r'(?:https?://)?(?:www\.)?vk\.com/video-?[0-9]+_[0-9]+',
-            # Ссылка из браузера
-            r'(?:https?://)?(?:www\.)?vk\.com/vkvideo.*video-?[0-9]+_[0-9]+',
-            # Мобильная ссылка
-            r'(?:https?://)?(?:m\.)?vk\.com/video.*\?z=video-?[0-9]+_[0-9]+'
-        ]
-        
-        for pattern in vk_patterns:
-            if re.search(pattern, url):
-                return True
-        
-        return False
+        return bool(_VK_URL_RE.search(url))
     
     def normalize_vk_url(self, url: str) -> str:
         """
@@ -211,12 +321,11 @@ class VKVideoDownloader:
             Нормализованный URL на видео
         """
         # Если это уже прямая ссылка на видео
-        pattern = r'(?:https?://)?(?:www\.)?vk\.com/video-?[0-9]+_[0-9]+'
-        if re.match(pattern, url):
+        if _DIRECT_URL_RE.match(url):
             return url
         
         # Извлекаем ID видео из ссылки из браузера или мобильной ссылки
-        video_id_match = re.search(r'video(-?[0-9]+_[0-9]+)', url)
+        video_id_match = _VIDEO_ID_RE.search(url)
         if video_id_match:
             video_id = video_id_match.group(1)
             return f"https://vk.com/video{video_id}"
@@ -234,7 +343,7 @@ class VKVideoDownloader:
         Returns:
             ID видео или None, если URL не распознан
         """
-        match = re.search(r'video(-?[0-9]+_[0-9]+)', url)
+        match = _VIDEO_ID_RE.search(url)
         if match:
             return match.group(1)
         
@@ -1,15 +1,62 @@
 import os
 import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 from urllib.parse import urlparse, unquote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Список допустимых расширений для аудио и видео
 ALLOWED_EXTENSIONS = {
     '.mp3', '.wav', '.m4a', '.flac', '.ogg',
     '.mp4', '.mov', '.avi', '.mkv', '.webm'
 }
+# Те же расширения кортежем для проверки имени файла одним вызовом str.endswith
+ALLOWED_EXT_TUPLE = tuple(ALLOWED_EXTENSIONS)
+
+# Максимальное количество одновременных загрузок файлов папки
+MAX_PARALLEL_DOWNLOADS = 8
+# Интервал обновления прогресса загрузки папки (в секундах)
+PROGRESS_INTERVAL = 0.5
+
+# Адреса API для метаданных публичных ресурсов и прямых ссылок на скачивание
+RESOURCES_API_URL = "https://cloud-api.yandex.net/v1/disk/public/resources"
+DOWNLOAD_API_URL = "https://cloud-api.yandex.net/v1/disk/public/resources/download"
+
+# Количество элементов папки в одном запросе списка и число параллельных
+# запросов страниц для больших папок
+FOLDER_PAGE_SIZE = 1000
+MAX_PARALLEL_LISTING = 4
+
+# Поля элементов папки, которые используются при скачивании. Остальные
+# метаданные (превью, хэши, размеры) в ответе API не запрашиваются
+FOLDER_ITEM_FIELDS = ",".join(
+    [f"_embedded.items.{field}" for field in ("name", "type", "path", "public_url", "file")]
+    + ["_embedded.total"]
+)
+
+# Размер блока при потоковом скачивании файлов (1 MiB)
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# aria2c (если установлен) скачивает большие файлы в несколько соединений
+ARIA2C_BINARY = shutil.which("aria2c")
+ARIA2C_MIN_SIZE = 50 * 1024 * 1024
+ARIA2C_CONNECTIONS = 8
+_ARIA2C_PROGRESS_RE = re.compile(r'\((\d+)%\)')
+
+# Время, в течение которого полученная прямая ссылка на скачивание
+# используется повторно без запроса к API (в секундах)
+HREF_TTL = 180
+
+# Размер пула HTTP соединений и коды ответов, при которых запрос повторяется
+HTTP_POOL_SIZE = 16
+RETRY_STATUSES = (502, 503, 504)
 
 
 class YandexDiskDownloader:
@@ -22,6 +69,37 @@ class YandexDiskDownloader:
         """
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
+        # Директории, которые уже созданы этим загрузчиком
+        self._created_dirs = {output_dir}
+        # Прямые ссылки на скачивание по параметрам запроса: (ссылка, время истечения)
+        self._hrefs = {}
+        self._hrefs_lock = threading.Lock()
+        
+        # Общая сессия с пулом соединений: повторные запросы к API и серверам
+        # загрузки Яндекс Диска не устанавливают заново TCP и TLS соединение
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=RETRY_STATUSES
+            )
+        )
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        """
+        Закрывает HTTP сессию и освобождает пул соединений
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def is_yandex_disk_url(self, url):
         """
@@ -45,9 +123,153 @@ class YandexDiskDownloader:
         Returns:
             bool: True, если это аудио или видео файл, иначе False
         """
-        return os.path.splitext(filename)[1].lower() in ALLOWED_EXTENSIONS
+        return filename.lower().endswith(ALLOWED_EXT_TUPLE)
 
-    def download_file(self, public_url, save_path, progress_callback=None):
+    def _get_download_href(self, params):
+        """
+        Возвращает прямую ссылку на скачивание, повторно используя
+        полученную ранее ссылку, пока не истек ее срок
+        
+        Args:
+            params: Параметры запроса к API скачивания (public_key и path)
+            
+        Returns:
+            str: Прямая ссылка на скачивание
+        """
+        key = tuple(sorted(params.items()))
+        with self._hrefs_lock:
+            entry = self._hrefs.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        
+        response = self.session.get(DOWNLOAD_API_URL, params=params)
+        response.raise_for_status()
+        href = response.json()['href']
+        self._remember_download_href(params, href)
+        return href
+
+    def _remember_download_href(self, params, href):
+        """
+        Сохраняет прямую ссылку на скачивание для повторного использования
+        
+        Args:
+            params: Параметры запроса к API скачивания
+            href: Прямая ссылка на скачивание
+        """
+        with self._hrefs_lock:
+            self._hrefs[tuple(sorted(params.items()))] = (href, time.monotonic() + HREF_TTL)
+
+    def _forget_download_href(self, params):
+        """
+        Удаляет сохраненную прямую ссылку, например, если по ней не удалось скачать файл
+        
+        Args:
+            params: Параметры запроса к API скачивания
+        """
+        with self._hrefs_lock:
+            self._hrefs.pop(tuple(sorted(params.items())), None)
+
+    def _save_response(self, r, save_path, total_length, progress_callback=None):
+        """
+        Сохраняет тело потокового ответа в файл
+        
+        Args:
+            r: Потоковый ответ с содержимым файла
+            save_path: Путь для сохранения файла
+            total_length: Размер файла из заголовка Content-Length (0, если неизвестен)
+            progress_callback: Функция обратного вызова для отображения прогресса
+        """
+        with open(save_path, 'wb') as f:
+            if progress_callback is None:
+                # Прогресс не нужен: копируем поток в файл без цикла
+                # по блокам на Python
+                r.raw.decode_content = True
+                shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+            elif total_length == 0:  # Неизвестный размер
+                f.write(r.content)
+            else:  # Известный размер
+                dl = 0
+                last_percent = -1
+                # Множитель вычисляем один раз, а не делим на размер в каждом блоке
+                percent_per_byte = 100 / total_length
+                # Размер известен, поэтому читаем тело напрямую из r.raw,
+                # минуя генератор iter_content
+                r.raw.decode_content = True
+                while True:
+                    chunk = r.raw.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dl += len(chunk)
+                    f.write(chunk)
+                    percent = int(dl * percent_per_byte)
+                    # Прогресс сообщаем только при изменении процента
+                    if percent != last_percent:
+                        last_percent = percent
+                        # Прогресс от 30% до 90%
+                        progress = 30 + min(60 * percent // 100, 60)
+                        progress_callback(
+                            progress,
+                            f"Скачивание: {percent}%"
+                        )
+
+    def _download_with_aria2c(self, download_url, save_path, progress_callback=None):
+        """
+        Скачивает файл через aria2c, разделяя его на несколько соединений
+        
+        Args:
+            download_url: Прямая ссылка на скачивание
+            save_path: Путь для сохранения файла
+            progress_callback: Функция обратного вызова для отображения прогресса
+            
+        Returns:
+            bool: True, если файл скачан, иначе False
+        """
+        command = [
+            ARIA2C_BINARY,
+            "-x", str(ARIA2C_CONNECTIONS),
+            "-s", str(ARIA2C_CONNECTIONS),
+            "--summary-interval=1",
+            "--console-log-level=warn",
+            "--allow-overwrite=true",
+            "--auto-file-renaming=false",
+            "-d", os.path.dirname(save_path) or ".",
+            "-o", os.path.basename(save_path),
+            download_url
+        ]
+        try:
+            with subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                errors="replace"
+            ) as process:
+                last_percent = -1
+                # aria2c раз в секунду выводит строку вида [#gid 1.0MiB/10MiB(10%) ...]
+                for line in process.stdout:
+                    match = _ARIA2C_PROGRESS_RE.search(line)
+                    if match and progress_callback:
+                        percent = int(match.group(1))
+                        if percent != last_percent:
+                            last_percent = percent
+                            # Прогресс от 30% до 90%
+                            progress_callback(
+                                30 + 60 * percent // 100,
+                                f"Скачивание: {percent}%"
+                            )
+            if process.returncode == 0:
+                return True
+            print(f"aria2c завершился с кодом {process.returncode}")
+        except OSError as e:
+            print(f"Ошибка при запуске aria2c: {str(e)}")
+        
+        # Удаляем служебный файл незавершенной загрузки aria2c
+        control_file = f"{save_path}.aria2"
+        if os.path.exists(control_file):
+            os.remove(control_file)
+        return False
+
+    def download_file(self, public_url, save_path, progress_callback=None, size=None):
         """
         Скачивает файл с публичной ссылки Яндекс Диска
         
@@ -55,6 +277,7 @@ class YandexDiskDownloader:
             public_url: Публичная ссылка на файл Яндекс Диска
             save_path: Путь для сохранения файла
             progress_callback: Функция обратного вызова для отображения прогресса
+            size: Размер файла из метаданных API (None, если неизвестен)
             
         Returns:
             str: Путь к сохраненному файлу или None в случае ошибки
@@ -67,41 +290,43 @@ class YandexDiskDownloader:
                 )
             
             # Получаем прямую ссылку на скачивание
-            api_url = "https://cloud-api.yandex.net/v1/disk/public/resources/download"
             params = {'public_key': public_url}
-            response = requests.get(api_url, params=params)
-            response.raise_for_status()
-            download_url = response.json()['href']
+            download_url = self._get_download_href(params)
             
             if progress_callback:
                 progress_callback(
                     30, f"Начало скачивания {Path(save_path).name}..."
                 )
             
-            # Скачиваем файл с поддержкой потокового режима
-            with requests.get(download_url, stream=True) as r:
-                r.raise_for_status()
-                total_length = int(r.headers.get('content-length', 0))
-                
-                # Создаем директории, если они не существуют
-                os.makedirs(os.path.dirname(save_path), exist_ok=True)
-                
-                with open(save_path, 'wb') as f:
-                    if total_length == 0:  # Неизвестный размер
-                        f.write(r.content)
-                    else:  # Известный размер
-                        dl = 0
-                        for chunk in r.iter_content(chunk_size=8192):
-                            if chunk:
-                                dl += len(chunk)
-                                f.write(chunk)
-                                if progress_callback:
-                                    # Прогресс от 30% до 90%
-                                    progress = 30 + int(min(60 * dl / total_length, 60))
-                                    progress_callback(
-                                        progress,
-                                        f"Скачивание: {dl * 100 // total_length}%"
-                                    )
+            # Создаем директории, если они еще не создавались
+            save_dir = os.path.dirname(save_path)
+            if save_dir and save_dir not in self._created_dirs:
+                os.makedirs(save_dir, exist_ok=True)
+                self._created_dirs.add(save_dir)
+            
+            # Большие файлы скачиваем через aria2c в несколько соединений.
+            # Размер берем из метаданных, а если его нет - из HEAD запроса,
+            # чтобы не открывать поток с телом файла, который aria2c запросит заново
+            use_aria2c = False
+            if ARIA2C_BINARY is not None:
+                if size is None:
+                    try:
+                        head = self.session.head(download_url, allow_redirects=True)
+                        head.raise_for_status()
+                        size = int(head.headers.get('content-length', 0))
+                    except (requests.RequestException, ValueError):
+                        # Размер неизвестен: скачиваем обычным способом
+                        size = 0
+                use_aria2c = size > ARIA2C_MIN_SIZE
+            
+            # Без aria2c или если он не справился, скачиваем файл обычным способом
+            if not use_aria2c or not self._download_with_aria2c(
+                download_url, save_path, progress_callback
+            ):
+                with self.session.get(download_url, stream=True) as r:
+                    r.raise_for_status()
+                    total_length = int(r.headers.get('content-length', 0))
+                    self._save_response(r, save_path, total_length, progress_callback)
             
             if progress_callback:
                 progress_callback(
@@ -110,11 +335,33 @@ class YandexDiskDownloader:
             
             return save_path
         except Exception as e:
+            self._forget_download_href({'public_key': public_url})
             if progress_callback:
                 progress_callback(0, f"Ошибка: {str(e)}")
             print(f"Ошибка при скачивании файла: {str(e)}")
             return None
 
+    def _get_folder_page(self, public_url, offset):
+        """
+        Получает одну страницу элементов публичной папки Яндекс Диска
+        
+        Args:
+            public_url: Публичная ссылка на папку Яндекс Диска
+            offset: Смещение первого элемента страницы
+            
+        Returns:
+            list: Список элементов страницы
+        """
+        params = {
+            'public_key': public_url,
+            'limit': FOLDER_PAGE_SIZE,
+            'offset': offset,
+            'fields': FOLDER_ITEM_FIELDS
+        }
+        response = self.session.get(RESOURCES_API_URL, params=params)
+        response.raise_for_status()
+        return response.json()['_embedded']['items']
+
     def get_folder_items(self, public_url, progress_callback=None):
         """
         Получает список элементов из публичной папки Яндекс Диска
@@ -130,32 +377,159 @@ class YandexDiskDownloader:
             if progress_callback:
                 progress_callback(10, "Получение списка файлов из папки...")
             
-            api_url = "https://cloud-api.yandex.net/v1/disk/public/resources"
             params = {
                 'public_key': public_url,
-                'limit': 1000
+                'limit': FOLDER_PAGE_SIZE,
+                'fields': FOLDER_ITEM_FIELDS
             }
-            response = requests.get(api_url, params=params)
+            response = self.session.get(RESOURCES_API_URL, params=params)
             response.raise_for_status()
+            embedded = response.json()['_embedded']
+            items = embedded['items']
+            
+            # Если элементов больше одной страницы, остальные страницы
+            # запрашиваем параллельно
+            total = embedded.get('total', len(items))
+            if total > FOLDER_PAGE_SIZE:
+                with ThreadPoolExecutor(max_workers=MAX_PARALLEL_LISTING) as executor:
+                    pages = executor.map(
+                        lambda offset: self._get_folder_page(public_url, offset),
+                        range(FOLDER_PAGE_SIZE, total, FOLDER_PAGE_SIZE)
+                    )
+                    for page_items in pages:
+                        items.extend(page_items)
             
             if progress_callback:
                 progress_callback(20, "Анализ содержимого папки...")
             
-            return response.json()['_embedded']['items']
+            return items
         except Exception as e:
             if progress_callback:
                 progress_callback(0, f"Ошибка: {str(e)}")
             print(f"Ошибка при получении содержимого папки: {str(e)}")
             return None
 
-    def download_folder_files(self, public_url, items, progress_callback=None):
+    def _stream_to_file(self, download_url, file_path, file_name, file_progress_callback):
+        """
+        Скачивает файл по прямой ссылке с отображением прогресса
+        
+        Args:
+            download_url: Прямая ссылка на скачивание
+            file_path: Путь для сохранения файла
+            file_name: Имя файла для сообщений о прогрессе
+            file_progress_callback: Функция для отображения прогресса файла
+        """
+        with self.session.get(download_url, stream=True) as r:
+            r.raise_for_status()
+            total_length = int(r.headers.get('content-length', 0))
+            
+            with open(file_path, 'wb') as f:
+                if total_length == 0:
+                    f.write(r.content)
+                    file_progress_callback(
+                        100, f"Файл {file_name} загружен"
+                    )
+                else:
+                    dl = 0
+                    last_percent = -1
+                    # Множитель вычисляем один раз, а не делим на размер в каждом блоке
+                    percent_per_byte = 100 / total_length
+                    # Размер известен, поэтому читаем тело напрямую из r.raw,
+                    # минуя генератор iter_content
+                    r.raw.decode_content = True
+                    while True:
+                        chunk = r.raw.read(DOWNLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dl += len(chunk)
+                        f.write(chunk)
+                        percent = int(dl * percent_per_byte)
+                        # Прогресс сообщаем только при изменении процента
+                        if percent != last_percent:
+                            last_percent = percent
+                            percent = min(percent, 100)
+                            file_progress_callback(
+                                percent, f"Скачивание {file_name}: {percent}%"
+                            )
+
+    def _download_one(self, public_url, item, file_progress_callback):
+        """
+        Скачивает один файл из публичной папки Яндекс Диска
+        
+        Сначала используется ссылка из метаданных файла, а при ошибке -
+        путь к файлу внутри папки.
+        
+        Args:
+            public_url: Публичная ссылка на папку Яндекс Диска
+            item: Метаданные файла из списка элементов папки
+            file_progress_callback: Функция для отображения прогресса файла
+            
+        Returns:
+            str: Путь к сохраненному файлу или None в случае ошибки
+        """
+        file_name = item['name']
+        file_path = os.path.join(self.output_dir, file_name)
+        
+        # Используем публичную ссылку файла из его свойств
+        file_public_url = item.get('public_url') or item.get('file')
+        
+        # Если нет прямой ссылки на файл, используем path из метаданных
+        if not file_public_url:
+            download_params = {
+                'public_key': public_url, 
+                'path': item.get('path', '')
+            }
+        else:
+            download_params = {'public_key': file_public_url}
+        
+        attempts = (
+            (
+                download_params,
+                f"Получение ссылки для скачивания {file_name}...",
+                f"Начало скачивания {file_name}...",
+                "загрузке"
+            ),
+            # Запасной вариант: ссылка по пути в папке (для обратной совместимости)
+            (
+                {'public_key': public_url, 'path': f"/{file_name}"},
+                f"Пробуем альтернативный метод скачивания для {file_name}...",
+                f"Начало скачивания {file_name} (альтернативный метод)...",
+                "альтернативной загрузке"
+            )
+        )
+        
+        for params, link_message, start_message, error_label in attempts:
+            try:
+                file_progress_callback(10, link_message)
+                # Получаем прямую ссылку для скачивания данного файла
+                download_url = self._get_download_href(params)
+                
+                file_progress_callback(20, start_message)
+                self._stream_to_file(
+                    download_url, file_path, file_name, file_progress_callback
+                )
+                return file_path
+            except Exception as e:
+                self._forget_download_href(params)
+                file_progress_callback(
+                    0, f"Ошибка при {error_label} {file_name}: {str(e)}"
+                )
+                print(f"Ошибка при {error_label} файла {file_name}: {str(e)}")
+        
+        return None
+
+    def download_folder_files(self, public_url, items, progress_callback=None, file_callback=None):
         """
         Скачивает аудио и видео файлы из публичной папки Яндекс Диска
         
+        Файлы скачиваются параллельно, а прогресс и file_callback вызываются
+        из вызывающего потока.
+        
         Args:
             public_url: Публичная ссылка на папку Яндекс Диска
             items: Список элементов в папке
             progress_callback: Функция обратного вызова для отображения прогресса
+            file_callback: Функция, которая вызывается с путем каждого файла сразу после его скачивания
             
         Returns:
             list: Список путей к сохраненным файлам
@@ -168,133 +542,56 @@ class YandexDiskDownloader:
             if item['type'] == 'file' and self.is_allowed_file(item['name'])
         ]
         
-        if not media_files and progress_callback:
-            progress_callback(0, "В папке не найдено аудио или видео файлов")
+        if not media_files:
+            if progress_callback:
+                progress_callback(0, "В папке не найдено аудио или видео файлов")
             return []
         
         total_files = len(media_files)
         
-        for i, item in enumerate(media_files):
-            file_name = item['name']
-            file_path = os.path.join(self.output_dir, file_name)
-            
-            # Создаем прокси для индивидуального прогресса файла
+        # Потоки загрузки только записывают свой прогресс, а отображается
+        # он из вызывающего потока
+        progress_lock = threading.Lock()
+        file_percents = [0] * total_files
+        last_message = [""]
+        
+        def make_file_progress_callback(index):
             def file_progress_callback(percent, message):
-                if progress_callback:
-                    # Общий прогресс, учитывая процент выполненных файлов
-                    overall_percent = int(
-                        20 + (80 * (i / total_files + (percent / 100) / total_files))
-                    )
-                    progress_callback(
-                        overall_percent, f"[{i+1}/{total_files}] {message}"
-                    )
-            
-            # Используем file_id из метаданных файла
-            # Получаем прямую ссылку для скачивания данного файла
-            api_url = "https://cloud-api.yandex.net/v1/disk/public/resources/download"
-            # Используем публичную ссылку файла из его свойств
-            file_public_url = item.get('public_url') or item.get('file')
-            
-            # Если нет прямой ссылки на файл, используем path из метаданных
-            if not file_public_url:
-                download_params = {
-                    'public_key': public_url, 
-                    'path': item.get('path', '')
-                }
-            else:
-                download_params = {'public_key': file_public_url}
-            
-            try:
-                file_progress_callback(
-                    10, f"Получение ссылки для скачивания {file_name}..."
-                )
-                download_response = requests.get(api_url, params=download_params)
-                download_response.raise_for_status()
-                download_url = download_response.json()['href']
-                
-                file_progress_callback(20, f"Начало скачивания {file_name}...")
-                # Скачиваем файл с отображением прогресса
-                with requests.get(download_url, stream=True) as r:
-                    r.raise_for_status()
-                    total_length = int(r.headers.get('content-length', 0))
-                    
-                    with open(file_path, 'wb') as f:
-                        if total_length == 0:
-                            f.write(r.content)
-                            file_progress_callback(
-                                100, f"Файл {file_name} загружен"
-                            )
-                        else:
-                            dl = 0
-                            for chunk in r.iter_content(chunk_size=8192):
-                                if chunk:
-                                    dl += len(chunk)
-                                    f.write(chunk)
-                                    percent = min(100, int(dl * 100 / total_length))
-                                    file_progress_callback(
-                                        percent, f"Скачивание {file_name}: {percent}%"
-                                    )
-                
-                downloaded_files.append(file_path)
-                
-            except Exception as e:
-                file_progress_callback(
-                    0, f"Ошибка при загрузке {file_name}: {str(e)}"
+                with progress_lock:
+                    file_percents[index] = percent
+                    last_message[0] = f"[{index+1}/{total_files}] {message}"
+            return file_progress_callback
+        
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_PARALLEL_DOWNLOADS, total_files)
+        ) as executor:
+            futures = {
+                executor.submit(
+                    self._download_one, public_url, item, make_file_progress_callback(i)
+                ): i
+                for i, item in enumerate(media_files)
+            }
+            running = set(futures)
+            while running:
+                finished, running = wait(
+                    running, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED
                 )
-                print(f"Ошибка при скачивании файла {file_name}: {str(e)}")
+                # Каждый файл передаем дальше сразу после загрузки, не дожидаясь остальных
+                for future in finished:
+                    with progress_lock:
+                        file_percents[futures[future]] = 100
+                    file_path = future.result()
+                    if file_path:
+                        downloaded_files.append(file_path)
+                        if file_callback:
+                            file_callback(file_path)
                 
-                # Запасной вариант, если не сработал основной метод
-                try:
-                    file_progress_callback(
-                        10, f"Пробуем альтернативный метод скачивания для {file_name}..."
-                    )
-                    # Пробуем создать ссылку вручную (для обратной совместимости)
-                    alternative_params = {
-                        'public_key': public_url, 
-                        'path': f"/{file_name}"
-                    }
-                    download_response = requests.get(api_url, params=alternative_params)
-                    download_response.raise_for_status()
-                    download_url = download_response.json()['href']
-                    
-                    file_progress_callback(
-                        20, f"Начало скачивания {file_name} (альтернативный метод)..."
-                    )
-                    # Скачиваем файл с отображением прогресса
-                    with requests.get(download_url, stream=True) as r:
-                        r.raise_for_status()
-                        total_length = int(r.headers.get('content-length', 0))
-                        
-                        with open(file_path, 'wb') as f:
-                            if total_length == 0:
-                                f.write(r.content)
-                                file_progress_callback(
-                                    100, f"Файл {file_name} загружен"
-                                )
-                            else:
-                                dl = 0
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    if chunk:
-                                        dl += len(chunk)
-                                        f.write(chunk)
-                                        percent = min(
-                                            100, int(dl * 100 / total_length)
-                                        )
-                                        file_progress_callback(
-                                            percent, 
-                                            f"Скачивание {file_name}: {percent}%"
-                                        )
-                    
-                    downloaded_files.append(file_path)
-                except Exception as e2:
-                    file_progress_callback(
-                        0, f"Ошибка при альтернативной загрузке {file_name}: {str(e2)}"
-                    )
-                    print(
-                        f"Ошибка при альтернативном скачивании файла "
-                        f"{file_name}: {str(e2)}"
-                    )
-                    continue
+                if progress_callback:
+                    with progress_lock:
+                        # Общий прогресс по всем файлам папки
+                        overall_percent = int(20 + 80 * sum(file_percents) / (100 * total_files))
+                        message = last_message[0]
+                    progress_callback(overall_percent, message)
         
         if progress_callback:
             progress_callback(100, f"Загружено файлов: {len(downloaded_files)}")
@@ -336,13 +633,14 @@ class YandexDiskDownloader:
         """
         return "/d/" in url
 
-    def process_yandex_disk_url(self, url, progress_callback=None):
+    def process_yandex_disk_url(self, url, progress_callback=None, file_callback=None):
         """
         Обрабатывает URL Яндекс Диска, скачивая файл или все файлы из папки
         
         Args:
             url: URL на файл или папку Яндекс Диска
             progress_callback: Функция обратного вызова для отображения прогресса
+            file_callback: Функция, которая вызывается с путем каждого файла сразу после его скачивания
             
         Returns:
             list: Список путей к сохраненным файлам или пустой список
@@ -361,7 +659,9 @@ class YandexDiskDownloader:
             
             items = self.get_folder_items(url, progress_callback)
             if items:
-                return self.download_folder_files(url, items, progress_callback)
+                return self.download_folder_files(
+                    url, items, progress_callback, file_callback
+                )
             return []
         
         # Если это файл
@@ -374,13 +674,18 @@ class YandexDiskDownloader:
             
             # Пробуем получить реальное имя файла
             try:
-                # Используем API для получения метаданных о файле и его имени
-                api_url = "https://cloud-api.yandex.net/v1/disk/public/resources"
-                params = {'public_key': url}
-                response = requests.get(api_url, params=params)
+                # Используем API для получения метаданных о файле и его имени.
+                # В поле file API сразу возвращает прямую ссылку на скачивание,
+                # поэтому download_file не запрашивает ее повторно
+                params = {'public_key': url, 'fields': 'name,file,size'}
+                response = self.session.get(RESOURCES_API_URL, params=params)
                 response.raise_for_status()
+                metadata = response.json()
                 
-                file_name = response.json().get('name', file_id)
+                file_name = metadata.get('name', file_id)
+                file_size = metadata.get('size')
+                if metadata.get('file'):
+                    self._remember_download_href({'public_key': url}, metadata['file'])
                 if not self.is_allowed_file(file_name):
                     if progress_callback:
                         progress_callback(
@@ -390,8 +695,11 @@ class YandexDiskDownloader:
             except Exception:
                 # Если не удалось получить имя, используем ID с расширением
                 file_name = f"{file_id}.mp3"  # Расширение по умолчанию
+                file_size = None
             
             save_path = os.path.join(self.output_dir, file_name)
-            result = self.download_file(url, save_path, progress_callback)
+            result = self.download_file(url, save_path, progress_callback, size=file_size)
+            if result and file_callback:
+                file_callback(result)
             
             return [result] if result else []
\ No newline at end of file
@@ -1,32 +1,135 @@
 import logging
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import MappingProxyType
 from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 import yt_dlp
 
-# Настройка логирования с более низким уровнем подробности
-logging.basicConfig(
-    level=logging.WARNING,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Логирование настраивает точка входа приложения, модуль только пишет в свой логгер
 logger = logging.getLogger('youtube_service')
 
+# Недопустимые в именах файлов символы заменяются через таблицу str.translate
+_SANITIZE_TABLE = str.maketrans({c: '_' for c in '\\/*?:"<>|'})
+# Регулярные выражения компилируются один раз при импорте модуля
+# Полная ссылка youtube.com/watch?v=ID (также m. и music.) или короткая youtu.be/ID;
+# ID видео на YouTube всегда из 11 символов
+_YT_RE = re.compile(
+    r'(?:https?://)?(?:(?:www|m|music)\.)?(?:youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]{11})'
+)
+# Дальше этой позиции ссылку не разбираем: ID всегда в начале,
+# а длинные параметры вроде &pp=... только нагружают движок регулярных выражений
+_URL_SCAN_LIMIT = 200
+# Хосты YouTube: ссылки с другими хостами отсекаются без регулярного выражения
+_YOUTUBE_HOSTS = frozenset({
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtu.be'
+})
+
+# Сколько видео скачивается одновременно в download_many
+MAX_PARALLEL_DOWNLOADS = 4
+# Параллельные фрагменты HLS/DASH внутри одной загрузки
+CONCURRENT_FRAGMENTS = 8
+# Размер блока HTTP-запроса при загрузке одного файла частями
+HTTP_CHUNK_SIZE = 10 << 20
+# Минимальный интервал (сек) между вызовами progress_callback
+PROGRESS_INTERVAL = 0.2
+
+# Неизменяемые шаблоны настроек yt-dlp: в вызовах копируются
+# и дополняются только изменяемыми полями
+_INFO_OPTS = MappingProxyType({
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True
+})
+_DOWNLOAD_OPTS_BASE = MappingProxyType({
+    # m4a YouTube отдает без перекодирования, его и берем в первую очередь
+    'format': 'bestaudio[ext=m4a]/bestaudio/best',
+    'noplaylist': True,  # Только видео, не плейлист
+    'verbose': False
+})
+
+
+def _extract_info(url: str) -> Dict[str, Any]:
+    """
+    Получает информацию о видео через yt-dlp без загрузки
+    
+    Args:
+        url: URL видео на YouTube
+        
+    Returns:
+        Словарь с информацией о видео
+    """
+    # yt-dlp дописывает в настройки значения по умолчанию, поэтому передаем копию
+    with yt_dlp.YoutubeDL(dict(_INFO_OPTS)) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+@lru_cache(maxsize=256)
+def _extract_info_cached(video_id: str) -> Dict[str, Any]:
+    """
+    Получает информацию о видео с кэшированием по ID видео.
+    
+    Ключ - ID, а не URL, чтобы ссылки youtu.be/X и youtube.com/watch?v=X
+    попадали в один слот. Ошибки не кэшируются: исключение
+    пробрасывается вызывающему коду.
+    
+    Args:
+        video_id: ID видео на YouTube
+        
+    Returns:
+        Словарь с информацией о видео
+    """
+    return _extract_info(f"https://www.youtube.com/watch?v={video_id}")
+
+
 class YouTubeDownloader:
     """
     Класс для скачивания аудио из YouTube видео
     с улучшенной обработкой ошибок и диагностикой
     """
     
-    def __init__(self, output_dir: str = "./downloads"):
+    def __init__(
+        self,
+        output_dir: str = "./downloads",
+        concurrent_fragments: int = CONCURRENT_FRAGMENTS,
+        http_chunk_size: int = HTTP_CHUNK_SIZE,
+        audio_format: str = 'm4a',
+        audio_quality: str = '0'
+    ):
         """
         Инициализирует загрузчик YouTube
         
         Args:
             output_dir: Директория для сохранения файлов
+            concurrent_fragments: Сколько фрагментов потока качать параллельно
+            http_chunk_size: Размер блока HTTP-запроса в байтах
+            audio_format: Формат аудио на выходе ('m4a', 'mp3', 'opus', ...);
+                если поток уже в этом формате, ffmpeg его не перекодирует
+            audio_quality: Качество перекодирования ('0' - лучшее, либо битрейт, например '192')
         """
         self.output_dir = output_dir
-        os.makedirs(output_dir, exist_ok=True)
+        self.concurrent_fragments = concurrent_fragments
+        self.http_chunk_size = http_chunk_size
+        # Постобработка одна на все загрузки этого объекта
+        self._postprocessors = (MappingProxyType({
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': audio_format,
+            'preferredquality': audio_quality,
+        }),)
+        # Директория создается при первой загрузке, а не при создании объекта
+        self._dir_ensured = False
+    
+    def _ensure_dir(self) -> None:
+        """
+        Создает директорию для сохранения файлов, если она еще не создана
+        """
+        if not self._dir_ensured:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self._dir_ensured = True
     
     def sanitize_filename(self, filename: str) -> str:
         """
@@ -39,131 +142,240 @@ class YouTubeDownloader:
             Безопасное имя файла
         """
         # Заменяем недопустимые для файловой системы символы
-        return re.sub(r'[\\/*?:"<>|]', "_", filename)
+        return filename.translate(_SANITIZE_TABLE)
     
     def get_video_info(self, url: str) -> Dict[str, Any]:
         """
         Получает информацию о видео
         
+        Повторные запросы одного и того же видео берутся из кэша
+        (сбросить его можно через cache_clear()).
+        
         Args:
             url: URL видео на YouTube
             
         Returns:
             Словарь с информацией о видео
         """
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return info
+            video_id = self.get_video_id(url)
+            if video_id:
+                return _extract_info_cached(video_id)
+            # Нераспознанные ссылки запрашиваем без кэша
+            return _extract_info(url)
         except Exception as e:
-            logger.error(f"Ошибка при получении информации о видео: {e}")
+            logger.error("Ошибка при получении информации о видео: %s", e)
             return {}
     
-    def download_audio(
-        self, 
-        url: str, 
-        output_filename: Optional[str] = None, 
-        progress_callback=None
-    ) -> Optional[str]:
+    @classmethod
+    def cache_clear(cls) -> None:
         """
-        Скачивает аудио из YouTube видео
+        Сбрасывает кэш информации о видео
+        """
+        _extract_info_cached.cache_clear()
+    
+    def _download_opts(self, output_template: str, progress_callback=None) -> Dict[str, Any]:
+        """
+        Собирает настройки yt-dlp для загрузки аудио
         
         Args:
-            url: URL видео на YouTube
-            output_filename: Имя выходного файла (без расширения)
+            output_template: Шаблон пути выходного файла yt-dlp
             progress_callback: Функция обратного вызова для отображения прогресса
             
         Returns:
-            Путь к загруженному аудио файлу или None в случае ошибки
+            Словарь настроек для yt_dlp.YoutubeDL
         """
-        # Получаем информацию о видео
-        info = self.get_video_info(url)
-        if not info:
-            logger.error("Не удалось получить информацию о видео")
-            return None
-        
-        # Если имя файла не указано, используем название видео
-        if not output_filename:
-            output_filename = self.sanitize_filename(
-                info.get('title', 'youtube_audio')
-            )
-        
-        # Формируем полный путь к файлу (без расширения)
-        output_path = os.path.join(self.output_dir, output_filename)
-        
-        # Настройки для загрузки
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': output_path,
-            'noplaylist': True,  # Только видео, не плейлист
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'verbose': False
-        }
+        # Настройки для загрузки: копия шаблона плюс поля этого вызова
+        ydl_opts = dict(_DOWNLOAD_OPTS_BASE)
+        ydl_opts['outtmpl'] = output_template
+        ydl_opts['concurrent_fragment_downloads'] = self.concurrent_fragments
+        ydl_opts['http_chunk_size'] = self.http_chunk_size
+        ydl_opts['postprocessors'] = self._postprocessors
         
         # Если передана функция обратного вызова для прогресса
         if progress_callback:
+            # Точный размер файла запоминаем при первом появлении
+            known_total = [0]
+            # Вызовы progress_callback ограничиваем по времени и шагу процента
+            last_emit = [0.0]
+            last_pct = [-1.0]
+            
             def ydl_progress_hook(d):
-                if d['status'] == 'downloading':
-                    total_bytes = d.get('total_bytes', 0)
+                status = d['status']
+                if status == 'downloading':
+                    downloaded = d.get('downloaded_bytes', 0)
+                    total_bytes = known_total[0]
+                    if not total_bytes:
+                        total_bytes = d.get('total_bytes') or 0
+                        known_total[0] = total_bytes
+                        # Оценка размера уточняется по ходу загрузки, ее не кэшируем
+                        total_bytes = total_bytes or d.get('total_bytes_estimate') or 0
+                    # 100% показывается только по завершении загрузки
+                    percent = (
+                        min(downloaded / total_bytes * 100, 99.9) if total_bytes > 0 else 0
+                    )
+                    now = time.monotonic()
+                    if (now - last_emit[0] < PROGRESS_INTERVAL
+                            and abs(percent - last_pct[0]) < 1.0):
+                        return
+                    last_emit[0] = now
+                    last_pct[0] = percent
                     if total_bytes > 0:
-                        downloaded = d.get('downloaded_bytes', 0)
-                        percent = (downloaded / total_bytes) * 100
                         progress_callback(
                             percent, f"Загрузка: {percent:.1f}%"
                         )
                     else:
-                        # Если общий размер неизвестен, используем другую метрику
-                        percent_str = d.get('_percent_str', '0%').strip()
-                        try:
-                            percent = float(percent_str.replace('%', ''))
-                            progress_callback(
-                                percent, f"Загрузка: {percent:.1f}%"
-                            )
-                        except Exception:
-                            pass
-                elif d['status'] == 'finished':
+                        # Если размер неизвестен, показываем объем скачанных данных
+                        progress_callback(
+                            0, f"Загрузка: {downloaded / (1 << 20):.1f} МБ"
+                        )
+                elif status == 'finished':
+                    # Следующий файл пачки считается с нуля
+                    known_total[0] = 0
+                    last_pct[0] = -1.0
                     progress_callback(
                         100, "Загрузка завершена, обработка файла..."
                     )
             
             ydl_opts['progress_hooks'] = [ydl_progress_hook]
         
-        # Выполняем загрузку
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logger.info(f"Начинаем загрузку: {url}")
-                ydl.download([url])
-            
-            # Проверяем, какой файл был создан
-            result_file = f"{output_path}.mp3"
-            
-            if os.path.exists(result_file):
-                logger.info(f"Файл успешно загружен: {result_file}")
-                return result_file
-            
-            # Если файл не найден с ожидаемым расширением, ищем другие варианты
-            for ext in ['.m4a', '.wav', '.opus', '.webm', '.mp3']:
-                possible_file = f"{output_path}{ext}"
-                if os.path.exists(possible_file):
-                    logger.info(f"Найден файл с другим расширением: {possible_file}")
-                    return possible_file
+        return ydl_opts
+    
+    def _download_with(self, ydl: yt_dlp.YoutubeDL, url: str) -> Optional[str]:
+        """
+        Скачивает одно видео уже открытым экземпляром YoutubeDL
+        
+        Args:
+            ydl: Экземпляр YoutubeDL с настройками загрузки
+            url: URL видео на YouTube
             
+        Returns:
+            Путь к загруженному аудио файлу или None, если файл не найден
+        """
+        logger.info("Начинаем загрузку: %s", url)
+        # Метаданные и загрузка за один проход extract_info
+        info = ydl.extract_info(url, download=True)
+        if not info:
+            logger.error("Не удалось получить информацию о видео")
             return None
+        
+        # yt-dlp сообщает путь к итоговому файлу после постобработки
+        requested = info.get('requested_downloads') or []
+        result_file = requested[-1].get('filepath') if requested else None
+        
+        if result_file:
+            logger.info("Файл успешно загружен: %s", result_file)
+            return result_file
+        
+        # Если yt-dlp не вернул путь, ищем файл по имени за одно чтение каталога
+        output_path = os.path.splitext(ydl.prepare_filename(info))[0]
+        prefix = os.path.basename(output_path) + '.'
+        with os.scandir(self.output_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.startswith(prefix):
+                    logger.info("Найден файл с другим расширением: %s", entry.path)
+                    return entry.path
+        
+        return None
+    
+    def download_audio(
+        self, 
+        url: str, 
+        output_filename: Optional[str] = None, 
+        progress_callback=None
+    ) -> Optional[str]:
+        """
+        Скачивает аудио из YouTube видео
+        
+        Args:
+            url: URL видео на YouTube
+            output_filename: Имя выходного файла (без расширения)
+            progress_callback: Функция обратного вызова для отображения прогресса
             
+        Returns:
+            Путь к загруженному аудио файлу или None в случае ошибки
+        """
+        # Если имя файла не указано, название видео подставит сам yt-dlp
+        # из метаданных той же загрузки, без отдельного запроса информации
+        if output_filename:
+            # Символ % в шаблоне yt-dlp экранируется удвоением
+            output_template = os.path.join(
+                self.output_dir, f"{output_filename.replace('%', '%%')}.%(ext)s"
+            )
+        else:
+            output_template = os.path.join(self.output_dir, '%(title)s.%(ext)s')
+        
+        ydl_opts = self._download_opts(output_template, progress_callback)
+        
+        # Выполняем загрузку
+        try:
+            self._ensure_dir()
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                return self._download_with(ydl, url)
         except Exception as e:
-            logger.error(f"Ошибка при загрузке аудио: {str(e)}")
+            logger.error("Ошибка при загрузке аудио: %s", e)
             return None
     
+    def download_audio_batch(
+        self,
+        urls: List[str],
+        progress_callback=None
+    ) -> List[Optional[str]]:
+        """
+        Скачивает аудио из нескольких YouTube видео одним экземпляром YoutubeDL
+        
+        Экстракторы и настройки yt-dlp загружаются один раз на всю пачку,
+        файлы называются по названиям видео.
+        
+        Args:
+            urls: Список URL видео на YouTube
+            progress_callback: Функция обратного вызова для отображения прогресса
+            
+        Returns:
+            Пути к аудио файлам в порядке ссылок,
+            None для ссылок, которые не удалось загрузить
+        """
+        if not urls:
+            return []
+        
+        output_template = os.path.join(self.output_dir, '%(title)s.%(ext)s')
+        ydl_opts = self._download_opts(output_template, progress_callback)
+        
+        results: List[Optional[str]] = []
+        self._ensure_dir()
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            for url in urls:
+                # Ошибка одной ссылки не прерывает загрузку остальных
+                try:
+                    results.append(self._download_with(ydl, url))
+                except Exception as e:
+                    logger.error("Ошибка при загрузке аудио %s: %s", url, e)
+                    results.append(None)
+        return results
+    
+    def download_many(
+        self,
+        urls: List[str],
+        concurrency: int = MAX_PARALLEL_DOWNLOADS
+    ) -> List[Optional[str]]:
+        """
+        Скачивает аудио из нескольких YouTube видео параллельно
+        
+        Args:
+            urls: Список URL видео на YouTube
+            concurrency: Максимальное число одновременных загрузок
+            
+        Returns:
+            Пути к аудио файлам в порядке ссылок,
+            None для ссылок, которые не удалось загрузить
+        """
+        if not urls:
+            return []
+        
+        # yt-dlp синхронный, поэтому загрузки разносим по потокам
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            return list(executor.map(self.download_audio, urls))
+    
     @staticmethod
     def is_youtube_url(url: str) -> bool:
         """
@@ -175,16 +387,14 @@ class YouTubeDownloader:
         Returns:
             True, если URL указывает на YouTube видео
         """
-        youtube_patterns = [
-            r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]+)',
-            r'(?:https?://)?(?:www\.)?youtu\.be/([a-zA-Z0-9_-]+)'
-        ]
-        
-        for pattern in youtube_patterns:
-            if re.match(pattern, url):
-                return True
+        try:
+            host = urlparse(url if '://' in url else 'http://' + url).hostname or ''
+        except ValueError:
+            return False
+        if host.lower() not in _YOUTUBE_HOSTS:
+            return False
         
-        return False
+        return _YT_RE.match(url, 0, _URL_SCAN_LIMIT) is not None
     
     def get_video_id(self, url: str) -> Optional[str]:
         """
@@ -196,14 +406,8 @@ class YouTubeDownloader:
         Returns:
             ID видео или None, если URL не распознан
         """
-        patterns = [
-            r'(?:https?://)?(?:www\.)?youtube\.com/watch\?v=([a-zA-Z0-9_-]+)',
-            r'(?:https?://)?(?:www\.)?youtu\.be/([a-zA-Z0-9_-]+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
+        match = _YT_RE.search(url, 0, _URL_SCAN_LIMIT)
+        if match:
+            return match.group(1)
         
         return None
\ No newline at end of file